@@ -0,0 +1,109 @@
+import time
+import numpy as np
+
+from parrot.constants import FILL_NO_CHUNK
+from parrot.engine.builtin.builtin_runner import BuiltinRunner
+from parrot.engine.engine_scheduler import EngineScheduler
+from parrot.engine.config import BuiltinConfig, SchedulerConfig
+from parrot.engine.primitive_job import Fill, Generate
+from parrot.sampling_config import SamplingConfig
+
+
+def bench_tpot_jitter(
+    fill_chunk_size: int,
+    batch_size: int,
+    prompt_len: int,
+    long_fill_len: int,
+    output_len: int,
+):
+    """Measure the TPOT (time per output token) of running decodes, while a long Fill
+    arrives in the middle of the decoding."""
+
+    config = BuiltinConfig(
+        num_kv_cache_blocks=4000,
+        attn_func="xformers_fill_vllm_paged_attention_generate",
+        block_size=16,
+        max_seq_len=65536,
+    )
+    scheduler_config = SchedulerConfig(
+        max_batch_size=256,
+        max_num_batched_tokens=long_fill_len + batch_size,
+        max_total_tokens=999999,
+    )
+    sampling_config = SamplingConfig(
+        max_gen_length=output_len,
+        ignore_tokenizer_eos=True,
+    )
+
+    runner = BuiltinRunner("lmsys/vicuna-7b-v1.3", config=config)
+    scheduler = EngineScheduler(scheduler_config, fill_chunk_size=fill_chunk_size)
+
+    # NOTE: Contexts are bound by the runner when the jobs are first executed.
+
+    # Prefill the decoding requests.
+    for i in range(batch_size):
+        fill = Fill(
+            session_id=0,
+            task_id=i,
+            context_id=i,
+            parent_context_id=-1,
+            token_ids=[100] * prompt_len,
+        )
+        runner.run_iter([fill])
+
+    for i in range(batch_size):
+        scheduler.add_job(
+            Generate(
+                session_id=0,
+                task_id=i,
+                context_id=i,
+                parent_context_id=-1,
+                sampling_config=sampling_config,
+            )
+        )
+
+    long_fill = Fill(
+        session_id=0,
+        task_id=batch_size,
+        context_id=batch_size,
+        parent_context_id=-1,
+        token_ids=[100] * long_fill_len,
+    )
+
+    tpots = []
+    iter_num = 0
+    while not scheduler.is_empty:
+        # The long Fill arrives in the middle of the decoding.
+        if iter_num == output_len // 2:
+            scheduler.add_job(long_fill)
+
+        st = time.perf_counter_ns()
+        jobs = scheduler.schedule()
+        runner.run_iter(jobs)
+        scheduler.finish()
+        ed = time.perf_counter_ns()
+
+        if any([isinstance(job, Generate) for job in jobs]):
+            tpots.append((ed - st) / 1e6)
+        iter_num += 1
+
+    tpots = np.array(tpots)
+    print(
+        f"fill_chunk_size={fill_chunk_size}: "
+        f"TPOT mean {tpots.mean():.2f} ms, p99 {np.percentile(tpots, 99):.2f} ms, "
+        f"max {tpots.max():.2f} ms, std {tpots.std():.2f} ms",
+        flush=True,
+    )
+
+    del runner
+
+
+if __name__ == "__main__":
+    for fill_chunk_size in [FILL_NO_CHUNK, 512, 256]:
+        bench_tpot_jitter(
+            fill_chunk_size=fill_chunk_size,
+            batch_size=32,
+            prompt_len=512,
+            long_fill_len=8192,
+            output_len=200,
+        )
@@ -0,0 +1,117 @@
+import asyncio
+import time
+import json
+
+from parrot.engine.llm_engine import LLMEngine
+from parrot.engine.engine_scheduler import EngineScheduler
+from parrot.engine.config import SchedulerConfig
+from parrot.engine.primitive_job import Fill
+from parrot.engine.context.text_context import TextContext
+from parrot.testing.get_configs import get_sample_engine_config_path
+
+
+class DummyEngine(LLMEngine):
+    """An engine without model. Each iteration finishes all scheduled jobs immediately."""
+
+    def __init__(self, engine_config):
+        super().__init__(engine_config, connect_to_core=False)
+        self.scheduler = EngineScheduler(SchedulerConfig(**engine_config["scheduler"]))
+        self.first_iter_latencies = []
+
+    def _add_job(self, job):
+        job.context = TextContext(job.context_id, None)
+        job.add_time = time.perf_counter_ns()
+        self.scheduler.add_job(job)
+        self._wakeup()
+
+    async def fill(self, payload):
+        pass
+
+    async def generate(self, payload):
+        pass
+
+    def generate_stream(self, payload):
+        pass
+
+    async def free_context(self, payload):
+        pass
+
+    def get_runtime_info(self, profile):
+        pass
+
+    async def engine_iter(self):
+        if self.scheduler.is_empty:
+            return
+
+        jobs = self.scheduler.schedule()
+        cur_time = time.perf_counter_ns()
+        for job in jobs:
+            self.first_iter_latencies.append((cur_time - job.add_time) / 1e3)
+            job.finish_event.set()
+        self.scheduler.finish()
+
+
+async def polling_engine_loop(engine: DummyEngine):
+    # The previous implementation: spin with a 1 us sleep.
+    while True:
+        await asyncio.sleep(0.000001)
+        await engine.engine_iter()
+
+
+async def bench(engine_loop, engine: DummyEngine, idle_time: float, jobs_num: int):
+    loop_task = asyncio.create_task(engine_loop())
+
+    # Idle CPU usage
+    st_cpu = time.process_time()
+    await asyncio.sleep(idle_time)
+    idle_cpu = (time.process_time() - st_cpu) / idle_time * 100
+
+    # First-iteration latency: a job arrives at an idle engine.
+    for i in range(jobs_num):
+        job = Fill(
+            session_id=0,
+            task_id=i,
+            context_id=i,
+            parent_context_id=-1,
+            token_ids=[100],
+        )
+        engine._add_job(job)
+        await job.finish_event.wait()
+        await asyncio.sleep(0.001)
+
+    loop_task.cancel()
+
+    latencies = sorted(engine.first_iter_latencies)
+    return idle_cpu, sum(latencies) / len(latencies), latencies[len(latencies) // 2]
+
+
+def main():
+    with open(get_sample_engine_config_path("opt-125m.json")) as f:
+        engine_config = dict(json.load(f))
+
+    for name in ["polling", "event-driven"]:
+        engine = DummyEngine(engine_config)
+        engine_loop = (
+            (lambda: polling_engine_loop(engine))
+            if name == "polling"
+            else engine.engine_loop
+        )
+        # Don't start the heartbeat thread.
+        engine.heartbeat_thread.start = lambda: None
+
+        idle_cpu, avg_latency, median_latency = asyncio.run(
+            bench(engine_loop, engine, idle_time=3.0, jobs_num=1000)
+        )
+        print(
+            f"{name}: idle CPU usage {idle_cpu:.1f}%, first-iteration latency "
+            f"avg {avg_latency:.1f} us, median {median_latency:.1f} us",
+            flush=True,
+        )
+
+
+if __name__ == "__main__":
+    import logging
+
+    logging.disable(logging.DEBUG)
+
+    main()
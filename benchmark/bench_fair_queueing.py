@@ -0,0 +1,89 @@
+"""Tail latency of an interactive session, while a batch session fans out hundreds of map
+calls at the same time (like examples/summarization_map_reduce.py).
+
+Uses the simulated cluster in bench_placement.py.
+"""
+
+import random
+from typing import List
+
+import numpy as np
+
+from parrot.serve.scheduler import GlobalSchedulerConfig
+
+from bench_placement import simulate
+
+
+BATCH_SESSION_ID = 0
+INTERACTIVE_SESSION_ID = 1
+
+
+def make_mixed_workload(
+    batch_requests_num: int,
+    interactive_requests_num: int,
+    interactive_rate: float,
+    interactive_fanout: int,
+    seed: int,
+) -> List:
+    rng = random.Random(seed)
+    workload = []
+
+    # Map calls of the batch session arrive at once.
+    for _ in range(batch_requests_num):
+        workload.append(
+            (0.0, rng.randint(1000, 2000), rng.randint(50, 100), BATCH_SESSION_ID)
+        )
+
+    # Interactive requests arrive as a Poisson process. Each request issues a few
+    # parallel calls (e.g. an agent step).
+    cur_time = 0.0
+    for _ in range(interactive_requests_num):
+        cur_time += rng.expovariate(interactive_rate)
+        for _ in range(interactive_fanout):
+            workload.append(
+                (
+                    cur_time,
+                    rng.randint(100, 300),
+                    rng.randint(20, 50),
+                    INTERACTIVE_SESSION_ID,
+                )
+            )
+
+    return workload
+
+
+if __name__ == "__main__":
+    import logging
+
+    logging.disable(logging.DEBUG)
+
+    engine_specs = [(0.010, 0.0002, 0.00005)] * 2
+    workload = make_mixed_workload(
+        batch_requests_num=400,
+        interactive_requests_num=150,
+        interactive_rate=4.0,
+        interactive_fanout=1,
+        seed=0,
+    )
+    session_ids = np.array([request[-1] for request in workload])
+
+    for name, fair_queueing, session_weights in [
+        ("FIFO", False, {}),
+        ("DRR (1:1)", True, {}),
+        ("DRR (batch 1 : interactive 4)", True, {INTERACTIVE_SESSION_ID: 4.0}),
+    ]:
+        latencies = simulate(
+            GlobalSchedulerConfig(fair_queueing=fair_queueing),
+            workload,
+            engine_specs,
+            tasks_capacity=8,
+            session_weights=session_weights,
+        )
+        interactive = latencies[session_ids == INTERACTIVE_SESSION_ID]
+        batch = latencies[session_ids == BATCH_SESSION_ID]
+        print(
+            f"{name}: interactive p50 {np.percentile(interactive, 50):.2f} s, "
+            f"p99 {np.percentile(interactive, 99):.2f} s; "
+            f"batch makespan {batch.max():.2f} s",
+            flush=True,
+        )
@@ -0,0 +1,97 @@
+import asyncio
+import time
+from multiprocessing import Process
+
+import aiohttp
+import uvicorn
+
+from parrot.protocol.http_utils import async_send_http_request, close_client_sessions
+from parrot.protocol.internal.layer_apis import FillResponse
+from parrot.protocol.internal.primitive_request import Fill
+from parrot.testing.fake_engine_server import (
+    app as FakeEngineApp,
+    TESTING_SERVER_HOST,
+    TESTING_SERVER_PORT,
+    TESTING_SERVER_URL as ENGINE_URL,
+)
+
+
+def _launch_fake_engine():
+    uvicorn.run(
+        FakeEngineApp,
+        host=TESTING_SERVER_HOST,
+        port=TESTING_SERVER_PORT,
+        log_level="warning",
+    )
+
+
+def make_fill(i: int) -> Fill:
+    # Empty fill: the fake engine returns immediately, so we only measure the overhead.
+    return Fill(
+        session_id=0,
+        task_id=i,
+        context_id=i,
+        parent_context_id=-1,
+        end_flag=False,
+        token_ids=[],
+    )
+
+
+async def fill_with_new_session(fill: Fill) -> FillResponse:
+    # The previous implementation: a fresh ClientSession per primitive.
+    async with aiohttp.ClientSession() as client_session:
+        return await async_send_http_request(
+            client_session=client_session,
+            response_cls=FillResponse,
+            http_addr=ENGINE_URL,
+            api_url="/fill",
+            session_id=fill.session_id,
+            task_id=fill.task_id,
+            context_id=fill.context_id,
+            end_flag=fill.end_flag,
+            parent_context_id=fill.parent_context_id,
+            token_ids=fill.token_ids,
+            text=fill.text,
+        )
+
+
+async def bench(requests_num: int, concurrency: int):
+    async def run(post) -> float:
+        st = time.perf_counter_ns()
+        for i in range(0, requests_num, concurrency):
+            await asyncio.gather(
+                *[post(make_fill(j)) for j in range(i, i + concurrency)]
+            )
+        ed = time.perf_counter_ns()
+        return (ed - st) / 1e3 / requests_num  # us per primitive
+
+    # Warmup
+    await run(fill_with_new_session)
+    await run(lambda fill: fill.apost(ENGINE_URL))
+
+    new_session_time = await run(fill_with_new_session)
+    pooled_time = await run(lambda fill: fill.apost(ENGINE_URL))
+    await close_client_sessions()
+
+    print(
+        f"requests_num={requests_num}, concurrency={concurrency}: "
+        f"new session {new_session_time:.1f} us/primitive, "
+        f"pooled session {pooled_time:.1f} us/primitive, "
+        f"speedup {new_session_time / pooled_time:.2f}x",
+        flush=True,
+    )
+
+
+if __name__ == "__main__":
+    import logging
+
+    logging.disable(logging.DEBUG)
+
+    p = Process(target=_launch_fake_engine, daemon=True)
+    p.start()
+    time.sleep(5)
+
+    for concurrency in [1, 8, 32]:
+        asyncio.run(bench(requests_num=1024, concurrency=concurrency))
+
+    p.terminate()
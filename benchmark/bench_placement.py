@@ -0,0 +1,254 @@
+"""Evaluate placement policies of GlobalScheduler in a simulated heterogeneous cluster.
+
+Engines are simulated with a ground-truth iteration latency model:
+
+    iter_latency = base + per_seq * batch_size + per_prefill_token * prefill_tokens
+
+The GlobalScheduler (with the real EngineManager) only sees what real engines report in
+heartbeats, i.e. num_running_jobs, num_total_jobs and recent_average_latency.
+"""
+
+import heapq
+import random
+from typing import Dict, List
+
+import numpy as np
+
+import parrot.serve.scheduler  # Import first to avoid circular import.
+from parrot.engine.config import EngineConfig
+from parrot.protocol.internal.runtime_info import EngineRuntimeInfo
+from parrot.sampling_config import SamplingConfig
+from parrot.serve.context_manager import ServeCoreContextManager
+from parrot.serve.engine_manager import EngineManager
+from parrot.serve.graph import ConstantFill, PlaceholderGen, RequestChain
+from parrot.serve.graph.request import RequestPlaceholder
+from parrot.serve.scheduler import (
+    CompletionTask,
+    GlobalScheduler,
+    GlobalSchedulerConfig,
+)
+from parrot.serve.tokenizer_wrapper import TokenizersWrapper
+
+
+TOKENIZER_NAME = "sim-tokenizer"
+HEARTBEAT_INTERVAL = 0.1  # s
+RECENT_N = 10
+
+
+class SimEngine:
+    def __init__(self, engine_id: int, base: float, per_seq: float, per_token: float):
+        self.engine_id = engine_id
+        self.base = base
+        self.per_seq = per_seq
+        self.per_token = per_token
+
+        self.waiting: List[Dict] = []
+        self.running: List[Dict] = []
+        self.is_busy = False
+        self.latencies: List[float] = []
+
+    def start_iter(self) -> float:
+        """Start an iteration. Returns its latency."""
+
+        self.prefill_jobs = self.waiting
+        self.waiting = []
+        prefill_tokens = sum([job["prefill"] for job in self.prefill_jobs])
+        batch_size = len(self.prefill_jobs) + len(self.running)
+        latency = self.base + self.per_seq * batch_size + self.per_token * prefill_tokens
+        self.latencies.append(latency)
+        self.is_busy = True
+        return latency
+
+    def finish_iter(self) -> List[Dict]:
+        """Finish the iteration. Returns finished jobs."""
+
+        finished = []
+        new_running = []
+        for job in self.running:
+            job["decode"] -= 1
+            if job["decode"] == 0:
+                finished.append(job)
+            else:
+                new_running.append(job)
+        # Prefill iteration also generates the first token.
+        for job in self.prefill_jobs:
+            job["decode"] -= 1
+            if job["decode"] == 0:
+                finished.append(job)
+            else:
+                new_running.append(job)
+        self.running = new_running
+        self.is_busy = False
+        return finished
+
+    def runtime_info(self) -> EngineRuntimeInfo:
+        recent = self.latencies[-RECENT_N:]
+        return EngineRuntimeInfo(
+            num_running_jobs=len(self.running),
+            num_total_jobs=len(self.running) + len(self.waiting),
+            recent_average_latency=(sum(recent) / len(recent) * 1e9 if recent else 0),
+        )
+
+
+def make_task(
+    task_id: int, prefill: int, decode: int, session_id: int = 0
+) -> CompletionTask:
+    request_chain = RequestChain.from_nodes(
+        nodes=[
+            ConstantFill("prompt"),
+            PlaceholderGen(
+                placeholder=RequestPlaceholder(
+                    name="out",
+                    is_output=True,
+                    sampling_config=SamplingConfig(max_gen_length=decode),
+                )
+            ),
+        ]
+    )
+    request_chain.session_id = session_id
+    task = CompletionTask(task_id=task_id, chain=request_chain.comp_chains[0])
+    task.tokenized_result = {TOKENIZER_NAME: [[0] * prefill]}
+    return task
+
+
+def simulate(
+    scheduler_config: GlobalSchedulerConfig,
+    workload: List,
+    engine_specs: List,
+    tasks_capacity: int = 64,
+    session_weights: Dict[int, float] = {},
+) -> np.ndarray:
+    """Simulate the workload, a list of (arrival_time, prefill_len, decode_len, session_id).
+    Returns the latencies of requests, in the order of the workload."""
+
+    tokenizers_wrapper = TokenizersWrapper()
+    tokenizers_wrapper.tokenizers[TOKENIZER_NAME] = None  # No real tokenizer needed.
+    context_mgr = ServeCoreContextManager()
+    engine_mgr = EngineManager(
+        tokenizers_wrapper=tokenizers_wrapper,
+        context_mgr=context_mgr,
+        engine_heartbeat_timeout=99999,
+    )
+    scheduler = GlobalScheduler(
+        config=scheduler_config,
+        engine_mgr=engine_mgr,
+        context_mgr=context_mgr,
+    )
+
+    sim_engines: Dict[int, SimEngine] = {}
+    for i, spec in enumerate(engine_specs):
+        engine_id = engine_mgr.register_engine(
+            EngineConfig(
+                engine_name=f"sim_{i}",
+                model="sim-model",
+                tokenizer=TOKENIZER_NAME,
+                tasks_capacity=tasks_capacity,
+                tokens_capacity=200000,
+            )
+        )
+        sim_engines[engine_id] = SimEngine(engine_id, *spec)
+    for session_id, weight in session_weights.items():
+        scheduler.register_session(session_id, weight)
+
+    events = []  # (time, seq, type, payload)
+    seq = 0
+
+    def push(time, event_type, payload):
+        nonlocal seq
+        seq += 1
+        heapq.heappush(events, (time, seq, event_type, payload))
+
+    for task_id, (arrival, prefill, decode, session_id) in enumerate(workload):
+        push(arrival, "arrival", (task_id, prefill, decode, session_id))
+    for engine_id in sim_engines:
+        push(0.0, "heartbeat", engine_id)
+
+    pending: List[CompletionTask] = []
+    arrival_time: Dict[int, float] = {}
+    latencies = np.zeros(len(workload))
+    remaining = len(workload)
+
+    def dispatch(now: float):
+        nonlocal pending
+        scheduler.schedule()
+        still_pending = []
+        for task in pending:
+            if not task.is_scheduled:
+                still_pending.append(task)
+                continue
+            sim_engine = sim_engines[task.engine.engine_id]
+            sim_engine.waiting.append(
+                {
+                    "task": task,
+                    "prefill": len(task.tokenized_result[TOKENIZER_NAME][0]),
+                    "decode": task.chain.gen_node.sampling_config.max_gen_length,
+                }
+            )
+            if not sim_engine.is_busy:
+                push(now + sim_engine.start_iter(), "iter_end", sim_engine.engine_id)
+        pending = still_pending
+
+    while remaining > 0:
+        now, _, event_type, payload = heapq.heappop(events)
+
+        if event_type == "arrival":
+            task_id, prefill, decode, session_id = payload
+            task = make_task(task_id, prefill, decode, session_id)
+            arrival_time[task_id] = now
+            scheduler.submit_task(task)
+            pending.append(task)
+            dispatch(now)
+        elif event_type == "iter_end":
+            sim_engine = sim_engines[payload]
+            finished = sim_engine.finish_iter()
+            for job in finished:
+                task = job["task"]
+                task.leave_scheduled()
+                latencies[task.task_id] = now - arrival_time[task.task_id]
+                remaining -= 1
+            if len(sim_engine.waiting) + len(sim_engine.running) > 0:
+                push(now + sim_engine.start_iter(), "iter_end", payload)
+            if len(finished) > 0:
+                dispatch(now)
+        elif event_type == "heartbeat":
+            engine_mgr.engine_heartbeat(payload, sim_engines[payload].runtime_info())
+            push(now + HEARTBEAT_INTERVAL, "heartbeat", payload)
+
+    return latencies
+
+
+def make_workload(requests_num: int, request_rate: float, seed: int) -> List:
+    rng = random.Random(seed)
+    workload = []
+    cur_time = 0.0
+    for _ in range(requests_num):
+        cur_time += rng.expovariate(request_rate)
+        workload.append((cur_time, rng.randint(100, 2000), rng.randint(50, 300), 0))
+    return workload
+
+
+if __name__ == "__main__":
+    import logging
+
+    logging.disable(logging.DEBUG)
+
+    # (base, per_seq, per_prefill_token) in seconds. Two fast engines and two slow engines.
+    engine_specs = [
+        (0.010, 0.0002, 0.00005),
+        (0.010, 0.0002, 0.00005),
+        (0.025, 0.0005, 0.00012),
+        (0.025, 0.0005, 0.00012),
+    ]
+
+    for request_rate in [2.0, 4.0, 8.0]:
+        workload = make_workload(requests_num=1000, request_rate=request_rate, seed=0)
+        for policy in ["heuristic", "latency_model"]:
+            latencies = simulate(
+                GlobalSchedulerConfig(placement_policy=policy), workload, engine_specs
+            )
+            print(
+                f"request_rate={request_rate}, policy={policy}: "
+                f"mean latency {latencies.mean():.2f} s, "
+                f"p99 latency {np.percentile(latencies, 99):.2f} s",
+                flush=True,
+            )
@@ -0,0 +1,167 @@
+import time
+from typing import Dict, List
+
+# NOTE: Import the scheduler package first to resolve the circular import of context_manager.
+from parrot.serve.scheduler import GlobalScheduler
+from parrot.serve.context_manager import PrefixCache, PrefixIndex
+
+
+class LegacyPrefixCache:
+    """The previous PrefixCache, keyed by concatenated strings like {{sv0}}{{sv1}}."""
+
+    def __init__(self):
+        self._prefix_ctx_map: Dict[str, int] = {}
+        self._prefix_ctx_map_reversed: Dict[int, str] = {}
+
+    @staticmethod
+    def hash_var_id(var_id: str) -> str:
+        return "{{" + var_id + "}}"
+
+    def get_cached_prefix_context(self, prefix_hash: str) -> int:
+        return self._prefix_ctx_map.get(prefix_hash, -1)
+
+    def cache_prefix_context(self, prefix_hash: str, context_id: int) -> None:
+        self._prefix_ctx_map[prefix_hash] = context_id
+        self._prefix_ctx_map_reversed[context_id] = prefix_hash
+
+    def remove_context_id(self, context_id: int) -> None:
+        if context_id in self._prefix_ctx_map_reversed:
+            prefix_hash = self._prefix_ctx_map_reversed.pop(context_id)
+            self._prefix_ctx_map.pop(prefix_hash)
+
+
+def make_chains(chain_num: int, chain_len: int, shared_len: int) -> List[List[str]]:
+    # SV ids are UUID-like strings in the serve layer.
+    shared = [f"{i:08d}-0000-0000-0000-000000000000" for i in range(shared_len)]
+    return [
+        shared
+        + [
+            f"{i:08d}-{j:04d}-0000-0000-000000000000"
+            for j in range(chain_len - shared_len)
+        ]
+        for i in range(chain_num)
+    ]
+
+
+def bench_legacy_query(chains: List[List[str]], engine_num: int) -> float:
+    caches = [LegacyPrefixCache() for _ in range(engine_num)]
+    for chain in chains:
+        prefix_hash = ""
+        for context_id, var_id in enumerate(chain):
+            prefix_hash += LegacyPrefixCache.hash_var_id(var_id)
+            caches[0].cache_prefix_context(prefix_hash, context_id)
+
+    st = time.perf_counter_ns()
+    # Like query_prefixes_in_engines.
+    for chain in chains:
+        for cache in caches:
+            prefix_hash = ""
+            for var_id in chain:
+                prefix_hash += LegacyPrefixCache.hash_var_id(var_id)
+                if cache.get_cached_prefix_context(prefix_hash) == -1:
+                    break
+    ed = time.perf_counter_ns()
+    return (ed - st) / 1e6
+
+
+def bench_radix_query(chains: List[List[str]], engine_num: int) -> float:
+    caches = [PrefixCache() for _ in range(engine_num)]
+    for chain in chains:
+        cached_num = len(caches[0].get_longest_cached_prefix(chain))
+        caches[0].cache_prefix_contexts(
+            chain, list(range(len(chain))), start=cached_num
+        )
+
+    st = time.perf_counter_ns()
+    # Like query_prefixes_in_engines.
+    for chain in chains:
+        for cache in caches:
+            cache.get_longest_cached_prefix(chain)
+    ed = time.perf_counter_ns()
+    return (ed - st) / 1e6
+
+
+def bench_index_query(chains: List[List[str]], engine_num: int) -> float:
+    prefix_index = PrefixIndex()
+    caches = [PrefixCache(i, prefix_index) for i in range(engine_num)]
+    for chain in chains:
+        cached_num = len(caches[0].get_longest_cached_prefix(chain))
+        caches[0].cache_prefix_contexts(
+            chain, list(range(len(chain))), start=cached_num
+        )
+
+    st = time.perf_counter_ns()
+    # Like query_prefix_depths_in_engines: one walk for all engines.
+    for chain in chains:
+        prefix_index.query_prefix_engines(chain)
+    ed = time.perf_counter_ns()
+    return (ed - st) / 1e6
+
+
+def bench_legacy(chains: List[List[str]]) -> float:
+    cache = LegacyPrefixCache()
+    context_id = 0
+
+    st = time.perf_counter_ns()
+    for chain in chains:
+        # Lookup + insert, like set_task_contexts.
+        prefix_hash = ""
+        no_cache = False
+        for var_id in chain:
+            prefix_hash += LegacyPrefixCache.hash_var_id(var_id)
+            if not no_cache and cache.get_cached_prefix_context(prefix_hash) != -1:
+                continue
+            no_cache = True
+            cache.cache_prefix_context(prefix_hash, context_id)
+            context_id += 1
+    for i in range(context_id):
+        cache.remove_context_id(i)
+    ed = time.perf_counter_ns()
+    return (ed - st) / 1e6
+
+
+def bench_radix(chains: List[List[str]]) -> float:
+    cache = PrefixCache()
+    context_id = 0
+
+    st = time.perf_counter_ns()
+    for chain in chains:
+        # Lookup + insert, like set_task_contexts.
+        cached_num = len(cache.get_longest_cached_prefix(chain))
+        context_ids = [-1] * cached_num
+        for _ in range(cached_num, len(chain)):
+            context_ids.append(context_id)
+            context_id += 1
+        cache.cache_prefix_contexts(chain, context_ids, start=cached_num)
+    for i in range(context_id):
+        cache.remove_context_id(i)
+    ed = time.perf_counter_ns()
+    return (ed - st) / 1e6
+
+
+if __name__ == "__main__":
+    chain_num = 1000
+    for chain_len in [4, 16, 64, 256]:
+        chains = make_chains(chain_num, chain_len, shared_len=chain_len // 2)
+        legacy_time = bench_legacy(chains)
+        radix_time = bench_radix(chains)
+        print(
+            f"chain_num={chain_num}, chain_len={chain_len}: "
+            f"legacy dict {legacy_time:.2f} ms, radix tree {radix_time:.2f} ms, "
+            f"speedup {legacy_time / radix_time:.2f}x",
+            flush=True,
+        )
+
+    engine_num = 8
+    for chain_len in [4, 16, 64, 256]:
+        chains = make_chains(chain_num, chain_len, shared_len=chain_len // 2)
+        legacy_time = bench_legacy_query(chains, engine_num)
+        radix_time = bench_radix_query(chains, engine_num)
+        index_time = bench_index_query(chains, engine_num)
+        print(
+            f"[query] chain_num={chain_num}, chain_len={chain_len}, engine_num={engine_num}: "
+            f"legacy dict {legacy_time:.2f} ms, radix tree {radix_time:.2f} ms, "
+            f"prefix index {index_time:.2f} ms, "
+            f"speedup {legacy_time / index_time:.2f}x",
+            flush=True,
+        )
@@ -0,0 +1,81 @@
+"""Prefix hit rate of a few-shot workload, with and without PrefixMatcher.
+
+Each call inlines a task's few-shot examples and a different question in one text chunk,
+so the shared examples are only cached if ServeCore detects the common prefix itself.
+
+Compares no prefix matching, character-level matching and token-aligned matching (split
+points on token and KV block boundaries). Padded slots are the KV cache slots wasted when
+forking from prefix contexts whose lengths are not multiples of the block size.
+
+Uses the simulator in parrot/testing/serve_simulator.py.
+"""
+
+import random
+from typing import List
+
+from parrot.testing.serve_simulator import ServeSimulator, TraceRequest
+
+
+def make_few_shot_workload(
+    tasks_num: int,
+    shots_num: int,
+    requests_num: int,
+    request_rate: float,
+    seed: int,
+) -> List[TraceRequest]:
+    rng = random.Random(seed)
+
+    def sentence(words_num: int) -> str:
+        return " ".join([f"w{rng.randint(0, 9999)}" for _ in range(words_num)])
+
+    # Each task has its own instruction and examples.
+    few_shots = []
+    for task in range(tasks_num):
+        examples = [
+            f"Q: {sentence(rng.randint(20, 60))} A: {sentence(rng.randint(10, 30))}"
+            for _ in range(shots_num)
+        ]
+        few_shots.append(f"Task {task}: {sentence(30)} " + " ".join(examples) + " ")
+
+    trace = []
+    cur_time = 0.0
+    for _ in range(requests_num):
+        cur_time += rng.expovariate(request_rate)
+        trace.append(
+            TraceRequest(
+                arrival_time=cur_time,
+                session_id=rng.randrange(16),
+                prefix=few_shots[rng.randrange(tasks_num)],
+                prompt=f"Q: {sentence(rng.randint(20, 60))} A:",
+                output_len=rng.randint(10, 50),
+            )
+        )
+    return trace
+
+
+if __name__ == "__main__":
+    import logging
+
+    logging.disable(logging.WARNING)
+
+    trace = make_few_shot_workload(
+        tasks_num=4, shots_num=8, requests_num=400, request_rate=8.0, seed=0
+    )
+
+    core_configs = {
+        "no_matching": {"prefix_matching": False},
+        "char_level": {"prefix_matching": True, "prefix_matching_token_aligned": False},
+        "token_aligned": {"prefix_matching": True, "prefix_matching_token_aligned": True},
+    }
+
+    for name, core_config in core_configs.items():
+        simulator = ServeSimulator(
+            engines_num=2,
+            tasks_capacity=32,
+            criteria="throughput",
+            core_config=core_config,
+            inline_prompt=True,
+            block_size=16,
+        )
+        result = simulator.run(trace, {"ctx_group": True, "ctx_aware": True})
+        print(f"{name}: {result.summary()}", flush=True)
@@ -13,19 +13,36 @@ DEFAULT_ENGINE_SERVER_PORT = 9001
 DEFAULT_CORE_URL = f"http://{DEFAULT_SERVER_HOST}:{DEFAULT_CORE_SERVER_PORT}"
 DEFAULT_ENGINE_URL = f"http://{DEFAULT_SERVER_HOST}:{DEFAULT_ENGINE_SERVER_PORT}"
 
+# ---------- HTTP Client ----------
+# Max number of concurrent connections per pooled client session (i.e. per address).
+HTTP_CLIENT_CONN_LIMIT = 100
+HTTP_CLIENT_KEEPALIVE_TIME = 30
+
 # ---------- Loop Interval ----------
-CORE_LOOP_INTERVAL = 0.0001
-# The engine need a very short interval, prevent it from affecting the performance of LLM
-ENGINE_LOOP_INTERVAL = 0.000001
+# ServeCore schedules on events. Only the housekeeping sweeps (sessions, engines,
+# constant prefix vars) run periodically.
+CORE_HOUSEKEEPING_INTERVAL = 1.0
 
 # ---------- Chunk Related ----------
 FILL_NO_CHUNK = -1
 PIPELINE_SEND_CHUNK_NUM = 128
 DETOKENIZE_CHUNK_NUM = 256
+# Max number of token ids in the tokenization cache of Semantic Variables.
+TOKENIZATION_CACHE_MAX_TOKENS = 4 * 1024 * 1024
+# Number of threads tokenizing/detokenizing off the event loop. 0 means inline.
+TOKENIZATION_POOL_SIZE = 4
 STREAMING_END_TOKEN_ID = -1
 
+# ---------- Fault Tolerance ----------
+# Max times of re-dispatching a task to another engine when its engine fails.
+TASK_MAX_REDISPATCH_TIMES = 2
+# Retries of a batched context free request before the engine is considered bad.
+CONTEXT_FREE_MAX_RETRY_TIMES = 2
+CONTEXT_FREE_RETRY_INTERVAL = 0.1
+
 # ---------- Engine ----------
 LATENCY_ANALYZER_RECENT_N = 20
+DECODE_NO_BATCH_SIZE_LIMIT = -1
 # EngineType(Enum)
 ENGINE_TYPE_BUILTIN = "builtin"
 ENGINE_TYPE_OPENAI = "openai"
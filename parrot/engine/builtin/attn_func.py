@@ -82,7 +82,7 @@ class xFormersWithBuffer(AttnFunc):
 
         for job in jobs:
             if isinstance(job, Fill):
-                num_tokens = len(job.token_ids)
+                num_tokens = len(job.iter_token_ids)
                 iteration_state.num_fill_tokens.append(num_tokens)
             elif isinstance(job, Generate):
                 num_tokens = 1
@@ -227,7 +227,7 @@ class xFormersFill_vLLMPagedAttentionGenerate(AttnFunc):
 
         for job in jobs:
             if isinstance(job, Fill):
-                num_tokens = len(job.token_ids)
+                num_tokens = len(job.iter_token_ids)
                 iteration_state.num_fill_tokens.append(num_tokens)
             elif isinstance(job, Generate):
                 num_tokens = 1
@@ -506,7 +506,7 @@ class xFormersFill_SharedPromptsGenerate(AttnFunc):
 
         for job in jobs:
             if isinstance(job, Fill):
-                num_tokens = len(job.token_ids)
+                num_tokens = len(job.iter_token_ids)
                 iteration_state.num_fill_tokens.append(num_tokens)
             elif isinstance(job, Generate):
                 num_tokens = 1
@@ -7,7 +7,7 @@ from typing import Dict, AsyncGenerator
 from parrot.utils import get_logger, MemTracker, get_cpu_memory_usage, cprofile
 from parrot.sampling_config import SamplingConfig
 from parrot.protocol.internal.runtime_info import EngineRuntimeInfo
-from parrot.constants import UNKNOWN_DATA_FIELD
+from parrot.constants import UNKNOWN_DATA_FIELD, DECODE_NO_BATCH_SIZE_LIMIT
 
 from ..llm_engine import LLMEngine
 from .builtin_runner import BuiltinRunner
@@ -34,12 +34,15 @@ class BuiltinEngine(LLMEngine):
         # Assign dtype and device to engine_config
         self.engine_config.dtype = builtin_config.dtype_str
         self.engine_config.device = builtin_config.device_str
+        self.engine_config.block_size = builtin_config.block_size
 
         # ---------- Components ----------
         self.runner = BuiltinRunner(
             model_name=self.engine_config.model, config=builtin_config
         )
-        self.scheduler = EngineScheduler(scheduler_config)
+        self.scheduler = EngineScheduler(
+            scheduler_config, fill_chunk_size=self.engine_config.fill_chunk_size
+        )
         self.latency_analyzer = LatencyAnalyzer()
         self.gpu_mem_tracker = MemTracker(device=self.runner.local_rank)
 
@@ -64,6 +67,7 @@ class BuiltinEngine(LLMEngine):
             kv_cache_manager=self.runner.kv_cache_manager,
             block_size=self.builtin_config.block_size,
         )
+        self._wakeup()
 
     # ---------- Public APIs ----------
 
@@ -76,6 +80,7 @@ class BuiltinEngine(LLMEngine):
             parent_context_id=payload["parent_context_id"],
             end_flag=payload["end_flag"],
             token_ids=payload["token_ids"],
+            prefill_priority=payload.get("prefill_priority", False),
         )
 
         self._add_job(fill_job)
@@ -93,6 +98,9 @@ class BuiltinEngine(LLMEngine):
             parent_context_id=payload["parent_context_id"],
             sampling_config=SamplingConfig(**payload["sampling_config"]),
             end_flag=payload["end_flag"],
+            decode_batch_size_upperbound=payload.get(
+                "decode_batch_size_upperbound", DECODE_NO_BATCH_SIZE_LIMIT
+            ),
         )
 
         self._add_job(generation_job)
@@ -115,6 +123,9 @@ class BuiltinEngine(LLMEngine):
         parent_context_id = payload["parent_context_id"]
         sampling_config = SamplingConfig(**payload["sampling_config"])
         end_flag = payload["end_flag"]
+        decode_batch_size_upperbound = payload.get(
+            "decode_batch_size_upperbound", DECODE_NO_BATCH_SIZE_LIMIT
+        )
 
         generation_job = Generate(
             session_id=session_id,
@@ -123,6 +134,7 @@ class BuiltinEngine(LLMEngine):
             parent_context_id=parent_context_id,
             sampling_config=sampling_config,
             end_flag=end_flag,
+            decode_batch_size_upperbound=decode_batch_size_upperbound,
         )
         self._add_job(generation_job)
 
@@ -95,8 +95,8 @@ class BuiltinRunner:
             allocated_blocks_id: List[int] = []
 
             if isinstance(job, Fill):
-                job.context.token_ids.extend(job.token_ids)
-                job.context.allocate(len(job.token_ids))
+                job.context.token_ids.extend(job.iter_token_ids)
+                job.context.allocate(len(job.iter_token_ids))
             elif isinstance(job, Generate):
                 job.context.allocate(1)
                 last_hidden_state = job.context.get_last_hidden_state()
@@ -136,9 +136,9 @@ class BuiltinRunner:
         for job in jobs:
             context_len = job.context.get_context_len()
             if isinstance(job, Fill):
-                input_ids.extend(job.token_ids)
+                input_ids.extend(job.iter_token_ids)
                 input_positions.extend(
-                    range(context_len - len(job.token_ids), context_len)
+                    range(context_len - len(job.iter_token_ids), context_len)
                 )
             elif isinstance(job, Generate):
                 input_ids.append(job.context.get_last_token_id())
@@ -179,7 +179,9 @@ class BuiltinRunner:
             assert job.context is not None, "Context should be assigned."
             if isinstance(job, Fill):
                 job.context.last_hidden_state = fill_hidden_states[i]
-                job.finish_event.set()
+                # NOTE: A chunked Fill is finished after its last chunk.
+                if job.finish_iter():
+                    job.finish_event.set()
             elif isinstance(job, Generate):
                 token_id = next_tokens[i - iteration_state.num_fill_jobs]
                 job.put_token(token_id)
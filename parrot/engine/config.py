@@ -133,6 +133,8 @@ class EngineConfig:
     # Forward from runner config
     dtype: Literal["float16", "float32"] = "float16"
     device: str = "cuda"  # cpu, cuda, cuda:x
+    # Tokens per KV cache block. 1 for engines without paged KV cache.
+    block_size: int = 1
 
     # Max threads the engine can handle.
     tasks_capacity: int = 256
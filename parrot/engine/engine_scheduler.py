@@ -5,6 +5,7 @@
 from typing import List, Dict
 import time
 
+from parrot.constants import FILL_NO_CHUNK, DECODE_NO_BATCH_SIZE_LIMIT
 from parrot.exceptions import parrot_assert
 from parrot.utils import get_logger, time_counter_in_nanoseconds
 
@@ -23,11 +24,21 @@ class EngineScheduler:
     next batch.
     """
 
-    def __init__(self, config: SchedulerConfig) -> None:
+    def __init__(
+        self, config: SchedulerConfig, fill_chunk_size: int = FILL_NO_CHUNK
+    ) -> None:
         self.max_batch_size = config.max_batch_size
         self.max_num_batched_tokens = config.max_num_batched_tokens
         self.max_total_tokens = config.max_total_tokens
 
+        # Chunked prefill. Long Fills are split into chunks of fill_chunk_size tokens, which
+        # are interleaved with running Generate jobs so that they won't block the decoding.
+        parrot_assert(
+            fill_chunk_size == FILL_NO_CHUNK or fill_chunk_size > 0,
+            f"Invalid fill_chunk_size: {fill_chunk_size}",
+        )
+        self.fill_chunk_size = fill_chunk_size
+
         self.waiting_jobs: List[PrimitiveJob] = []
         self.running_jobs: List[PrimitiveJob] = []
 
@@ -57,6 +68,40 @@ class EngineScheduler:
         if job.end_flag:
             self.task_arrival_time.pop(job.task_id)
 
+    @property
+    def chunked_fill_enabled(self) -> bool:
+        return self.fill_chunk_size != FILL_NO_CHUNK
+
+    def _set_fill_chunk(self, job: Fill, budget: int) -> int:
+        """Decide the number of tokens of a Fill job in the next iteration.
+
+        Args:
+            job: The Fill job.
+            budget: The number of tokens left in the batch.
+
+        Returns:
+            The number of tokens to fill in the next iteration.
+        """
+
+        job.chunk_num = min(job.num_remaining_tokens, self.fill_chunk_size, budget)
+        return job.chunk_num
+
+    @staticmethod
+    def _is_prior_job(job: PrimitiveJob) -> bool:
+        return isinstance(job, Fill) and job.prefill_priority
+
+    def _get_decode_batch_size_limit(self) -> int:
+        """The max number of decoding jobs allowed by the running Generate jobs."""
+
+        limit = self.max_batch_size
+        for job in self.running_jobs:
+            if (
+                isinstance(job, Generate)
+                and job.decode_batch_size_upperbound != DECODE_NO_BATCH_SIZE_LIMIT
+            ):
+                limit = min(limit, job.decode_batch_size_upperbound)
+        return limit
+
     @property
     def num_running_jobs(self) -> int:
         """Get the number of running jobs."""
@@ -162,9 +207,31 @@ class EngineScheduler:
             ret = self.running_jobs.copy()
         else:
             cur_num_jobs = len(self.running_jobs)
-            cur_num_batched_tokens = len(
-                self.running_jobs
-            )  # Note: running jobs must be all Gen jobs.
+            # Note: running jobs must be all Gen jobs, except partially filled Fills in
+            # chunked prefill mode.
+            cur_num_batched_tokens = sum(
+                [1 for job in self.running_jobs if isinstance(job, Generate)]
+            )
+
+            # Running Fills (with chunks left) share the remaining token budget.
+            for job in self.running_jobs:
+                if isinstance(job, Fill) and self.chunked_fill_enabled:
+                    # NOTE: A running Fill fills at least one token per iteration,
+                    # otherwise it would be an empty job in the batch.
+                    cur_num_batched_tokens += self._set_fill_chunk(
+                        job,
+                        max(self.max_num_batched_tokens - cur_num_batched_tokens, 1),
+                    )
+
+            # Prefill-priority Fills go before other waiting jobs. (Stable, so FIFO otherwise)
+            self.waiting_jobs.sort(key=lambda job: not self._is_prior_job(job))
+
+            # Running Generate jobs with decode_batch_size_upperbound limit the number of
+            # decoding jobs in the batch.
+            cur_num_gens = sum(
+                [1 for job in self.running_jobs if isinstance(job, Generate)]
+            )
+            decode_batch_size_limit = self._get_decode_batch_size_limit()
 
             # print(
             #     f"Scheduling: Waiting: {len(self.waiting_jobs)} Running: {len(self.running_jobs)}"
@@ -173,11 +240,27 @@ class EngineScheduler:
             while self.waiting_jobs:
                 job = self.waiting_jobs[0]
 
-                job_num_tokens = (
-                    1
-                    if isinstance(job, Generate) or job.token_ids is None
-                    else len(job.token_ids)
-                )
+                if isinstance(job, Generate):
+                    if job.decode_batch_size_upperbound != DECODE_NO_BATCH_SIZE_LIMIT:
+                        decode_batch_size_limit = min(
+                            decode_batch_size_limit, job.decode_batch_size_upperbound
+                        )
+                    if cur_num_gens + 1 > decode_batch_size_limit:
+                        break
+
+                if isinstance(job, Generate) or job.token_ids is None:
+                    job_num_tokens = 1
+                elif self.chunked_fill_enabled:
+                    # No budget left for any chunk of this Fill.
+                    if cur_num_batched_tokens >= self.max_num_batched_tokens:
+                        break
+                    job_num_tokens = min(
+                        job.num_remaining_tokens,
+                        self.fill_chunk_size,
+                        self.max_num_batched_tokens - cur_num_batched_tokens,
+                    )
+                else:
+                    job_num_tokens = job.num_remaining_tokens
                 # Constraints
                 if cur_num_jobs + 1 > self.max_batch_size:
                     break
@@ -188,6 +271,8 @@ class EngineScheduler:
                     break
 
                 self.running_jobs.append(job)
+                if isinstance(job, Fill) and self.chunked_fill_enabled:
+                    job.chunk_num = job_num_tokens
                 if job.start_time == -1:
                     job.start_time = time.perf_counter_ns()
                 self.waiting_jobs.pop(0)
@@ -195,6 +280,8 @@ class EngineScheduler:
                 # Update
                 cur_num_jobs += 1
                 cur_num_batched_tokens += job_num_tokens
+                if isinstance(job, Generate):
+                    cur_num_gens += 1
 
             # Check total tokens constraint and do preemption
 
@@ -211,8 +298,10 @@ class EngineScheduler:
 
             # For normal mode, we repeatly count prefix because it's repeated loaded.
 
+            # Prefill-priority Fills are the last to be preempted.
             self.running_jobs.sort(
                 key=lambda job: (
+                    not self._is_prior_job(job),
                     self.task_arrival_time[job.task_id],
                     self.job_arrival_time[job.context_id],
                 )
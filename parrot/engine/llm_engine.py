@@ -8,7 +8,6 @@ import asyncio
 import time
 import threading
 
-from parrot.constants import ENGINE_LOOP_INTERVAL
 from parrot.protocol.internal.layer_apis import register_engine, engine_heartbeat
 from parrot.protocol.internal.runtime_info import EngineRuntimeInfo
 from parrot.utils import get_logger, set_random_seed
@@ -44,6 +43,9 @@ class LLMEngine(ABC):
             target=self._heartbeat_daemon, daemon=True
         )
 
+        # Set when a new job is added. The engine loop parks on it when there is no job.
+        self._new_job_event = asyncio.Event()
+
     def _register_engine(self, engine_config: EngineConfig):
         """Register engine to ServeCore."""
 
@@ -120,6 +122,35 @@ class LLMEngine(ABC):
 
     # Implemented methods
 
+    def _wakeup(self):
+        """Wake up the engine loop. Must be called when a new job is added."""
+
+        self._new_job_event.set()
+
+    def is_idle(self) -> bool:
+        """Whether the engine has no job to execute."""
+
+        return self.scheduler.is_empty
+
+    async def free_contexts(self, payload: Dict) -> Dict:
+        """Free a batch of contexts in one request.
+
+        Args:
+            payload: Dict[str, Any]. The payload, containing a list of context ids.
+
+        Returns:
+            Dict. The response, containing the freed length of each context.
+        """
+
+        context_lens = []
+        for context_id in payload["context_ids"]:
+            resp = await self.free_context({"context_id": context_id})
+            context_lens.append(resp["context_len"])
+
+        return {
+            "context_lens": context_lens,
+        }
+
     def heartbeat(self):
         """Heartbeat sent to ServeCore.
 
@@ -165,5 +196,13 @@ class LLMEngine(ABC):
         self.heartbeat_thread.start()
 
         while True:
-            await asyncio.sleep(ENGINE_LOOP_INTERVAL)
+            # Park until a new job comes, instead of spinning when idle.
+            if self.is_idle():
+                self._new_job_event.clear()
+                await self._new_job_event.wait()
+
+            # Run iterations back to back while there are jobs.
             await self.engine_iter()
+
+            # Yield to other coroutines (e.g. HTTP handlers) between iterations.
+            await asyncio.sleep(0)
@@ -10,7 +10,7 @@ import asyncio
 from parrot.utils import get_logger, create_task_in_loop, time_counter_in_nanoseconds
 from parrot.sampling_config import SamplingConfig
 from parrot.protocol.internal.runtime_info import EngineRuntimeInfo
-from parrot.constants import UNKNOWN_DATA_FIELD
+from parrot.constants import UNKNOWN_DATA_FIELD, DECODE_NO_BATCH_SIZE_LIMIT
 
 from .api_endpoint import Endpoint
 from ..context.text_context import TextContext
@@ -82,6 +82,7 @@ class OpenAIEngine(LLMEngine):
             job,
             TextContext,
         )
+        self._wakeup()
 
     async def _execute_job(self, job: PrimitiveJob):
         if isinstance(job, Fill):
@@ -136,6 +137,7 @@ class OpenAIEngine(LLMEngine):
             context_id=payload["context_id"],
             parent_context_id=payload["parent_context_id"],
             text=payload["text"],
+            prefill_priority=payload.get("prefill_priority", False),
         )
 
         self._add_job(fill_job)
@@ -155,6 +157,9 @@ class OpenAIEngine(LLMEngine):
             context_id=payload["context_id"],
             parent_context_id=payload["parent_context_id"],
             sampling_config=SamplingConfig(**payload["sampling_config"]),
+            decode_batch_size_upperbound=payload.get(
+                "decode_batch_size_upperbound", DECODE_NO_BATCH_SIZE_LIMIT
+            ),
         )
 
         self._add_job(generation_job)
@@ -5,6 +5,7 @@
 from typing import List, Optional
 from asyncio import Event, Queue as AsyncQueue
 
+from parrot.constants import DECODE_NO_BATCH_SIZE_LIMIT
 from parrot.sampling_config import SamplingConfig
 
 from .context.low_level_context import LowLevelContext
@@ -49,10 +50,45 @@ class Fill(PrimitiveJob):
         end_flag: bool = False,
         token_ids: Optional[List[int]] = None,
         text: Optional[str] = None,
+        prefill_priority: bool = False,
     ) -> None:
         super().__init__(session_id, task_id, context_id, parent_context_id, end_flag)
         self.token_ids = token_ids
         self.text = text
+        # Scheduled before other waiting jobs. (For TTFT-critical tasks)
+        self.prefill_priority = prefill_priority
+
+        # Chunked prefill: a long Fill may be executed in several iterations.
+        self.filled_num = 0  # Number of tokens already filled.
+        # Number of tokens to fill in the next iteration. None means all remaining tokens.
+        self.chunk_num: Optional[int] = None
+
+    @property
+    def num_remaining_tokens(self) -> int:
+        """Number of tokens not filled yet."""
+
+        if self.token_ids is None:
+            return 0
+        return len(self.token_ids) - self.filled_num
+
+    @property
+    def iter_token_ids(self) -> List[int]:
+        """Token ids to fill in the current iteration."""
+
+        if self.chunk_num is None:
+            return self.token_ids[self.filled_num :]
+        return self.token_ids[self.filled_num : self.filled_num + self.chunk_num]
+
+    def finish_iter(self) -> bool:
+        """Mark the tokens of the current iteration filled.
+
+        Returns:
+            Whether the whole Fill is finished.
+        """
+
+        self.filled_num += len(self.iter_token_ids)
+        self.chunk_num = None
+        return self.num_remaining_tokens == 0
 
     def __repr__(self) -> str:
         return (
@@ -77,9 +113,12 @@ class Generate(PrimitiveJob):
         parent_context_id: int,
         sampling_config: SamplingConfig,
         end_flag: bool = False,
+        decode_batch_size_upperbound: int = DECODE_NO_BATCH_SIZE_LIMIT,
     ) -> None:
         super().__init__(session_id, task_id, context_id, parent_context_id, end_flag)
         self.sampling_config = sampling_config
+        # Max number of decoding jobs batched with this job. (For TPOT-critical tasks)
+        self.decode_batch_size_upperbound = decode_batch_size_upperbound
         self.output_queue: AsyncQueue[int] = AsyncQueue()  # For token streaming
         self.gen_text = ""  # For text generation
         self.gen_length = 0
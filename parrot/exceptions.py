@@ -17,6 +17,15 @@ class ParrotCoreUserError(ParrotError):
     to the client to handle it."""
 
 
+class ParrotCoreOverloadedError(ParrotCoreUserError):
+    """The ServeCore is overloaded and doesn't admit the request. The client should retry it
+    after `retry_after` seconds."""
+
+    def __init__(self, exception: Exception, retry_after: float) -> None:
+        super().__init__(exception)
+        self.retry_after = retry_after
+
+
 class ParrotEngineUserError(ParrotError):
     """This type of error doesn't affect the internal state of Engine. It will be passed back
     to the client to handle it."""
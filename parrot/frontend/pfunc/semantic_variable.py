@@ -2,7 +2,7 @@
 # Licensed under the MIT license.
 
 
-from typing import Optional
+from typing import Optional, AsyncGenerator
 
 from parrot.utils import get_logger
 
@@ -70,10 +70,12 @@ class SemanticVariable:
                 f"VM environment is not set. Set variable (id={self.id}) failed."
             )
 
-    def _get_semantic_variable(self, criteria: PerformanceCriteria) -> str:
+    def _get_semantic_variable(
+        self, criteria: PerformanceCriteria, ddl: Optional[float]
+    ) -> str:
         if self._has_vm_env():
             return self._virtual_machine_env.get_semantic_variable_handler(
-                self.id, criteria
+                self.id, criteria, ddl
             )
         else:
             logger.warning(
@@ -81,10 +83,12 @@ class SemanticVariable:
             )
             return ""
 
-    async def _aget_semantic_variable(self, criteria: PerformanceCriteria) -> str:
+    async def _aget_semantic_variable(
+        self, criteria: PerformanceCriteria, ddl: Optional[float]
+    ) -> str:
         if self._has_vm_env():
             return await self._virtual_machine_env.aget_semantic_variable_handler(
-                self.id, criteria
+                self.id, criteria, ddl
             )
         else:
             logger.warning(
@@ -92,6 +96,19 @@ class SemanticVariable:
             )
             return ""
 
+    async def _aget_semantic_variable_stream(
+        self, criteria: PerformanceCriteria, ddl: Optional[float]
+    ) -> AsyncGenerator[str, None]:
+        if self._has_vm_env():
+            async for chunk in self._virtual_machine_env.aget_semantic_variable_stream_handler(
+                self.id, criteria, ddl
+            ):
+                yield chunk
+        else:
+            logger.warning(
+                f"VM environment is not set. Get variable (id={self.id}) failed."
+            )
+
     # ---------- Public Methods ----------
 
     @property
@@ -116,24 +133,60 @@ class SemanticVariable:
         self.content = content
         return
 
-    def get(self, criteria: PerformanceCriteria) -> str:
-        """(Blocking) Get the content of the variable."""
+    def get(self, criteria: PerformanceCriteria, ddl: Optional[float] = None) -> str:
+        """(Blocking) Get the content of the variable.
+
+        Args:
+            criteria: PerformanceCriteria. The performance criteria of this get.
+            ddl: Optional[float]. The time budget (in seconds) of this get. If the content
+                can't be produced in time, the get fails early. None means no deadline.
+        """
 
         assert (self.is_registered, "The variable must be registered before getting.")
 
         if self.is_ready:
             return self.content
 
-        self.content = self._get_semantic_variable(criteria)
+        self.content = self._get_semantic_variable(criteria, ddl)
         return self.content
 
-    async def aget(self, criteria: PerformanceCriteria) -> str:
-        """(Asynchronous) Get the content of the variable."""
+    async def aget(
+        self, criteria: PerformanceCriteria, ddl: Optional[float] = None
+    ) -> str:
+        """(Asynchronous) Get the content of the variable. See get for the arguments."""
 
         assert (self.is_registered, "The variable must be registered before getting.")
 
         if self.is_ready:
             return self.content
 
-        content = await self._aget_semantic_variable(criteria)
+        content = await self._aget_semantic_variable(criteria, ddl)
         return content
+
+    async def astream(
+        self,
+        criteria: PerformanceCriteria = PerformanceCriteria.LATENCY,
+        ddl: Optional[float] = None,
+    ) -> AsyncGenerator[str, None]:
+        """(Asynchronous) Iterate the content of the variable chunk by chunk, as soon as
+        chunks are generated.
+
+        After the iteration, the variable holds the whole content.
+        """
+
+        assert self.is_registered, "The variable must be registered before getting."
+
+        if self.is_ready:
+            yield self.content
+            return
+
+        chunks = []
+        async for chunk in self._aget_semantic_variable_stream(criteria, ddl):
+            chunks.append(chunk)
+            yield chunk
+        self.content = "".join(chunks)
+
+    def __aiter__(self) -> AsyncGenerator[str, None]:
+        """`async for chunk in var` streams the content with the default criteria."""
+
+        return self.astream()
@@ -8,7 +8,16 @@ import time
 import traceback
 import importlib
 import inspect
-from typing import Callable, Optional, Literal, Dict, List, Any, Generator
+from typing import (
+    Callable,
+    Optional,
+    Literal,
+    Dict,
+    List,
+    Any,
+    Generator,
+    AsyncGenerator,
+)
 
 from parrot.constants import NONE_SESSION_ID
 
@@ -22,7 +31,10 @@ from parrot.protocol.public.apis import (
     set_semantic_variable,
     get_semantic_variable,
     aget_semantic_variable,
+    aget_semantic_variable_stream,
 )
+from parrot.protocol.http_utils import close_client_sessions
+from parrot.exceptions import ParrotCoreOverloadedError
 
 from parrot.utils import time_counter_in_nanoseconds
 
@@ -52,11 +64,22 @@ class VirtualMachine:
     """
 
     def __init__(
-        self, core_http_addr: str, mode: Literal["release", "debug"] = "release"
+        self,
+        core_http_addr: str,
+        mode: Literal["release", "debug"] = "release",
+        session_weight: float = 1.0,
+        max_submit_retries: int = 32,
     ) -> None:
         # Public info (User can directly access): core_http_addr, session_id
         self.core_http_addr = core_http_addr
 
+        # Weight of the session when the scheduler shares engines among sessions fairly.
+        self.session_weight = session_weight
+
+        # Max times of resubmitting a call, when the ServeCore is overloaded and asks the VM
+        # to retry later.
+        self.max_submit_retries = max_submit_retries
+
         # Register session and get session_id
         self.session_id = NONE_SESSION_ID
         self._session_auth = ""
@@ -77,6 +100,12 @@ class VirtualMachine:
     def _get_session_id_str(self) -> str:
         return "NONE" if self.session_id == NONE_SESSION_ID else f"{self.session_id}"
 
+    def _log_overloaded(self, e: ParrotCoreOverloadedError) -> None:
+        logger.warning(
+            f"VM (session_id={self._get_session_id_str()}): ServeCore is overloaded. "
+            f"Resubmit the call after {e.retry_after:.2f} s."
+        )
+
     # ----------Methods for Program Interface ----------
 
     def register_semantic_variable_handler(self, var_name: str) -> str:
@@ -121,13 +150,18 @@ class VirtualMachine:
         )
 
     def get_semantic_variable_handler(
-        self, var_id: str, criteria: PerformanceCriteria
+        self,
+        var_id: str,
+        criteria: PerformanceCriteria,
+        ddl: Optional[float] = None,
     ) -> str:
         """Fetch the content of a SemanticVariable.
 
         Args:
             var_id: str. The id of the SemanticVariable.
             criteria: PerformanceCriteria. The performance criteria for fetching the variable.
+            ddl: Optional[float]. The time budget (in seconds) for fetching the variable.
+                None means no deadline.
 
         Returns:
             str: The content of the SemanticVariable.
@@ -139,17 +173,23 @@ class VirtualMachine:
             session_auth=self._session_auth,
             var_id=var_id,
             criteria=get_performance_criteria_str(criteria),
+            ddl=ddl,
         )
         return resp.content
 
     async def aget_semantic_variable_handler(
-        self, var_id: str, criteria: PerformanceCriteria
+        self,
+        var_id: str,
+        criteria: PerformanceCriteria,
+        ddl: Optional[float] = None,
     ) -> str:
         """(Async) Fetch the content of a SemanticVariable.
 
         Args:
             var_id: str. The id of the SemanticVariable.
             criteria: PerformanceCriteria. The performance criteria for fetching the variable.
+            ddl: Optional[float]. The time budget (in seconds) for fetching the variable.
+                None means no deadline.
 
         Returns:
             str: The content of the SemanticVariable.
@@ -161,9 +201,38 @@ class VirtualMachine:
             session_auth=self._session_auth,
             var_id=var_id,
             criteria=get_performance_criteria_str(criteria),
+            ddl=ddl,
         )
         return resp.content
 
+    async def aget_semantic_variable_stream_handler(
+        self,
+        var_id: str,
+        criteria: PerformanceCriteria,
+        ddl: Optional[float] = None,
+    ) -> AsyncGenerator[str, None]:
+        """(Async) Fetch the content of a SemanticVariable in streaming mode.
+
+        Args:
+            var_id: str. The id of the SemanticVariable.
+            criteria: PerformanceCriteria. The performance criteria for fetching the variable.
+            ddl: Optional[float]. The time budget (in seconds) for fetching the variable.
+                None means no deadline.
+
+        Yields:
+            str: Chunks of the content, as soon as they are generated.
+        """
+
+        async for chunk in aget_semantic_variable_stream(
+            http_addr=self.core_http_addr,
+            session_id=self.session_id,
+            session_auth=self._session_auth,
+            var_id=var_id,
+            criteria=get_performance_criteria_str(criteria),
+            ddl=ddl,
+        ):
+            yield chunk
+
     def register_function_handler(self, func: BasicFunction) -> None:
         """Register a function to the VM."""
 
@@ -191,12 +260,21 @@ class VirtualMachine:
             f"VM (session_id={self._get_session_id_str()}) submits SemanticCall: {call.func.name}"
         )
 
-        resp = submit_semantic_call(
-            http_addr=self.core_http_addr,
-            session_id=self.session_id,
-            session_auth=self._session_auth,
-            payload=call.to_request_payload(),
-        )
+        payload = call.to_request_payload()
+        for i in range(self.max_submit_retries + 1):
+            try:
+                resp = submit_semantic_call(
+                    http_addr=self.core_http_addr,
+                    session_id=self.session_id,
+                    session_auth=self._session_auth,
+                    payload=payload,
+                )
+                break
+            except ParrotCoreOverloadedError as e:
+                if i == self.max_submit_retries:
+                    raise e
+                self._log_overloaded(e)
+                time.sleep(e.retry_after)
 
         return resp.placeholders_mapping
 
@@ -214,12 +292,21 @@ class VirtualMachine:
             f"VM (session_id={self._get_session_id_str()}) submits SemanticCall: {call.func.name}"
         )
 
-        resp = await asubmit_semantic_call(
-            http_addr=self.core_http_addr,
-            session_id=self.session_id,
-            session_auth=self._session_auth,
-            payload=call.to_request_payload(),
-        )
+        payload = call.to_request_payload()
+        for i in range(self.max_submit_retries + 1):
+            try:
+                resp = await asubmit_semantic_call(
+                    http_addr=self.core_http_addr,
+                    session_id=self.session_id,
+                    session_auth=self._session_auth,
+                    payload=payload,
+                )
+                break
+            except ParrotCoreOverloadedError as e:
+                if i == self.max_submit_retries:
+                    raise e
+                self._log_overloaded(e)
+                await asyncio.sleep(e.retry_after)
 
         return resp.placeholders_mapping
 
@@ -232,7 +319,9 @@ class VirtualMachine:
     def register_session(self) -> None:
         """Register a session to the ServeCore."""
 
-        resp = register_session(http_addr=self.core_http_addr, api_key="1")
+        resp = register_session(
+            http_addr=self.core_http_addr, api_key="1", weight=self.session_weight
+        )
         self.session_id = resp.session_id
         self._session_auth = resp.session_auth
 
@@ -400,6 +489,8 @@ class VirtualMachine:
             if coroutine:
                 loop = asyncio.new_event_loop()
                 loop.run_until_complete(coroutine)
+                # Pooled ClientSessions are bound to the loop. Close them before the loop.
+                loop.run_until_complete(close_client_sessions())
                 loop.close()
             else:
                 program(*args)
@@ -2,10 +2,14 @@
 # Licensed under the MIT license.
 
 
-from typing import Type, Optional, Literal
+import asyncio
+import codecs
+from typing import Type, Optional, Literal, Dict, Tuple
 import requests
 import aiohttp
 
+from parrot.constants import HTTP_CLIENT_CONN_LIMIT, HTTP_CLIENT_KEEPALIVE_TIME
+from parrot.exceptions import ParrotCoreOverloadedError
 from parrot.utils import get_logger
 
 from .base_response import BaseResponse, make_response, async_make_response
@@ -14,6 +18,83 @@ from .base_response import BaseResponse, make_response, async_make_response
 logger = get_logger("API")
 
 
+class ClientSessionPool:
+    """A process-wide pool of persistent aiohttp ClientSessions, keyed by the http address.
+
+    Requests to the same address reuse one ClientSession, hence keep-alive connections, instead of
+    paying TCP setup and session construction per request.
+
+    NOTE: A ClientSession is bound to the event loop it is created in. So sessions
+    are also keyed by the running loop, and should be closed (close_all) before the loop is closed.
+    """
+
+    def __init__(
+        self,
+        conn_limit: int = HTTP_CLIENT_CONN_LIMIT,
+        keepalive_time: float = HTTP_CLIENT_KEEPALIVE_TIME,
+    ):
+        self.conn_limit = conn_limit
+        self.keepalive_time = keepalive_time
+
+        # (http_addr, loop) -> ClientSession
+        self._sessions: Dict[
+            Tuple[str, asyncio.AbstractEventLoop], aiohttp.ClientSession
+        ] = {}
+
+    def get_session(self, http_addr: str) -> aiohttp.ClientSession:
+        """Get the pooled ClientSession of an address. Must be called in a running loop."""
+
+        key = (http_addr, asyncio.get_running_loop())
+        client_session = self._sessions.get(key)
+        if client_session is None or client_session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.conn_limit,
+                keepalive_timeout=self.keepalive_time,
+            )
+            client_session = aiohttp.ClientSession(connector=connector)
+            self._sessions[key] = client_session
+        return client_session
+
+    async def close_all(self) -> None:
+        """Close all pooled sessions of the running loop."""
+
+        loop = asyncio.get_running_loop()
+        for key in list(self._sessions.keys()):
+            if key[1] is loop:
+                client_session = self._sessions.pop(key)
+                await client_session.close()
+
+
+_client_session_pool = ClientSessionPool()
+
+
+def set_client_session_conn_limit(conn_limit: int) -> None:
+    """Set the concurrency limit per address of newly created pooled sessions."""
+
+    _client_session_pool.conn_limit = conn_limit
+
+
+def get_client_session(http_addr: str) -> aiohttp.ClientSession:
+    """Get the process-wide pooled ClientSession for an address."""
+
+    return _client_session_pool.get_session(http_addr)
+
+
+async def close_client_sessions() -> None:
+    """Shutdown hook: close all pooled ClientSessions of the running loop."""
+
+    await _client_session_pool.close_all()
+
+
+def _raise_if_overloaded(status_code: int, resp_data: Dict) -> None:
+    """The server rejects the request with a retry-after hint (HTTP 503)."""
+
+    if status_code == 503 and "retry_after" in resp_data:
+        raise ParrotCoreOverloadedError(
+            RuntimeError(resp_data["error"]), retry_after=resp_data["retry_after"]
+        )
+
+
 def send_http_request(
     response_cls: Type[BaseResponse],
     http_addr: str,
@@ -46,6 +127,7 @@ def send_http_request(
 
     if error_resp is not None:  # and error_resp.status_code == 500:
         resp_data = error_resp.json()
+        _raise_if_overloaded(error_resp.status_code, resp_data)
         assert "error" in resp_data
         assert "traceback" in resp_data
         raise RuntimeError(f"{resp_data['error']}\n{resp_data['traceback']}")
@@ -55,6 +137,11 @@ def send_http_request(
     raise error
 
 
+async def _async_raise_if_overloaded(resp: aiohttp.ClientResponse) -> None:
+    if resp.status == 503:
+        _raise_if_overloaded(resp.status, await resp.json())
+
+
 async def async_send_http_request(
     client_session: aiohttp.ClientSession,
     response_cls: Type[BaseResponse],
@@ -67,14 +154,17 @@ async def async_send_http_request(
     url = http_addr + api_url
     if method == "GET":
         async with client_session.get(url, json=kwargs, timeout=timeout) as resp:
+            await _async_raise_if_overloaded(resp)
             assert resp.ok, f"Send http request error: {resp.reason}"
             return await async_make_response(response_cls, resp)
     elif method == "POST":
         async with client_session.post(url, json=kwargs, timeout=timeout) as resp:
+            await _async_raise_if_overloaded(resp)
             assert resp.ok, f"Send http request error: {resp.reason}"
             return await async_make_response(response_cls, resp)
     elif method == "DELETE":
         async with client_session.delete(url, json=kwargs, timeout=timeout) as resp:
+            await _async_raise_if_overloaded(resp)
             assert resp.ok, f"Send http request error: {resp.reason}"
             return await async_make_response(response_cls, resp)
     else:
@@ -94,3 +184,25 @@ async def async_send_http_request_streaming(
         # assert resp.ok, "Send http request error."
         async for chunk in reader.content.iter_chunked(4):
             yield int().from_bytes(chunk, "big")
+
+
+async def async_send_http_request_text_streaming(
+    client_session: aiohttp.ClientSession,
+    http_addr: str,
+    api_url: str,
+    method: Literal["GET", "POST"] = "GET",
+    **kwargs,
+):
+    url = http_addr + api_url
+
+    # NOTE: A multi-byte character may be split across chunks.
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    async with client_session.request(method, url, json=kwargs) as reader:
+        assert reader.ok, f"Send http request error: {reader.reason}"
+        async for chunk in reader.content.iter_any():
+            text = decoder.decode(chunk)
+            if text != "":
+                yield text
+        text = decoder.decode(b"", final=True)
+        if text != "":
+            yield text
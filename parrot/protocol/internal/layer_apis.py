@@ -2,14 +2,17 @@
 # Licensed under the MIT license.
 
 
-import aiohttp
 from dataclasses import asdict
 from typing import List, Dict
 
 from parrot.utils import get_logger
 
 from ..base_response import BaseResponse
-from ..http_utils import send_http_request
+from ..http_utils import (
+    send_http_request,
+    async_send_http_request,
+    get_client_session,
+)
 from .runtime_info import EngineRuntimeInfo
 
 
@@ -25,6 +28,7 @@ Engine Management (Engine side):
 
 Context & LLMs:
     - free_context POST
+    - free_contexts POST
     - fill POST
     - generate POST
     - generate_stream POST
@@ -54,6 +58,10 @@ class FreeContextResponse(BaseResponse):
     context_len: int
 
 
+class FreeContextsResponse(BaseResponse):
+    context_lens: List[int]
+
+
 class FillResponse(BaseResponse):
     filled_len: int
 
@@ -80,6 +88,23 @@ def free_context(http_addr: str, context_id: int) -> FreeContextResponse:
         raise e
 
 
+async def afree_contexts(
+    http_addr: str, context_ids: List[int]
+) -> FreeContextsResponse:
+    try:
+        client_session = get_client_session(http_addr)
+        return await async_send_http_request(
+            client_session=client_session,
+            response_cls=FreeContextsResponse,
+            http_addr=http_addr,
+            api_url="/free_contexts",
+            context_ids=context_ids,
+        )
+    except BaseException as e:
+        logger.error(f"Free contexts error in {http_addr}. Error: {e}")
+        raise e
+
+
 def ping_engine(http_addr: str) -> PingEngineResponse:
     try:
         return send_http_request(
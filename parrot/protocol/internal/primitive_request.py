@@ -5,11 +5,12 @@
 from dataclasses import dataclass, asdict
 from typing import List, Optional, AsyncGenerator
 import time
-import aiohttp
 
+from parrot.constants import DECODE_NO_BATCH_SIZE_LIMIT
 from parrot.utils import get_logger, time_counter_in_nanoseconds
 
 from ..http_utils import (
+    get_client_session,
     send_http_request,
     async_send_http_request,
     async_send_http_request_streaming,
@@ -43,6 +44,7 @@ class Fill(Primitive):
 
     token_ids: Optional[List[int]] = None
     text: Optional[str] = None
+    prefill_priority: bool = False
 
     def post(self, engine_url: str) -> FillResponse:
         try:
@@ -59,6 +61,7 @@ class Fill(Primitive):
                 end_flag=self.end_flag,
                 token_ids=self.token_ids,
                 text=self.text,
+                prefill_priority=self.prefill_priority,
             )
             ed = time_counter_in_nanoseconds()
             logger.debug(
@@ -71,25 +74,26 @@ class Fill(Primitive):
 
     async def apost(self, engine_url: str) -> FillResponse:
         try:
-            async with aiohttp.ClientSession() as client_session:
-                st = time_counter_in_nanoseconds()
-                resp: FillResponse = await async_send_http_request(
-                    client_session=client_session,
-                    response_cls=FillResponse,
-                    http_addr=engine_url,
-                    api_url="/fill",
-                    session_id=self.session_id,
-                    task_id=self.task_id,
-                    context_id=self.context_id,
-                    end_flag=self.end_flag,
-                    parent_context_id=self.parent_context_id,
-                    token_ids=self.token_ids,
-                    text=self.text,
-                )
-                ed = time_counter_in_nanoseconds()
-                logger.debug(
-                    f"Fill request latency: {(ed - st) / 1e6} ms. session_id={self.session_id}, task_id={self.task_id}"
-                )
+            client_session = get_client_session(engine_url)
+            st = time_counter_in_nanoseconds()
+            resp: FillResponse = await async_send_http_request(
+                client_session=client_session,
+                response_cls=FillResponse,
+                http_addr=engine_url,
+                api_url="/fill",
+                session_id=self.session_id,
+                task_id=self.task_id,
+                context_id=self.context_id,
+                end_flag=self.end_flag,
+                parent_context_id=self.parent_context_id,
+                token_ids=self.token_ids,
+                text=self.text,
+                prefill_priority=self.prefill_priority,
+            )
+            ed = time_counter_in_nanoseconds()
+            logger.debug(
+                f"Fill request latency: {(ed - st) / 1e6} ms. session_id={self.session_id}, task_id={self.task_id}"
+            )
             # self.context.token_nums += resp.filled_len
             return resp
         except BaseException as e:
@@ -105,54 +109,57 @@ class Generate(Primitive):
     """
 
     sampling_config: SamplingConfig
+    decode_batch_size_upperbound: int = DECODE_NO_BATCH_SIZE_LIMIT
 
     async def apost(self, engine_url: str) -> GenerateResponse:
         try:
-            async with aiohttp.ClientSession() as client_session:
-                st = time_counter_in_nanoseconds()
-                resp: GenerateResponse = await async_send_http_request(
-                    client_session=client_session,
-                    response_cls=GenerateResponse,
-                    http_addr=engine_url,
-                    api_url="/generate",
-                    session_id=self.session_id,
-                    task_id=self.task_id,
-                    context_id=self.context_id,
-                    parent_context_id=self.parent_context_id,
-                    end_flag=self.end_flag,
-                    sampling_config=asdict(self.sampling_config),
-                )
-                ed = time_counter_in_nanoseconds()
-                logger.debug(
-                    f"Generate request latency: {(ed - st) / 1e6} ms. session_id={self.session_id}, task_id={self.task_id}"
-                )
-                # self.context.token_nums += len(resp.generated_ids)
-                return resp
+            client_session = get_client_session(engine_url)
+            st = time_counter_in_nanoseconds()
+            resp: GenerateResponse = await async_send_http_request(
+                client_session=client_session,
+                response_cls=GenerateResponse,
+                http_addr=engine_url,
+                api_url="/generate",
+                session_id=self.session_id,
+                task_id=self.task_id,
+                context_id=self.context_id,
+                parent_context_id=self.parent_context_id,
+                end_flag=self.end_flag,
+                sampling_config=asdict(self.sampling_config),
+                decode_batch_size_upperbound=self.decode_batch_size_upperbound,
+            )
+            ed = time_counter_in_nanoseconds()
+            logger.debug(
+                f"Generate request latency: {(ed - st) / 1e6} ms. session_id={self.session_id}, task_id={self.task_id}"
+            )
+            # self.context.token_nums += len(resp.generated_ids)
+            return resp
         except BaseException as e:
             logger.error(f"Generate error in {engine_url} error: {e}")
             raise e
 
     async def astream(self, engine_url: str) -> AsyncGenerator:
         try:
-            async with aiohttp.ClientSession() as client_session:
-                st = time_counter_in_nanoseconds()
-                async for resp in async_send_http_request_streaming(
-                    client_session=client_session,
-                    http_addr=engine_url,
-                    api_url="/generate_stream",
-                    session_id=self.session_id,
-                    task_id=self.task_id,
-                    context_id=self.context_id,
-                    end_flag=self.end_flag,
-                    parent_context_id=self.parent_context_id,
-                    sampling_config=asdict(self.sampling_config),
-                ):
-                    # self.context.token_nums += 1
-                    yield resp
-                ed = time_counter_in_nanoseconds()
-                logger.debug(
-                    f"Generate stream latency: {(ed - st) / 1e6} ms. session_id={self.session_id}, task_id={self.task_id}"
-                )
+            client_session = get_client_session(engine_url)
+            st = time_counter_in_nanoseconds()
+            async for resp in async_send_http_request_streaming(
+                client_session=client_session,
+                http_addr=engine_url,
+                api_url="/generate_stream",
+                session_id=self.session_id,
+                task_id=self.task_id,
+                context_id=self.context_id,
+                end_flag=self.end_flag,
+                parent_context_id=self.parent_context_id,
+                sampling_config=asdict(self.sampling_config),
+                decode_batch_size_upperbound=self.decode_batch_size_upperbound,
+            ):
+                # self.context.token_nums += 1
+                yield resp
+            ed = time_counter_in_nanoseconds()
+            logger.debug(
+                f"Generate stream latency: {(ed - st) / 1e6} ms. session_id={self.session_id}, task_id={self.task_id}"
+            )
         except BaseException as e:
             logger.error(f"Generate error in {engine_url} error: {e}")
             raise e
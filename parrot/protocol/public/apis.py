@@ -2,13 +2,18 @@
 # Licensed under the MIT license.
 
 
-from typing import Dict, List
-import aiohttp
+from typing import Dict, List, Optional, AsyncGenerator
 
+from parrot.exceptions import ParrotCoreOverloadedError
 from parrot.utils import get_logger
 
 from ..base_response import BaseResponse
-from ..http_utils import async_send_http_request, send_http_request
+from ..http_utils import (
+    async_send_http_request,
+    async_send_http_request_text_streaming,
+    send_http_request,
+    get_client_session,
+)
 from .api_version import API_VERSION
 
 
@@ -28,6 +33,7 @@ Semantic Variable (RESTful):
     - register_semantic_variable (`/semantic_var/`, POST)
     - set_semantic_variable (`/semantic_var/{var_id}`, POST)
     - get_semantic_variable (`/semantic_var/{var_id}`, GET)
+    - get_semantic_variable_stream (`/semantic_var/{var_id}/stream`, GET)
     - get_semantic_variable_list (`/semantic_var/`, GET)
 """
 
@@ -71,7 +77,9 @@ class GetSemanticVariableListResponse(BaseResponse):
 # ---------- APIs ----------
 
 
-def register_session(http_addr: str, api_key: str) -> RegisterSessionResponse:
+def register_session(
+    http_addr: str, api_key: str, weight: float = 1.0
+) -> RegisterSessionResponse:
     try:
         return send_http_request(
             RegisterSessionResponse,
@@ -79,6 +87,7 @@ def register_session(http_addr: str, api_key: str) -> RegisterSessionResponse:
             f"/{API_VERSION}/session",
             retry_times=1,
             api_key=api_key,
+            weight=weight,
         )
     except BaseException as e:
         logger.error(f"Register session error in {http_addr}. Error: {e}")
@@ -129,6 +138,9 @@ def submit_semantic_call(
             session_id=session_id,
             **payload,
         )
+    except ParrotCoreOverloadedError as e:
+        # Not an error. The caller should retry after e.retry_after seconds.
+        raise e
     except BaseException as e:
         logger.error(
             f"Submit call (session_id={session_id}) error in {http_addr}. Error: {e}"
@@ -140,16 +152,19 @@ async def asubmit_semantic_call(
     http_addr: str, session_id: int, session_auth: str, payload: Dict
 ) -> SubmitSemanticCallResponse:
     try:
-        async with aiohttp.ClientSession() as client_session:
-            return await async_send_http_request(
-                client_session,
-                SubmitSemanticCallResponse,
-                http_addr,
-                f"/{API_VERSION}/submit_semantic_call",
-                retry_times=1,
-                session_id=session_id,
-                **payload,
-            )
+        client_session = get_client_session(http_addr)
+        return await async_send_http_request(
+            client_session,
+            SubmitSemanticCallResponse,
+            http_addr,
+            f"/{API_VERSION}/submit_semantic_call",
+            retry_times=1,
+            session_id=session_id,
+            **payload,
+        )
+    except ParrotCoreOverloadedError as e:
+        # Not an error. The caller should retry after e.retry_after seconds.
+        raise e
     except BaseException as e:
         logger.error(
             f"Submit call (session_id={session_id}) error in {http_addr}. Error: {e}"
@@ -201,7 +216,12 @@ def set_semantic_variable(
 
 
 def get_semantic_variable(
-    http_addr: str, session_id: int, session_auth: str, var_id: str, criteria: str
+    http_addr: str,
+    session_id: int,
+    session_auth: str,
+    var_id: str,
+    criteria: str,
+    ddl: Optional[float] = None,
 ) -> GetSemanticVariableResponse:
     try:
         return send_http_request(
@@ -213,6 +233,7 @@ def get_semantic_variable(
             session_id=session_id,
             session_auth=session_auth,
             criteria=criteria,
+            ddl=ddl,
         )
     except BaseException as e:
         logger.error(
@@ -222,21 +243,27 @@ def get_semantic_variable(
 
 
 async def aget_semantic_variable(
-    http_addr: str, session_id: int, session_auth: str, var_id: str, criteria: str
+    http_addr: str,
+    session_id: int,
+    session_auth: str,
+    var_id: str,
+    criteria: str,
+    ddl: Optional[float] = None,
 ) -> GetSemanticVariableResponse:
     try:
-        async with aiohttp.ClientSession() as client_session:
-            return await async_send_http_request(
-                client_session,
-                GetSemanticVariableResponse,
-                http_addr,
-                f"/{API_VERSION}/semantic_var/{var_id}",
-                method="GET",
-                retry_times=1,
-                session_id=session_id,
-                session_auth=session_auth,
-                criteria=criteria,
-            )
+        client_session = get_client_session(http_addr)
+        return await async_send_http_request(
+            client_session,
+            GetSemanticVariableResponse,
+            http_addr,
+            f"/{API_VERSION}/semantic_var/{var_id}",
+            method="GET",
+            retry_times=1,
+            session_id=session_id,
+            session_auth=session_auth,
+            criteria=criteria,
+            ddl=ddl,
+        )
     except BaseException as e:
         logger.error(
             f"AGet semantic variable {var_id} (session_id={session_id}) error in {http_addr}. Error: {e}"
@@ -244,6 +271,34 @@ async def aget_semantic_variable(
         raise e
 
 
+async def aget_semantic_variable_stream(
+    http_addr: str,
+    session_id: int,
+    session_auth: str,
+    var_id: str,
+    criteria: str,
+    ddl: Optional[float] = None,
+) -> AsyncGenerator[str, None]:
+    try:
+        client_session = get_client_session(http_addr)
+        async for chunk in async_send_http_request_text_streaming(
+            client_session,
+            http_addr,
+            f"/{API_VERSION}/semantic_var/{var_id}/stream",
+            method="GET",
+            session_id=session_id,
+            session_auth=session_auth,
+            criteria=criteria,
+            ddl=ddl,
+        ):
+            yield chunk
+    except BaseException as e:
+        logger.error(
+            f"AGet semantic variable stream {var_id} (session_id={session_id}) error in {http_addr}. Error: {e}"
+        )
+        raise e
+
+
 def get_semantic_variable_list(
     http_addr: str, session_id: int, session_auth: str
 ) -> GetSemanticVariableListResponse:
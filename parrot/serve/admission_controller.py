@@ -0,0 +1,96 @@
+# Copyright (c) 2023 by Microsoft Corporation.
+# Licensed under the MIT license.
+
+
+from parrot.exceptions import ParrotCoreOverloadedError
+from parrot.utils import get_logger
+
+from .engine_manager import EngineManager
+from .scheduler import GlobalScheduler
+
+
+logger = get_logger("AdmissionController")
+
+
+class AdmissionController:
+    """AdmissionController decides whether a semantic call is admitted when it's submitted.
+
+    It predicts the queueing delay of the GlobalScheduler, i.e. the time for live engines to
+    work off the queued tasks. If the delay exceeds the limit, the call is rejected with a
+    retry-after hint (ParrotCoreOverloadedError), so clients slow down before the task queue
+    is full, instead of failing their requests.
+    """
+
+    def __init__(
+        self,
+        scheduler: GlobalScheduler,
+        engine_mgr: EngineManager,
+        max_queueing_delay: float,
+        min_retry_after: float,
+        max_retry_after: float,
+    ):
+        self.scheduler = scheduler
+        self.engine_mgr = engine_mgr
+        self.max_queueing_delay = max_queueing_delay  # In seconds
+        self.min_retry_after = min_retry_after  # In seconds
+        self.max_retry_after = max_retry_after  # In seconds
+
+    def estimate_queueing_delay(self) -> float:
+        """Estimate the time (in seconds) to work off the queued tasks.
+
+        Each live engine advances its running tasks by one iteration per (reported) iteration
+        latency. So the throughput of the engines is sum(batch_size / iter_latency).
+        """
+
+        queued_work = self.scheduler.queued_work
+        if queued_work <= 0:
+            return 0.0
+
+        throughput = 0.0  # Iterations per second
+        for engine in self.engine_mgr.get_live_engines():
+            iter_latency = engine.get_recent_average_latency()
+            if iter_latency <= 0:
+                iter_latency = self.scheduler.config.default_iter_latency
+            batch_size = max(engine.get_num_running_jobs(), engine.get_num_tasks(), 1)
+            throughput += batch_size / (iter_latency / 1e9)
+
+        # NOTE: Without engines, the delay can't be estimated. Tasks wait in the
+        # queue until engines are registered, which is bounded by max_queue_size.
+        if throughput == 0:
+            return 0.0
+
+        return queued_work / throughput
+
+    def check_admission(self, session_id: int) -> None:
+        """Check whether a new call of the session is admitted.
+
+        Args:
+            session_id: int. The session ID.
+
+        Raises:
+            ParrotCoreOverloadedError: If the call is not admitted.
+        """
+
+        queueing_delay = self.estimate_queueing_delay()
+        if queueing_delay <= self.max_queueing_delay:
+            return
+
+        # Time until the queue drains below the limit.
+        retry_after = min(
+            max(queueing_delay - self.max_queueing_delay, self.min_retry_after),
+            self.max_retry_after,
+        )
+
+        logger.warning(
+            f"Call of Session(session_id={session_id}) is not admitted. "
+            f"Estimated queueing delay: {queueing_delay:.2f} s, "
+            f"retry after: {retry_after:.2f} s."
+        )
+
+        raise ParrotCoreOverloadedError(
+            RuntimeError(
+                f"ServeCore is overloaded (estimated queueing delay: {queueing_delay:.2f} s). "
+                f"Please retry after {retry_after:.2f} s."
+            ),
+            retry_after=retry_after,
+        )
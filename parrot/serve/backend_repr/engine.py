@@ -3,7 +3,7 @@
 
 
 from enum import Enum
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Callable
 
 from parrot.protocol.internal.runtime_info import EngineRuntimeInfo
 
@@ -72,6 +72,14 @@ class ExecutionEngine:
         self._real_time_runtime_info = EngineRuntimeInfo()
         self._serve_layer_runtime_info = ServeLayerRuntimeInfo()
 
+        # Called when the runtime info (and hence the remaining capacity) changes.
+        # Set by EngineManager to maintain its engine index.
+        self.runtime_info_listener: Optional[Callable[["ExecutionEngine"], None]] = None
+
+    def _notify_runtime_info_changed(self) -> None:
+        if self.runtime_info_listener is not None:
+            self.runtime_info_listener(self)
+
     @classmethod
     def from_engine_config(
         cls, engine_id: int, config: EngineConfig
@@ -155,6 +163,7 @@ class ExecutionEngine:
         """Update the real-time runtime info of the engine."""
 
         self._real_time_runtime_info = runtime_info
+        self._notify_runtime_info_changed()
 
     def update_servelayer_runtime_info_add_task(self, task: "CompletionTask") -> None:
         """Update the serve-layer runtime info by a task scheduled to it."""
@@ -175,6 +184,8 @@ class ExecutionEngine:
             self._serve_layer_runtime_info.tokens_num += tokens_num
             debug_str = f" (Add {tokens_num} tokens, Total {self._serve_layer_runtime_info.tokens_num} tokens)"
 
+        self._notify_runtime_info_changed()
+
         # logger.debug(
         #     f"Task(task_id={task.task_id}) is scheduled to Engine(engine_id={self.engine_id})."
         #     + debug_str
@@ -197,6 +208,8 @@ class ExecutionEngine:
             self._serve_layer_runtime_info.tokens_num -= tokens_num
             debug_str = f" (Lose {tokens_num} tokens, Remaining {self._serve_layer_runtime_info.tokens_num} tokens)"
 
+        self._notify_runtime_info_changed()
+
         # logger.debug(
         #     f"Task(task_id={task.task_id}) is removed from Engine(engine_id={self.engine_id})."
         #     + debug_str
@@ -209,3 +222,14 @@ class ExecutionEngine:
 
     def get_num_cached_tokens(self) -> int:
         return self._real_time_runtime_info.num_cached_tokens
+
+    def get_num_running_jobs(self) -> int:
+        return self._real_time_runtime_info.num_running_jobs
+
+    def get_num_total_jobs(self) -> int:
+        return self._real_time_runtime_info.num_total_jobs
+
+    def get_recent_average_latency(self) -> float:
+        """Measured per-iteration latency (in nanoseconds). 0 if unknown."""
+
+        return self._real_time_runtime_info.recent_average_latency
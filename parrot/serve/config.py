@@ -5,7 +5,14 @@
 from dataclasses import dataclass
 from typing import Dict
 
-from parrot.constants import DEFAULT_SERVER_HOST, DEFAULT_CORE_SERVER_PORT
+from parrot.constants import (
+    DEFAULT_SERVER_HOST,
+    DEFAULT_CORE_SERVER_PORT,
+    CORE_HOUSEKEEPING_INTERVAL,
+    HTTP_CLIENT_CONN_LIMIT,
+    TOKENIZATION_CACHE_MAX_TOKENS,
+    TOKENIZATION_POOL_SIZE,
+)
 
 
 @dataclass
@@ -20,6 +27,41 @@ class ServeCoreConfig:
     engine_heartbeat_timeout: int = 600
     constant_prefix_var_timeout: int = 600
 
+    # Interval (in seconds) of sweeping expired sessions, engines and constant prefix vars.
+    housekeeping_interval: float = CORE_HOUSEKEEPING_INTERVAL
+
+    # Prefix contexts in an engine are evicted when its cached tokens exceed
+    # high_watermark * tokens_capacity, until they drop below low_watermark * tokens_capacity.
+    prefix_evict_high_watermark: float = 0.9
+    prefix_evict_low_watermark: float = 0.8
+
+    # Detect long common prefixes of requests (e.g. few-shot examples) and split them out,
+    # so they are cached and shared as constant prefixes. See PrefixMatcher.
+    prefix_matching: bool = True
+    # Match prefixes on token ids of the engines' tokenizers, and align the split points to
+    # KV cache blocks, so that forking from a prefix context needs no padding.
+    prefix_matching_token_aligned: bool = True
+    # Popularity of prefixes halves every half_life seconds. The PrefixMatcher stores at most
+    # max_chars characters, and evicts cold prefixes beyond that.
+    prefix_matcher_half_life: float = 3600
+    prefix_matcher_max_chars: int = 16 * 1024 * 1024
+
+    # Max number of token ids cached for Semantic Variables. See TokenizersWrapper.
+    tokenization_cache_max_tokens: int = TOKENIZATION_CACHE_MAX_TOKENS
+    # Number of threads tokenizing/detokenizing off the event loop. 0 means running them
+    # inline in the event loop.
+    tokenization_pool_size: int = TOKENIZATION_POOL_SIZE
+
+    # Max number of concurrent connections from ServeCore to each engine.
+    http_client_conn_limit: int = HTTP_CLIENT_CONN_LIMIT
+
+    # Admission control. Semantic calls are rejected with a retry-after hint (in seconds)
+    # when the estimated queueing delay (in seconds) exceeds max_queueing_delay.
+    admission_control: bool = False
+    admission_max_queueing_delay: float = 10.0
+    admission_min_retry_after: float = 0.5
+    admission_max_retry_after: float = 30.0
+
     @classmethod
     def verify_config(cls, config: Dict) -> bool:
         """Verify the ServeOS config.
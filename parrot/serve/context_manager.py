@@ -2,11 +2,21 @@
 # Licensed under the MIT license.
 
 
-from typing import Dict, List
-
-from parrot.protocol.internal.layer_apis import free_context
-from parrot.utils import get_logger, RecyclePool
-from parrot.constants import NONE_CONTEXT_ID
+import asyncio
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from parrot.protocol.internal.layer_apis import afree_contexts
+from parrot.utils import (
+    get_logger,
+    RecyclePool,
+    time_counter_in_nanoseconds,
+    create_task_in_loop,
+)
+from parrot.constants import (
+    NONE_CONTEXT_ID,
+    CONTEXT_FREE_MAX_RETRY_TIMES,
+    CONTEXT_FREE_RETRY_INTERVAL,
+)
 from parrot.exceptions import parrot_assert, ParrotCoreInternalError
 
 from parrot.serve.backend_repr import Context, ExecutionEngine
@@ -16,62 +26,262 @@ from parrot.serve.scheduler import CompletionTask
 logger = get_logger("ContextManager")
 
 
-_PREFIX_HASH_BRACKET_LEFT = "{{"
-_PREFIX_HASH_BRACKET_RIGHT = "}}"
+_PREFIX_TREE_ROOT = 0
+
+
+class PrefixIndex:
+    """PrefixIndex is a global radix tree of prefixes, keyed by SemanticVariable ids.
+
+    Every node of the tree is a prefix. Besides the tree structure, it maintains an inverted
+    index from a prefix to the set of engines which cache the prefix. All PrefixCaches (one per
+    engine) share the same tree, so a context-aware lookup walks the tree only once, no matter
+    how many engines are registered.
+
+    NOTE: Tree nodes are plain integers and edges live in flat dicts, instead of
+    one Python object per node. This keeps the tree invisible to the garbage collector, which
+    otherwise dominates the cost when there are many long chains.
+    """
+
+    def __init__(self):
+        # (parent node, var_id) -> child node
+        self._edges: Dict[Tuple[int, str], int] = {}
+
+        # node -> (parent node, var_id), for pruning.
+        self._node_edges: Dict[int, Tuple[int, str]] = {}
+
+        # node -> number of children
+        self._node_children_num: Dict[int, int] = {_PREFIX_TREE_ROOT: 0}
+
+        # node -> engine ids which cache this prefix.
+        self._node_engines: Dict[int, Set[int]] = {}
+
+        self._node_counter = _PREFIX_TREE_ROOT
+
+    def get_child(self, node: int, var_id: str) -> Optional[int]:
+        """Get the child node of the node along the SV id. None if it doesn't exist."""
+
+        return self._edges.get((node, var_id))
+
+    def get_or_create_child(self, node: int, var_id: str) -> int:
+        """Get the child node of the node along the SV id, creating it if it doesn't
+        exist."""
+
+        edge = (node, var_id)
+        child = self._edges.get(edge)
+        if child is None:
+            self._node_counter += 1
+            child = self._node_counter
+            self._edges[edge] = child
+            self._node_edges[child] = edge
+            self._node_children_num[child] = 0
+            self._node_children_num[node] += 1
+        return child
+
+    def add_engine(self, node: int, engine_id: int) -> None:
+        """Mark the prefix of the node as cached in the engine."""
+
+        if node not in self._node_engines:
+            self._node_engines[node] = set()
+        self._node_engines[node].add(engine_id)
+
+    def remove_engine(self, node: int, engine_id: int) -> None:
+        """Unmark the prefix of the node as cached in the engine. The branch is pruned if
+        no engine caches it and it has no children."""
+
+        engines = self._node_engines[node]
+        engines.discard(engine_id)
+        if len(engines) > 0:
+            return
+        self._node_engines.pop(node)
+
+        # Prune the branch upwards if it holds nothing.
+        while (
+            node != _PREFIX_TREE_ROOT
+            and node not in self._node_engines
+            and self._node_children_num[node] == 0
+        ):
+            edge = self._node_edges.pop(node)
+            self._edges.pop(edge)
+            self._node_children_num.pop(node)
+            node = edge[0]
+            self._node_children_num[node] -= 1
+
+    def query_prefix_engines(self, prefix: Sequence[str]) -> Dict[int, int]:
+        """Query the engines which cache (a part of) the prefix.
+
+        Args:
+            prefix: The prefix, i.e. a list of SV ids.
+
+        Returns:
+            A dict from engine id to the matched depth, i.e. the number of leading SVs of the
+            prefix that are cached continuously in the engine. Engines with zero depth are
+            not included.
+        """
+
+        ret: Dict[int, int] = {}
+        alive_engines: Optional[Set[int]] = None
+        edges = self._edges
+        node_engines = self._node_engines
+        node = _PREFIX_TREE_ROOT
+        depth = 0
+
+        for var_id in prefix:
+            node = edges.get((node, var_id))
+            if node is None:
+                break
+            engines = node_engines.get(node)
+            if engines is None:
+                break
+
+            if alive_engines is None:
+                # NOTE: Never mutate alive_engines in place, it may be a node's set.
+                alive_engines = engines
+            elif not alive_engines <= engines:
+                next_alive_engines = alive_engines & engines
+                # The engines dropped out at this depth.
+                for engine_id in alive_engines - next_alive_engines:
+                    ret[engine_id] = depth
+                alive_engines = next_alive_engines
+                if len(alive_engines) == 0:
+                    break
+            depth += 1
+
+        if alive_engines is not None:
+            for engine_id in alive_engines:
+                ret[engine_id] = depth
+
+        return ret
 
 
 class PrefixCache:
-    """PrefixCache maps a prefix hash to a context id.
+    """PrefixCache maps a prefix to a context id, in one engine.
 
-    A prefix hash is a List of SemanticVariable ids.
+    A prefix is a List of SemanticVariable ids. Prefixes are organized in a radix tree keyed by
+    SV ids (see PrefixIndex), so lookup/insert/remove cost is proportional to the length of the
+    prefix.
 
     Example:
-    {{sv0}} -> Context0
-    {{sv0}}{{sv1}} -> Context1
-    {{sv0}}{{sv1}}{{sv2}} -> Context2
-    {{sv0}}{{sv1}}{{sv3}} -> Context3
+    [sv0] -> Context0
+    [sv0, sv1] -> Context1
+    [sv0, sv1, sv2] -> Context2
+    [sv0, sv1, sv3] -> Context3
+
+    is stored as:
+
+    root - sv0 (Context0) - sv1 (Context1) - sv2 (Context2)
+                                           \ sv3 (Context3)
     """
 
-    def __init__(self):
-        # prefix hash -> context id.
-        self._prefix_ctx_map: Dict[str, int] = {}
+    def __init__(self, engine_id: int = 0, prefix_index: Optional[PrefixIndex] = None):
+        self.engine_id = engine_id
+
+        # The tree is shared by all PrefixCaches in the ServeCore.
+        self._index = prefix_index if prefix_index is not None else PrefixIndex()
+
+        # node -> context id. Only cached nodes are in this dict.
+        self._node_context: Dict[int, int] = {}
 
-        # reversed dict for freeing context.
-        self._prefix_ctx_map_reversed: Dict[int, str] = {}
+        # context id -> nodes holding it, for freeing context.
+        # With "fuse_fill", a context may be cached under several prefixes.
+        self._context_nodes: Dict[int, Tuple[int, ...]] = {}
 
-    def get_cached_prefix_context(self, prefix_hash: str) -> int:
+    def get_cached_prefix_context(self, prefix: Sequence[str]) -> int:
         """Get the context id of a prefix from the cache.
 
         Args:
-            prefix_hash: The hash of the prefix.
+            prefix: The prefix, i.e. a list of SV ids.
 
         Returns:
             The context id of the prefix. If the prefix is not in the cache, return NONE_CONTEXT_ID.
         """
 
-        return self._prefix_ctx_map.get(prefix_hash, NONE_CONTEXT_ID)
+        node = _PREFIX_TREE_ROOT
+        for var_id in prefix:
+            node = self._index.get_child(node, var_id)
+            if node is None:
+                return NONE_CONTEXT_ID
+        return self._node_context.get(node, NONE_CONTEXT_ID)
 
-    def cache_prefix_context(self, prefix_hash: str, context_id: int) -> None:
+    def get_longest_cached_prefix(self, prefix: Sequence[str]) -> List[int]:
+        """Get the contexts of the longest cached prefix.
+
+        Args:
+            prefix: The prefix, i.e. a list of SV ids.
+
+        Returns:
+            A list of context ids, one for each matched SV. Matching stops at the first
+            SV whose prefix is not cached.
+        """
+
+        ret: List[int] = []
+        node = _PREFIX_TREE_ROOT
+        for var_id in prefix:
+            node = self._index.get_child(node, var_id)
+            if node is None or node not in self._node_context:
+                break
+            ret.append(self._node_context[node])
+        return ret
+
+    def cache_prefix_context(self, prefix: Sequence[str], context_id: int) -> None:
         """Cache contexts of the prefix.
 
         Args:
-            prefix_hash: The hash of the prefix.
+            prefix: The prefix, i.e. a list of SV ids.
             context_id: The context id of the prefix.
         """
 
+        self.cache_prefix_contexts(prefix, [context_id] * len(prefix), len(prefix) - 1)
+
+    def cache_prefix_contexts(
+        self, prefix: Sequence[str], context_ids: Sequence[int], start: int = 0
+    ) -> None:
+        """Cache contexts of all prefixes prefix[:i+1] (i >= start) in one pass.
+
+        Args:
+            prefix: The prefix, i.e. a list of SV ids.
+            context_ids: The context id of each prefix prefix[:i+1].
+            start: Prefixes shorter than start + 1 are not touched.
+        """
+
         parrot_assert(
-            prefix_hash not in self._prefix_ctx_map, "Prefix should not be cached."
+            len(prefix) == len(context_ids), "Prefix and contexts length mismatch."
         )
-        self._prefix_ctx_map[prefix_hash] = context_id
-        self._prefix_ctx_map_reversed[context_id] = prefix_hash
+
+        node = _PREFIX_TREE_ROOT
+        for i, var_id in enumerate(prefix):
+            node = self._index.get_or_create_child(node, var_id)
+
+            if i < start:
+                continue
+
+            parrot_assert(node not in self._node_context, "Prefix should not be cached.")
+            context_id = context_ids[i]
+            self._node_context[node] = context_id
+            self._context_nodes[context_id] = self._context_nodes.get(
+                context_id, ()
+            ) + (node,)
+            self._index.add_engine(node, self.engine_id)
 
     def remove_context_id(self, context_id: int) -> None:
         """Remove the context id of a prefix."""
 
-        if context_id in self._prefix_ctx_map_reversed:
-            prefix_hash = self._prefix_ctx_map_reversed[context_id]
-            self._prefix_ctx_map.pop(prefix_hash)
-            self._prefix_ctx_map_reversed.pop(context_id)
+        if context_id not in self._context_nodes:
+            return
+
+        for node in self._context_nodes.pop(context_id):
+            self._node_context.pop(node)
+            self._index.remove_engine(node, self.engine_id)
+
+    def clear(self) -> None:
+        """Remove all cached prefixes of this engine."""
+
+        for context_id in list(self._context_nodes.keys()):
+            self.remove_context_id(context_id)
+
+    def __len__(self) -> int:
+        """The number of cached contexts."""
+
+        return len(self._context_nodes)
 
 
 class ServeCoreContextManager:
@@ -82,9 +292,26 @@ class ServeCoreContextManager:
     the ref_counter decreases to 0.
 
     Note that this class is global (id pool is global), so each context_id is unique in all engines.
+
+    Under memory pressure of an engine (reported by heartbeats), unreferenced constant prefix contexts
+    are evicted with a cost-aware policy: LRU weighted by prefix length * hit count.
     """
 
-    def __init__(self):
+    def __init__(
+        self,
+        evict_high_watermark: float = 0.9,
+        evict_low_watermark: float = 0.8,
+    ):
+        # Eviction is triggered when the cached tokens of an engine exceed
+        # evict_high_watermark * tokens_capacity, and stops when they drop below
+        # evict_low_watermark * tokens_capacity.
+        parrot_assert(
+            0 <= evict_low_watermark <= evict_high_watermark,
+            "Eviction watermarks should satisfy 0 <= low <= high.",
+        )
+        self.evict_high_watermark = evict_high_watermark
+        self.evict_low_watermark = evict_low_watermark
+
         # context_id -> Context
         self.contexts: Dict[int, Context] = {}
 
@@ -97,6 +324,13 @@ class ServeCoreContextManager:
         # corresponding contexts.
         self.constant_prefix_contexts: Dict[str, List[Context]] = {}
 
+        # context_id -> var_id, reversed map of constant_prefix_contexts. For eviction.
+        self._constant_prefix_context_vars: Dict[int, str] = {}
+
+        # context_id -> hit count / last access time (ns). For eviction.
+        self._context_hits: Dict[int, int] = {}
+        self._context_last_access_time: Dict[int, int] = {}
+
         # context_id -> ref_counter
         # Ref counter increases when the context is used.
         # And decreases when the context is freed.
@@ -106,12 +340,22 @@ class ServeCoreContextManager:
 
         self._context_id_pool = RecyclePool("Context pool")
 
+        # engine_id -> Contexts waiting to be freed in the engine.
+        # Frees are coalesced and sent in one batched request per engine (see flush_free_queue),
+        # so freeing contexts never blocks the event loop.
+        self._pending_free_contexts: Dict[int, List[Context]] = {}
+        # engine_id -> context ids whose free requests failed. They are recycled when the
+        # engine is removed, since the engine may still hold them until then.
+        self._failed_free_context_ids: Dict[int, List[int]] = {}
+        # engine_id -> tokens of the contexts queued or in flight for freeing. The engine
+        # still reports them as cached until the free requests finish.
+        self._freeing_tokens_num: Dict[int, int] = {}
+
         # engine_id -> PrefixCache
         self.prefix_caches: Dict[int, PrefixCache] = {}
 
-    @staticmethod
-    def _hash_var_id(var_id: str) -> str:
-        return f"{_PREFIX_HASH_BRACKET_LEFT}{var_id}{_PREFIX_HASH_BRACKET_RIGHT}"
+        # Global index: prefix -> engines which cache it. Shared by all PrefixCaches.
+        self.prefix_index = PrefixIndex()
 
     # ---------- Basic Context Operation ----------
 
@@ -124,6 +368,7 @@ class ServeCoreContextManager:
 
         self.contexts[context_id] = context
         self._add_ref_counter(context)
+        self._touch_context(context)
 
         logger.debug(f"Context (context_id={context_id}) created.")
         return context
@@ -143,6 +388,7 @@ class ServeCoreContextManager:
 
         self.contexts[context_id] = context
         self._add_ref_counter(context)
+        self._touch_context(context)
 
         logger.debug(
             f"Context (context_id={context_id}) created (Fork from context_id={parent_context.context_id})"
@@ -159,29 +405,95 @@ class ServeCoreContextManager:
         if self._context_ref_counter[context_id] > 0:
             return
 
-        try:
-            engine = context.engine
-            resp = free_context(
-                http_addr=engine.http_address,
-                context_id=context_id,
-            )
-        except BaseException as e:
-            logger.error(
-                f"Context (context_id={context_id}) did not free correctly: {type(e)}, {e}."
-            )
-            raise ParrotCoreInternalError(e)
-        else:
-            logger.debug(
-                f"Context (context_id={context_id}) freed. Freed tokens: {resp.context_len}"
-            )
-
-        # Remove context from the PrefixCache.
-        prefix_cache = self.prefix_caches[engine.engine_id]
-        prefix_cache.remove_context_id(context_id)
+        engine = context.engine
+
+        # Remove context from the PrefixCache. It's already removed if the engine is removed.
+        prefix_cache = self.prefix_caches.get(engine.engine_id)
+        if prefix_cache is not None:
+            prefix_cache.remove_context_id(context_id)
 
         # Remove context from the Manager.
         self.contexts.pop(context_id)
-        self._context_id_pool.free(context_id)
+        self._context_hits.pop(context_id)
+        self._context_last_access_time.pop(context_id)
+
+        # The engine is dead or bad. Its memory is gone with it, so no free request.
+        if not engine.is_running:
+            self._context_id_pool.free(context_id)
+            return
+
+        # NOTE: The context id is recycled after the engine actually frees it.
+        # Otherwise a new context may reuse the id before the old one is freed in the engine.
+        if engine.engine_id not in self._pending_free_contexts:
+            self._pending_free_contexts[engine.engine_id] = []
+        self._pending_free_contexts[engine.engine_id].append(context)
+        self._freeing_tokens_num[engine.engine_id] = (
+            self._freeing_tokens_num.get(engine.engine_id, 0) + context.tokens_num
+        )
+
+    async def _afree_contexts(
+        self, engine: ExecutionEngine, contexts: List[Context]
+    ) -> None:
+        try:
+            await self._afree_contexts_with_retry(engine, contexts)
+        finally:
+            # The engine is removed already if the key is missing.
+            if engine.engine_id in self._freeing_tokens_num:
+                self._freeing_tokens_num[engine.engine_id] -= sum(
+                    [context.tokens_num for context in contexts]
+                )
+
+    async def _afree_contexts_with_retry(
+        self, engine: ExecutionEngine, contexts: List[Context]
+    ) -> None:
+        context_ids = [context.context_id for context in contexts]
+
+        # NOTE: Only catch Exception, so that cancellation (e.g. at shutdown) propagates
+        # and doesn't mark a healthy engine bad.
+        retry_times = 0
+        while True:
+            try:
+                resp = await afree_contexts(
+                    http_addr=engine.http_address,
+                    context_ids=context_ids,
+                )
+                break
+            except Exception as e:
+                if retry_times < CONTEXT_FREE_MAX_RETRY_TIMES:
+                    retry_times += 1
+                    logger.warning(
+                        f"Contexts (context_ids={context_ids}) did not free correctly in "
+                        f"Engine {engine.name} (id={engine.engine_id}): {type(e)}, {e}. "
+                        f"Retry ({retry_times}/{CONTEXT_FREE_MAX_RETRY_TIMES})."
+                    )
+                    await asyncio.sleep(CONTEXT_FREE_RETRY_INTERVAL)
+                    continue
+
+                logger.error(
+                    f"Contexts (context_ids={context_ids}) did not free correctly in "
+                    f"Engine {engine.name} (id={engine.engine_id}): {type(e)}, {e}."
+                )
+                # The engine is out of sync with ServeCore. Don't recycle these ids until
+                # the engine is removed.
+                engine.mark_bad(ParrotCoreInternalError(e))
+                self.drop_engine_prefix_cache(engine.engine_id)
+                if engine.engine_id in self.prefix_caches:
+                    self._failed_free_context_ids.setdefault(
+                        engine.engine_id, []
+                    ).extend(context_ids)
+                else:
+                    # Already removed.
+                    for context_id in context_ids:
+                        self._context_id_pool.free(context_id)
+                return
+
+        logger.debug(
+            f"Contexts (context_ids={context_ids}) freed. "
+            f"Freed tokens: {sum(resp.context_lens)}"
+        )
+
+        for context_id in context_ids:
+            self._context_id_pool.free(context_id)
 
     def _add_ref_counter(self, context: Context) -> None:
         context_id = context.context_id
@@ -189,6 +501,13 @@ class ServeCoreContextManager:
             self._context_ref_counter[context_id] = 0
         self._context_ref_counter[context_id] += 1
 
+    def _touch_context(self, context: Context) -> None:
+        """Record an access (hit) of the context."""
+
+        context_id = context.context_id
+        self._context_hits[context_id] = self._context_hits.get(context_id, 0) + 1
+        self._context_last_access_time[context_id] = time_counter_in_nanoseconds()
+
     # ---------- Memory Management Public Methods ----------
 
     def free_context(self, context: Context) -> None:
@@ -203,6 +522,21 @@ class ServeCoreContextManager:
         )
         self._free_context(context)
 
+    def flush_free_queue(self) -> None:
+        """Send all pending frees to engines, one batched request per engine.
+
+        It doesn't block: the requests are sent in background tasks of the running loop.
+        """
+
+        if len(self._pending_free_contexts) == 0:
+            return
+
+        pending_free_contexts = self._pending_free_contexts
+        self._pending_free_contexts = {}
+
+        for contexts in pending_free_contexts.values():
+            create_task_in_loop(self._afree_contexts(contexts[0].engine, contexts))
+
     def set_task_contexts(self, task: CompletionTask) -> None:
         """Initialize the contexts for a CompletionTask.
 
@@ -218,24 +552,19 @@ class ServeCoreContextManager:
 
         chain = task.chain
         prefix_cache = self.prefix_caches[task.engine.engine_id]
-        prefix_hash = ""
-        prefix_no_cache_flag = False
-
-        for node in chain.iter():
-            prefix_hash += self._hash_var_id(node.var_id)
-
-            if not prefix_no_cache_flag:
-                # If the prefix is already cached, use cached context
-                context_id = prefix_cache.get_cached_prefix_context(prefix_hash)
-                if context_id != NONE_CONTEXT_ID:
-                    context = self.contexts[context_id]
-                    self._add_ref_counter(context)
-                    task.contexts.append(context)
-                    continue
-                else:
-                    # For succeeding nodes, the prefix couldn't be cached.
-                    prefix_no_cache_flag = True
+        nodes = list(chain.iter())
+        prefix = [node.var_id for node in nodes]
+
+        # If the prefix is already cached, use cached contexts.
+        cached_context_ids = prefix_cache.get_longest_cached_prefix(prefix)
+        for context_id in cached_context_ids:
+            context = self.contexts[context_id]
+            self._add_ref_counter(context)
+            self._touch_context(context)
+            task.contexts.append(context)
 
+        # For succeeding nodes, the prefix couldn't be cached.
+        for node in nodes[len(cached_context_ids) :]:
             # The prefix is not cached. Create a new context and cache it.
             # If the node is the first node in the chain, create a new context.
             if len(task.contexts) == 0:
@@ -249,6 +578,7 @@ class ServeCoreContextManager:
                         "Context should not be in the ref map.",
                     )
                     self.constant_prefix_contexts[node.sv.id].append(context)
+                    self._constant_prefix_context_vars[context.context_id] = node.sv.id
                     self._add_ref_counter(context)
             # If the node is not the first node in the chain.
             else:
@@ -260,9 +590,14 @@ class ServeCoreContextManager:
                     context = self._fork_context(task.contexts[-1])
 
             task.contexts.append(context)
-            # Cache the context, if it's the prefix.
-            if not node.is_gen:
-                prefix_cache.cache_prefix_context(prefix_hash, context.context_id)
+
+        # Cache the contexts of the prefix (i.e. all Fill nodes) in one pass.
+        fill_num = len(nodes) - 1 if nodes[-1].is_gen else len(nodes)
+        prefix_cache.cache_prefix_contexts(
+            prefix[:fill_num],
+            [context.context_id for context in task.contexts[:fill_num]],
+            start=len(cached_context_ids),
+        )
 
     def free_task_contexts(self, task: CompletionTask) -> None:
         """Free the contexts of a task."""
@@ -282,18 +617,137 @@ class ServeCoreContextManager:
     def free_constant_prefix_contexts(self, var_id: str) -> None:
         """Free the contexts of a constant prefix variable."""
 
-        parrot_assert(
-            var_id in self.constant_prefix_contexts,
-            "Constant prefix variable should have contexts.",
-        )
+        # NOTE: All contexts of the variable may have been evicted.
+        if var_id not in self.constant_prefix_contexts:
+            return
 
         for context in self.constant_prefix_contexts[var_id]:
+            self._constant_prefix_context_vars.pop(context.context_id)
             self._free_context(context)
 
         self.constant_prefix_contexts.pop(var_id)
 
+    def _evict_constant_prefix_context(self, context: Context) -> None:
+        context_id = context.context_id
+        var_id = self._constant_prefix_context_vars.pop(context_id)
+
+        var_contexts = self.constant_prefix_contexts[var_id]
+        var_contexts.remove(context)
+        if len(var_contexts) == 0:
+            self.constant_prefix_contexts.pop(var_id)
+
+        # Drop the extra ref_counter contributed by the constant prefix variable.
+        self._free_context(context)
+
+    def get_freeing_tokens_num(self, engine_id: int) -> int:
+        """The number of tokens of an engine which are queued or in flight for freeing."""
+
+        return self._freeing_tokens_num.get(engine_id, 0)
+
+    def select_eviction_contexts(self, engine: ExecutionEngine) -> List[Context]:
+        """Select cached prefix contexts to evict if an engine is under memory pressure.
+
+        The memory usage is read from the latest heartbeat of the engine, excluding the
+        contexts which are being freed. Only unreferenced
+        constant prefix contexts (i.e. no running task uses them) can be evicted.
+
+        Eviction order: contexts with the largest idle_time / (prefix_len * hits) go first, i.e.
+        LRU weighted by prefix length times hit count. Hot and long system prompts stay resident.
+
+        Args:
+            engine: The engine to check.
+
+        Returns:
+            The contexts to evict, in eviction order. Empty if the engine is not under pressure.
+        """
+
+        tokens_capacity = engine.config.tokens_capacity
+        # NOTE: Contexts being freed are still counted in the heartbeat. Don't evict again
+        # for the same pressure.
+        num_cached_tokens = engine.get_num_cached_tokens() - self.get_freeing_tokens_num(
+            engine.engine_id
+        )
+        if num_cached_tokens < self.evict_high_watermark * tokens_capacity:
+            return []
+
+        tokens_to_free = num_cached_tokens - self.evict_low_watermark * tokens_capacity
+
+        # Collect candidates. A constant prefix context only holds the extra ref_counter
+        # when it is not used by any task.
+        cur_time = time_counter_in_nanoseconds()
+        candidates: List[Tuple[float, Context]] = []
+        for context_id in self._constant_prefix_context_vars:
+            context = self.contexts[context_id]
+            if (
+                context.engine.engine_id != engine.engine_id
+                or self._context_ref_counter[context_id] > 1
+            ):
+                continue
+
+            idle_time = cur_time - self._context_last_access_time[context_id]
+            weight = max(context.tokens_num, 1) * self._context_hits[context_id]
+            candidates.append((idle_time / weight, context))
+
+        candidates.sort(key=lambda x: x[0], reverse=True)
+
+        ret: List[Context] = []
+        freed_tokens = 0
+        for _, context in candidates:
+            if freed_tokens >= tokens_to_free:
+                break
+            freed_tokens += context.tokens_num
+            ret.append(context)
+
+        return ret
+
+    def evict_prefix_contexts(self, engine: ExecutionEngine) -> int:
+        """Evict cached prefix contexts of an engine if it is under memory pressure.
+
+        Args:
+            engine: The engine to check.
+
+        Returns:
+            The number of evicted contexts.
+        """
+
+        contexts = self.select_eviction_contexts(engine)
+        if len(contexts) == 0:
+            return 0
+
+        freed_tokens = sum([context.tokens_num for context in contexts])
+        for context in contexts:
+            self._evict_constant_prefix_context(context)
+
+        logger.debug(
+            f"Engine {engine.name} (id={engine.engine_id}) is under memory pressure "
+            f"(cached_tokens={engine.get_num_cached_tokens()}, "
+            f"tokens_capacity={engine.config.tokens_capacity}). "
+            f"Evicted {len(contexts)} prefix contexts, freed {freed_tokens} tokens."
+        )
+
+        return len(contexts)
+
     # ---------- For Scheduler ----------
 
+    def query_prefix_depths_in_engines(self, task: CompletionTask) -> Dict[int, int]:
+        """Query the cached prefix depth of a task in engines.
+
+        The lookup walks the global PrefixIndex once, so its cost is proportional to the
+        chain length, regardless of the number of engines.
+
+        Args:
+            task: The task to query.
+
+        Returns:
+            A dict from engine id to the number of cached prefixes in that engine.
+            Engines without any cached prefix are not included.
+        """
+
+        parrot_assert(not task.is_scheduled, "Task should not be scheduled.")
+
+        prefix = [node.var_id for node in task.chain.iter()]
+        return self.prefix_index.query_prefix_engines(prefix)
+
     def query_prefixes_in_engines(self, task: CompletionTask) -> List[int]:
         """Query whether there are prefixes cached in some engines.
 
@@ -305,24 +759,8 @@ class ServeCoreContextManager:
             Sorted by the number of cached prefixes in descending order.
         """
 
-        parrot_assert(not task.is_scheduled, "Task should not be scheduled.")
-
         # engine_id -> cached_prefix_num
-        sort_dict = {}
-
-        for engine_id, prefix_cache in self.prefix_caches.items():
-            prefix_hash = ""
-            for node in task.chain.iter():
-                prefix_hash += self._hash_var_id(node.var_id)
-                if (
-                    prefix_cache.get_cached_prefix_context(prefix_hash)
-                    != NONE_CONTEXT_ID
-                ):
-                    if engine_id not in sort_dict:
-                        sort_dict[engine_id] = 0
-                    sort_dict[engine_id] += 1
-                else:
-                    break
+        sort_dict = self.query_prefix_depths_in_engines(task)
 
         return sorted(sort_dict, key=lambda x: sort_dict[x], reverse=True)
 
@@ -370,9 +808,30 @@ class ServeCoreContextManager:
     def register_engine_prefix_cache(self, engine_id: int):
         """Register the prefix cache of an engine."""
 
-        self.prefix_caches[engine_id] = PrefixCache()
+        self.prefix_caches[engine_id] = PrefixCache(
+            engine_id=engine_id, prefix_index=self.prefix_index
+        )
+
+    def drop_engine_prefix_cache(self, engine_id: int):
+        """Drop all cached prefixes of an engine, e.g. the engine is dead and its contexts
+        are lost. So that new tasks don't reuse them, and rebuild the prefixes in other engines.
+        """
+
+        if engine_id not in self.prefix_caches:
+            return
+
+        self.prefix_caches[engine_id].clear()
+        logger.debug(f"Prefix cache of engine (id={engine_id}) is dropped.")
 
     def remove_engine_prefix_cache(self, engine_id: int):
         """Remove the prefix cache of an engine."""
 
-        self.prefix_caches.pop(engine_id)
+        prefix_cache = self.prefix_caches.pop(engine_id)
+        prefix_cache.clear()
+
+        # The engine is gone, so its pending contexts need no free request.
+        for context in self._pending_free_contexts.pop(engine_id, []):
+            self._context_id_pool.free(context.context_id)
+        for context_id in self._failed_free_context_ids.pop(engine_id, []):
+            self._context_id_pool.free(context_id)
+        self._freeing_tokens_num.pop(engine_id, None)
@@ -3,18 +3,19 @@
 
 
 import json
-from typing import Dict
+from typing import Dict, AsyncGenerator
 import asyncio
 
 from parrot.utils import get_logger
-from parrot.constants import CORE_LOOP_INTERVAL
 from parrot.protocol.internal.runtime_info import EngineRuntimeInfo
+from parrot.protocol.http_utils import set_client_session_conn_limit
 from parrot.engine.config import EngineConfig
 from parrot.exceptions import ParrotCoreInternalError
 
 from parrot.serve.graph import (
     PlaceholderGen,
     get_performance_criteria,
+    get_ddl_from_time_budget,
     activate_completion_chain,
 )
 from parrot.serve.scheduler import GlobalScheduler, GlobalSchedulerConfig, TaskCreator
@@ -26,6 +27,7 @@ from .tokenizer_wrapper import TokenizersWrapper
 from .context_manager import ServeCoreContextManager
 from .session_manager import SessionManager
 from .engine_manager import EngineManager
+from .admission_controller import AdmissionController
 
 
 logger = get_logger("ServeCore")
@@ -54,14 +56,24 @@ class ParrotServeCore:
         gs_config = config.pop("global_scheduler")
         gs_config = GlobalSchedulerConfig(**gs_config)
         self.config = ServeCoreConfig(**config)
+        set_client_session_conn_limit(self.config.http_client_conn_limit)
 
         # ---------- Components ----------
-        self.prefix_matcher = PrefixMatcher()
+        self.prefix_matcher = PrefixMatcher(
+            half_life=self.config.prefix_matcher_half_life,
+            max_chars=self.config.prefix_matcher_max_chars,
+        )
         self.var_mgr = SemanticVariableManager(
             constant_prefix_var_timeout=self.config.constant_prefix_var_timeout
         )
-        self.tokenizers_wrapper = TokenizersWrapper()
-        self.context_mgr = ServeCoreContextManager()
+        self.tokenizers_wrapper = TokenizersWrapper(
+            cache_max_tokens=self.config.tokenization_cache_max_tokens,
+            pool_size=self.config.tokenization_pool_size,
+        )
+        self.context_mgr = ServeCoreContextManager(
+            evict_high_watermark=self.config.prefix_evict_high_watermark,
+            evict_low_watermark=self.config.prefix_evict_low_watermark,
+        )
         self.task_creator = TaskCreator()
 
         self.engine_mgr = EngineManager(
@@ -76,9 +88,20 @@ class ParrotServeCore:
             context_mgr=self.context_mgr,
         )
 
+        self.admission_controller = AdmissionController(
+            scheduler=self.global_scheduler,
+            engine_mgr=self.engine_mgr,
+            max_queueing_delay=self.config.admission_max_queueing_delay,
+            min_retry_after=self.config.admission_min_retry_after,
+            max_retry_after=self.config.admission_max_retry_after,
+        )
+
         self.session_mgr = SessionManager(
             life_span=self.config.session_life_span,
-            prefix_matcher=self.prefix_matcher,
+            prefix_matcher=(
+                self.prefix_matcher if self.config.prefix_matching else None
+            ),
+            prefix_token_aligned=self.config.prefix_matching_token_aligned,
             task_creator=self.task_creator,
             scheduler=self.global_scheduler,
             var_mgr=self.var_mgr,
@@ -109,6 +132,10 @@ class ParrotServeCore:
         logger.debug(f"Register engine received.")
         engine_config = EngineConfig(**payload["engine_config"])
         engine_id = self.engine_mgr.register_engine(engine_config)
+
+        # New engine available. Tasks waiting in the queue may be scheduled now.
+        self.global_scheduler.notify_schedule()
+
         return {"engine_id": engine_id}
 
     def engine_heartbeat(self, payload: Dict) -> Dict:
@@ -129,6 +156,13 @@ class ParrotServeCore:
 
         self.engine_mgr.engine_heartbeat(engine_id, engine_info)
 
+        # Reclaim cached prefixes if the engine is under memory pressure.
+        engine = self.engine_mgr.get_engine(engine_id)
+        self.context_mgr.evict_prefix_contexts(engine)
+
+        # The engine's runtime info is updated, which may change the scheduling result.
+        self.global_scheduler.notify_schedule()
+
         return {}
 
     # ---------- Public Serving APIs ----------
@@ -145,7 +179,9 @@ class ParrotServeCore:
             Dict. The response.
         """
 
-        session_id = self.session_mgr.register_session()
+        # Weight of the session in fair queueing. Default: 1.
+        weight = payload.get("weight", 1.0)
+        session_id = self.session_mgr.register_session(weight)
         return {"session_id": session_id, "session_auth": "1"}
 
     def remove_session(self, session_id: int, payload: Dict) -> Dict:
@@ -195,7 +231,7 @@ class ParrotServeCore:
     #     # Execute it immediately
     #     process.execute_native_call(call)
 
-    def submit_semantic_call(self, payload: Dict) -> Dict:
+    async def submit_semantic_call(self, payload: Dict) -> Dict:
         """Submit a semantic call in a session to the ServeCore.
 
         Args:
@@ -215,9 +251,13 @@ class ParrotServeCore:
         self.session_mgr.check_session_status(session_id)
         self.session_mgr.session_access_update(session_id)
 
+        # Reject the call before it's added, if the engines are overloaded.
+        if self.config.admission_control:
+            self.admission_controller.check_admission(session_id)
+
         # Add the request to the session.
         session = self.session_mgr.get_session(session_id)
-        request_id, placeholders_mapping = session.add_request(payload)
+        request_id, placeholders_mapping = await session.add_request(payload)
 
         return {
             "request_id": request_id,
@@ -289,6 +329,8 @@ class ParrotServeCore:
 
         session_id = payload["session_id"]
         criteria = payload["criteria"]
+        # Time budget (in seconds) of this get. None means no deadline.
+        ddl = get_ddl_from_time_budget(payload.get("ddl"))
 
         self.session_mgr.check_session_status(session_id)
         self.session_mgr.session_access_update(session_id)
@@ -299,7 +341,7 @@ class ParrotServeCore:
             if not producer.comp_chain.is_activated:
                 # Activate the chain and propagate the performance criteria
                 activate_completion_chain(
-                    producer.comp_chain, get_performance_criteria(criteria)
+                    producer.comp_chain, get_performance_criteria(criteria), ddl
                 )
 
         await var.wait_ready()
@@ -309,10 +351,64 @@ class ParrotServeCore:
 
         return {"content": content}
 
+    def get_semantic_variable_stream(
+        self, var_id: str, payload: Dict
+    ) -> AsyncGenerator[str, None]:
+        """Get the content from a Semantic Variable in streaming mode.
+
+        Partial content is yielded as soon as it is generated, so the client sees the
+        time-to-first-token instead of the latency of the whole generation.
+
+        Args:
+            var_id: str. The variable ID.
+            payload: Dict. The payload.
+
+        Returns:
+            AsyncGenerator[str]. The content chunks.
+        """
+
+        session_id = payload["session_id"]
+        criteria = payload["criteria"]
+        # Time budget (in seconds) of this get. None means no deadline.
+        ddl = get_ddl_from_time_budget(payload.get("ddl"))
+
+        self.session_mgr.check_session_status(session_id)
+        self.session_mgr.session_access_update(session_id)
+
+        var = self.var_mgr.get_var(session_id, var_id)
+        if var.has_producer:
+            # NOTE: Mark streaming before activation, so the producer streams.
+            var.is_streaming = True
+            producer: PlaceholderGen = var.get_producer()
+            if not producer.comp_chain.is_activated:
+                # Activate the chain and propagate the performance criteria
+                activate_completion_chain(
+                    producer.comp_chain, get_performance_criteria(criteria), ddl
+                )
+
+        logger.debug(
+            f"Semantic variable (id={var_id}) get (streaming) with criteria: {criteria}."
+        )
+
+        return var.stream()
+
     # ---------- ServeCore Loop ----------
 
-    async def serve_loop(self) -> None:
-        """Start the Core serving loop."""
+    async def _schedule_loop(self) -> None:
+        """Schedule tasks when triggered, i.e. on task submission, task completion and engine
+        heartbeats. See GlobalScheduler.notify_schedule."""
+
+        while True:
+            await self.global_scheduler.wait_schedule()
+
+            # Schedule tasks
+            self.global_scheduler.schedule()
+
+            # Send freed contexts to engines in batches
+            self.context_mgr.flush_free_queue()
+
+    async def _housekeeping_loop(self) -> None:
+        """Sweep sessions, engines and constant prefix vars periodically."""
 
         while True:
             # Update and clean up sessions and engines
@@ -325,11 +421,27 @@ class ParrotServeCore:
             expired_vars = self.var_mgr.free_expired_constant_prefix_vars()
             for var in expired_vars:
                 self.context_mgr.free_constant_prefix_contexts(var.id)
+                self.tokenizers_wrapper.invalidate_var(var.id)
 
-            # Schedule tasks
-            self.global_scheduler.schedule()
+            # Send freed contexts to engines in batches
+            self.context_mgr.flush_free_queue()
+
+            # NOTE: Engines may be removed, and tasks may be left in the queue
+            # without any new event. Retry them.
+            if self.global_scheduler.num_queued_tasks > 0:
+                self.global_scheduler.notify_schedule()
+
+            await asyncio.sleep(self.config.housekeeping_interval)
+
+    async def serve_loop(self) -> None:
+        """Start the Core serving loop."""
+
+        await asyncio.gather(self._schedule_loop(), self._housekeeping_loop())
+
+    def close(self) -> None:
+        """Release the resources of the Core. Called when the server shuts down."""
 
-            await asyncio.sleep(CORE_LOOP_INTERVAL)
+        self.tokenizers_wrapper.close()
 
 
 def create_serve_core(
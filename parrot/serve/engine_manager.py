@@ -2,7 +2,8 @@
 # Licensed under the MIT license.
 
 
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple, Iterator, Callable
+import bisect
 
 from parrot.exceptions import ParrotCoreUserError, parrot_assert
 from parrot.utils import RecyclePool, get_logger, time_counter_in_nanoseconds
@@ -44,6 +45,15 @@ class EngineManager:
         # engine_id -> last_seen_time
         self._engine_last_seen_time: Dict[int, int] = {}
 
+        # Engine index for scheduling. (model_type, model_name) -> sorted engine keys.
+        # The keys are ordered by remaining tokens capacity and remaining tasks capacity,
+        # in descending order. See _get_engine_index_key.
+        self._engine_index: Dict[
+            Tuple[ModelType, str], List[Tuple[int, int, int]]
+        ] = {}
+        # engine_id -> current key in the index
+        self._engine_index_keys: Dict[int, Tuple[int, int, int]] = {}
+
         # model_name -> model
         self.models: Dict[str, LanguageModel] = {}
         self._models_ref_counter: Dict[str, int] = {}
@@ -79,9 +89,40 @@ class EngineManager:
 
             logger.debug(f"Model {model_name} removed.")
 
+    @staticmethod
+    def _get_engine_index_key(engine: ExecutionEngine) -> Tuple[int, int, int]:
+        return (
+            -engine.get_remain_tokens_capacity(),
+            -engine.get_remain_tasks_capacity(),
+            engine.engine_id,
+        )
+
+    def _remove_from_engine_index(self, engine: ExecutionEngine) -> None:
+        key = self._engine_index_keys.pop(engine.engine_id)
+        index = self._engine_index[(engine.model_type, engine.model_name)]
+        pos = bisect.bisect_left(index, key)
+        parrot_assert(index[pos] == key, "Engine index is inconsistent.")
+        index.pop(pos)
+
+    def _update_engine_index(self, engine: ExecutionEngine) -> None:
+        """Re-order the engine in the index. Called when its capacity changes."""
+
+        if engine.engine_id in self._engine_index_keys:
+            self._remove_from_engine_index(engine)
+
+        key = self._get_engine_index_key(engine)
+        self._engine_index_keys[engine.engine_id] = key
+        index = self._engine_index.setdefault(
+            (engine.model_type, engine.model_name), []
+        )
+        bisect.insort(index, key)
+
     def _remove_engine(self, engine_id: int) -> None:
         engine = self.engines.pop(engine_id)
 
+        engine.runtime_info_listener = None
+        self._remove_from_engine_index(engine)
+
         self._remove_model(engine.model_name)
 
         self._engine_last_seen_time.pop(engine_id)
@@ -101,9 +142,17 @@ class EngineManager:
             exception: Exception. The exception to be raised.
         """
 
+        # The engine may be swept already, e.g. it's expired.
+        if engine_id not in self.engines:
+            return
+
         engine = self.engines[engine_id]
         engine.mark_bad(exception)
 
+        # Contexts in the engine are lost. Tasks using them are re-dispatched (see
+        # GraphExecutor), and their prefixes are rebuilt in other engines.
+        self.context_mgr.drop_engine_prefix_cache(engine_id)
+
     # ---------- Methods for Global Scheduler ----------
 
     def get_live_engines(self) -> List[ExecutionEngine]:
@@ -111,6 +160,48 @@ class EngineManager:
 
         return [engine for engine in self.engines.values() if engine.is_running]
 
+    def iter_candidate_engines(
+        self,
+        model_type: ModelType,
+        models: List[str],
+        required_tokens_num: Optional[Callable[[LanguageModel], int]] = None,
+    ) -> Iterator[ExecutionEngine]:
+        """Iterate live engines of the given model type and models, without scanning the whole
+        cluster.
+
+        Args:
+            model_type: ModelType. The model type.
+            models: List[str]. The model names. Empty means any model.
+            required_tokens_num: Optional function from a model to the number of tokens required.
+                Engines without enough remaining tokens capacity are skipped.
+
+        Returns:
+            An iterator of engines. The engines' capacity must not change during the iteration.
+        """
+
+        if len(models) > 0:
+            index_keys = [(model_type, model) for model in models]
+        else:
+            index_keys = [key for key in self._engine_index if key[0] == model_type]
+
+        for index_key in index_keys:
+            if index_key not in self._engine_index:
+                continue
+
+            tokens_num = None
+            if required_tokens_num is not None:
+                tokens_num = required_tokens_num(self.models[index_key[1]])
+
+            # Engines of the same model are ordered by the remaining tokens capacity,
+            # from the most to the least.
+            for key in self._engine_index[index_key]:
+                if tokens_num is not None and -key[0] < tokens_num:
+                    break
+
+                engine = self.engines[key[-1]]
+                if engine.is_running:
+                    yield engine
+
     # ---------- Methods for Core ----------
 
     def register_engine(self, engine_config: EngineConfig) -> int:
@@ -134,6 +225,10 @@ class EngineManager:
         self.engines[engine_id] = engine
         self._engine_last_seen_time[engine_id] = time_counter_in_nanoseconds()
 
+        # Add to the engine index, and keep it updated when the engine's capacity changes.
+        self._update_engine_index(engine)
+        engine.runtime_info_listener = self._update_engine_index
+
         # Register engine prefix cache
         self.context_mgr.register_engine_prefix_cache(engine_id=engine_id)
 
@@ -177,10 +272,12 @@ class EngineManager:
         for engine_id, last_seen_time in self._engine_last_seen_time.items():
             engine = self.engines[engine_id]
             if (
-                current_time - last_seen_time
+                engine.is_running
+                and current_time - last_seen_time
                 > self.engine_heartbeat_timeout * 1_000_000_000
             ):
                 engine.status = EngineStatus.DEAD
+                self.context_mgr.drop_engine_prefix_cache(engine_id)
                 logger.debug(f"Engine {engine_id} is expired.")
 
     def sweep_not_running_engines(self) -> None:
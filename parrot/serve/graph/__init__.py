@@ -7,7 +7,11 @@ in Parrot OS.
 """
 
 from .request import ChunkedSemanticCallRequest
-from .perf_criteria import PerformanceCriteria, get_performance_criteria
+from .perf_criteria import (
+    PerformanceCriteria,
+    get_performance_criteria,
+    get_ddl_from_time_budget,
+)
 from .semantic_variable import SemanticVariable
 from .nodes import BaseNode, ConstantFill, PlaceholderFill, PlaceholderGen
 from .graph import CompletionChain, RequestChain, ComputeGraph
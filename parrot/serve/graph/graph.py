@@ -95,6 +95,10 @@ class CompletionChain:
         self._criteria: Optional[PerformanceCriteria] = None
         # Distance to "get" node.
         self._depth: int = 99999
+        # Deadline of "get" (absolute time in ns, 0 means no deadline), and the number of
+        # tokens to be generated after this chain before the deadline (by downstream chains).
+        self._ddl: float = 0.0
+        self._ddl_downstream_gen_len: int = 0
 
         # Groups this chain belongs to.
         self.chain_groups: List[CompChainGroup] = []
@@ -130,8 +134,14 @@ class CompletionChain:
 
         return ret
 
-    def activate(self, criteria: PerformanceCriteria, depth: int) -> None:
-        """Activate the CompletionChain with a given PerformanceCriteria."""
+    def activate(
+        self,
+        criteria: PerformanceCriteria,
+        depth: int,
+        ddl: float = 0.0,
+        ddl_downstream_gen_len: int = 0,
+    ) -> None:
+        """Activate the CompletionChain with a given PerformanceCriteria (and deadline)."""
 
         parrot_assert(
             not self.is_activated,
@@ -139,6 +149,8 @@ class CompletionChain:
         )
         self._criteria = criteria
         self._depth = depth
+        self._ddl = ddl
+        self._ddl_downstream_gen_len = ddl_downstream_gen_len
         self._activated_event.set()
 
     async def wait_activated(self) -> None:
@@ -154,6 +166,16 @@ class CompletionChain:
         parrot_assert(self.is_activated, "CompletionChain has not been activated.")
         return self._depth
 
+    @property
+    def ddl(self) -> float:
+        parrot_assert(self.is_activated, "CompletionChain has not been activated.")
+        return self._ddl
+
+    @property
+    def ddl_downstream_gen_len(self) -> int:
+        parrot_assert(self.is_activated, "CompletionChain has not been activated.")
+        return self._ddl_downstream_gen_len
+
     def iter(self) -> _CompletionChainIterator:
         return _CompletionChainIterator(self.first_node)
 
@@ -20,6 +20,9 @@ The algorithm works as follows:
 2. Then it traverses backward to its predecessors, activates them and propagates the performance
     deduction result recursively.
 3. Then algorithm ends when it reaches the end of the graph or an activated node.
+
+If the "get" has a deadline, the deadline is propagated together with the number of tokens
+generated downstream, so the scheduler can tell how much time is left for each upstream chain.
 """
 
 
@@ -28,6 +31,12 @@ def _back_propagate_criteria(criteria: PerformanceCriteria) -> PerformanceCriter
         return PerformanceCriteria.LATENCY
     elif criteria == PerformanceCriteria.THROUGHPUT:
         return PerformanceCriteria.THROUGHPUT
+    elif criteria == PerformanceCriteria.TTFT:
+        # The first token can't be generated until all upstream chains finish.
+        return PerformanceCriteria.LATENCY
+    elif criteria == PerformanceCriteria.TPOT:
+        # Upstream chains only delay the first token, not the pace of the following ones.
+        return PerformanceCriteria.THROUGHPUT
     else:
         raise NotImplementedError(f"PerformanceCriteria {criteria} is not supported.")
 
@@ -35,12 +44,18 @@ def _back_propagate_criteria(criteria: PerformanceCriteria) -> PerformanceCriter
 def _traverse(
     chain: CompletionChain,
     criteria: PerformanceCriteria,
+    ddl: float,
+    ddl_downstream_gen_len: int,
 ) -> None:
     if chain.is_activated:
         return
 
     # Propagate the performance criteria.
     next_criteria = _back_propagate_criteria(criteria)
+    # Propagate the deadline. Upstream chains must also leave time for this chain's generation.
+    next_ddl_downstream_gen_len = (
+        ddl_downstream_gen_len + chain.gen_node.sampling_config.max_gen_length
+    )
     # Grouping chains.
     chain_group = CompChainGroup()
 
@@ -52,14 +67,14 @@ def _traverse(
             next_chain: CompletionChain = producer.comp_chain
             next_chain.chain_groups.append(chain_group)
             chain_group.chains.add(next_chain)
-            _traverse(next_chain, next_criteria)
+            _traverse(next_chain, next_criteria, ddl, next_ddl_downstream_gen_len)
             next_chains.append(next_chain)
 
     if chain.first_node.has_edge_a_prev_node:
         prev_gen = chain.first_node.get_edge_a_prev_node()
         parrot_assert(prev_gen.is_gen, "The previous node is not a Gen node.")
         next_chain = prev_gen.comp_chain
-        _traverse(next_chain, next_criteria)
+        _traverse(next_chain, next_criteria, ddl, next_ddl_downstream_gen_len)
         next_chains.append(next_chain)
 
     # Lastly, activate the chain.
@@ -67,19 +82,21 @@ def _traverse(
     for next_chain in next_chains:
         depth = max(depth, next_chain.depth + 1)
 
-    chain.activate(criteria, depth)
+    chain.activate(criteria, depth, ddl, ddl_downstream_gen_len)
 
 
 def activate_completion_chain(
-    chain: CompletionChain, criteria: PerformanceCriteria
+    chain: CompletionChain, criteria: PerformanceCriteria, ddl: float = 0.0
 ) -> None:
     """Activates the CompletionChain and propagates the performance deduction result.
 
     Args:
         chain: The CompletionChain to be activated.
         criteria: The PerformanceCriteria to be assigned to the chain.
+        ddl: The deadline of the chain's output (absolute time in ns, see
+            time_counter_in_nanoseconds). 0 means no deadline.
     """
 
     parrot_assert(not chain.is_activated, "Chain is already activated.")
 
-    _traverse(chain=chain, criteria=criteria)
+    _traverse(chain=chain, criteria=criteria, ddl=ddl, ddl_downstream_gen_len=0)
@@ -3,6 +3,9 @@
 
 
 from enum import Enum
+from typing import Optional
+
+from parrot.utils import time_counter_in_nanoseconds
 
 
 class PerformanceCriteria(Enum):
@@ -49,3 +52,12 @@ def get_performance_criteria_str(criteria: PerformanceCriteria) -> str:
         return "TPOT"
     else:
         raise NotImplementedError(f"PerformanceCriteria {criteria} is not supported.")
+
+
+def get_ddl_from_time_budget(time_budget: Optional[float]) -> float:
+    """Convert a time budget (in seconds, from now) attached to a "get" to an absolute deadline
+    (in nanoseconds, see time_counter_in_nanoseconds). None means no deadline, i.e. 0."""
+
+    if time_budget is None:
+        return 0.0
+    return time_counter_in_nanoseconds() + time_budget * 1_000_000_000
@@ -89,6 +89,8 @@ class SemanticCallMetadata:
         "cache_prefix",
         "output_criteria",
         "fuse_fill",
+        "pipeline_fill",
+        "output_ddl",
     ]
 
     models: List[str]
@@ -97,6 +99,10 @@ class SemanticCallMetadata:
     cache_prefix: bool
     output_criteria: Optional[Union[PerformanceCriteria, str]]
     fuse_fill: bool
+    # Start Fills of inputs while their producers are still generating. See GraphExecutor.
+    pipeline_fill: bool
+    # Time budget (in seconds, from submission) of the output. None means no deadline.
+    output_ddl: Optional[float]
 
     @classmethod
     def get_default_dict(cls) -> Dict:
@@ -109,6 +115,8 @@ class SemanticCallMetadata:
             "cache_prefix": True,
             "output_criteria": None,
             "fuse_fill": False,
+            "pipeline_fill": False,
+            "output_ddl": None,
         }
 
     @classmethod
@@ -195,6 +203,8 @@ class ChunkedSemanticCallRequest:
         processed_payload.setdefault("models", [])
         processed_payload.setdefault("model_type", "token_id")
         processed_payload.setdefault("remove_pure_fill", True)
+        processed_payload.setdefault("pipeline_fill", False)
+        processed_payload.setdefault("output_ddl", None)
 
         return processed_payload
 
@@ -1,7 +1,7 @@
 # Copyright (c) 2023 by Microsoft Corporation.
 # Licensed under the MIT license.
 
-from typing import List, Optional
+from typing import List, Optional, AsyncGenerator
 from asyncio import Event
 
 from parrot.exceptions import parrot_assert
@@ -53,6 +53,18 @@ class SemanticVariable:
         # Events
         self._ready_event: Event = Event()  # Ready event means the content is ready.
 
+        # Set if the producer fails. Waiting for the content raises it.
+        self._exception: Optional[BaseException] = None
+
+        # Streaming. If is_streaming is set (by a streaming Get) before the producer runs,
+        # the producer streams partial content into this SV.
+        self.is_streaming = False
+        self._stream_chunks: List[str] = []
+        # Generated token ids, for pipelining the consumers' Fills. Only for token-id engines.
+        self.stream_tokenizer_name: Optional[str] = None
+        self.stream_token_ids: List[int] = []
+        self._stream_event: Event = Event()  # Set when a chunk is appended or SV is ready.
+
         # Producer of this SV. It must be a PlaceholderGen node.
         self._producer: Optional["PlaceholderGen"] = None
 
@@ -62,12 +74,78 @@ class SemanticVariable:
     def is_ready(self) -> bool:
         return self._ready_event.is_set()
 
+    @property
+    def exception(self) -> Optional[BaseException]:
+        """The exception of the producer, if it fails. None otherwise."""
+
+        return self._exception
+
     def set(self, content: str) -> None:
         """Set the content of the semantic variable."""
 
         assert self._content is None, f"This semantic variable (id={self.id}) is filled"
         self._content = content
         self._ready_event.set()
+        self._stream_event.set()
+
+    def set_exception(self, exception: BaseException) -> None:
+        """Mark the semantic variable failed, e.g. its producer can't be finished. All waiters
+        of the content are woken up and get the exception."""
+
+        if self.is_ready():
+            return
+        self._exception = exception
+        self._ready_event.set()
+        self._stream_event.set()
+
+    def append_stream(self, chunk: str, token_id: Optional[int] = None) -> None:
+        """Append a chunk of partial content (and the token generating it).
+        Used by the producer in streaming mode."""
+
+        parrot_assert(
+            not self.is_ready(), f"This semantic variable (id={self.id}) is filled"
+        )
+        if chunk != "":
+            self._stream_chunks.append(chunk)
+        if token_id is not None:
+            self.stream_token_ids.append(token_id)
+        self._stream_event.set()
+
+    async def wait_stream_token_ids(self, num: int) -> None:
+        """Wait until there are at least num streamed token ids, or the SV is ready."""
+
+        while len(self.stream_token_ids) < num and not self.is_ready():
+            self._stream_event.clear()
+            await self._stream_event.wait()
+
+    async def stream(self) -> AsyncGenerator[str, None]:
+        """Iterate the content of this SV chunk by chunk, as soon as chunks are produced.
+
+        If the SV is set without streaming (e.g. a input SV), the whole content is one chunk.
+        """
+
+        idx = 0
+        streamed_len = 0
+        while True:
+            while idx < len(self._stream_chunks):
+                chunk = self._stream_chunks[idx]
+                idx += 1
+                streamed_len += len(chunk)
+                yield chunk
+
+            if self.is_ready():
+                break
+
+            self._stream_event.clear()
+            await self._stream_event.wait()
+
+        if self._exception is not None:
+            raise self._exception
+
+        # NOTE: The final content may differ from the joined chunks in its tail
+        # (e.g. held-back incomplete characters). Yield the remaining part.
+        if len(self._content) > streamed_len:
+            yield self._content[streamed_len:]
 
     def get(self) -> str:
         """Get the content of the semantic variable."""
@@ -75,13 +153,17 @@ class SemanticVariable:
         parrot_assert(
             self.is_ready(), f"This semantic variable (id={self.id}) is not ready"
         )
+        if self._exception is not None:
+            raise self._exception
 
         return self._content
 
     async def wait_ready(self) -> None:
-        """Wait until the content of this SV is ready."""
+        """Wait until the content of this SV is ready. Raise the exception if it fails."""
 
         await self._ready_event.wait()
+        if self._exception is not None:
+            raise self._exception
 
     def assign_producer(self, producer: "PlaceholderGen") -> None:
         """Assign the producer of this SV. This will add some edges in the graph."""
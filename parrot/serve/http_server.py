@@ -4,16 +4,18 @@
 
 import argparse
 import asyncio
+import math
 import traceback
 from typing import Optional
 from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from uvicorn import Config, Server
 import os
 
 from parrot.serve.core import ParrotServeCore, create_serve_core
 from parrot.protocol.internal.runtime_info import EngineRuntimeInfo
 from parrot.protocol.public.api_version import API_VERSION
+from parrot.protocol.http_utils import close_client_sessions
 from parrot.engine.config import EngineConfig
 from parrot.utils import (
     get_logger,
@@ -21,7 +23,11 @@ from parrot.utils import (
     set_log_output_file,
     redirect_stdout_stderr_to_file,
 )
-from parrot.exceptions import ParrotCoreUserError, ParrotCoreInternalError
+from parrot.exceptions import (
+    ParrotCoreUserError,
+    ParrotCoreOverloadedError,
+    ParrotCoreInternalError,
+)
 from parrot.testing.latency_simulator import get_latency
 
 
@@ -51,6 +57,21 @@ async def parrot_core_internal_error_handler(
     )
 
 
+@app.exception_handler(ParrotCoreOverloadedError)
+async def parrot_core_overloaded_error_handler(
+    request: Request, exc: ParrotCoreOverloadedError
+):
+    return JSONResponse(
+        status_code=503,
+        headers={"Retry-After": str(math.ceil(exc.retry_after))},
+        content={
+            "error": repr(exc),
+            "traceback": "",
+            "retry_after": exc.retry_after,
+        },
+    )
+
+
 @app.exception_handler(ParrotCoreInternalError)
 async def parrot_core_internal_error_handler(
     request: Request, exc: ParrotCoreInternalError
@@ -101,7 +122,7 @@ async def submit_semantic_call(request: Request):
         await asyncio.sleep(latency / 2)
 
     payload = await request.json()
-    response = pcore.submit_semantic_call(payload)
+    response = await pcore.submit_semantic_call(payload)
 
     if latency_open == 1:
         await asyncio.sleep(latency / 2)
@@ -130,6 +151,13 @@ async def get_semantic_variable(var_id: str, request: Request):
     return response
 
 
+@app.get(f"/{API_VERSION}" + "/semantic_var/{var_id}/stream")
+async def get_semantic_variable_stream(var_id: str, request: Request):
+    payload = await request.json()
+    generator = pcore.get_semantic_variable_stream(var_id, payload)
+    return StreamingResponse(generator, media_type="text/plain")
+
+
 @app.get(f"/{API_VERSION}/semantic_var")
 async def get_semantic_variable_list(request: Request):
     raise NotImplementedError("Not implemented yet.")
@@ -183,6 +211,10 @@ def start_server(
     create_task_in_loop(pcore.serve_loop(), loop=loop, fail_fast=True)
     loop.run_until_complete(uvicorn_server.serve())
 
+    # Shutdown hook: close the pooled connections to engines and the tokenizer workers.
+    loop.run_until_complete(close_client_sessions())
+    pcore.close()
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Parrot ServeCore http server")
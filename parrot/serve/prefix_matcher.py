@@ -1,89 +1,295 @@
 # Copyright (c) 2023 by Microsoft Corporation.
 # Licensed under the MIT license.
 
-from typing import Dict
+import heapq
+import math
+from typing import Dict, Hashable, List, Optional, Sequence, Union
+
+from parrot.utils import time_counter_in_nanoseconds
+
+
+# A prefix is a string, or a sequence of token ids (tuple).
+Prefix = Union[str, Sequence[int]]
+
+
+def _starts_with(prefix: Prefix, label: Prefix, pos: int) -> bool:
+    if isinstance(prefix, str):
+        return prefix.startswith(label, pos)
+    return prefix[pos : pos + len(label)] == label
+
+
+class _TrieNode:
+    """A node in the compressed trie. The edge from its parent is labeled by `label`."""
+
+    __slots__ = [
+        "label",
+        "parent",
+        "children",
+        "count",
+        "last_update_time",
+        "heap_key",
+    ]
+
+    def __init__(self, label: Prefix, parent: Optional["_TrieNode"], now: int):
+        self.label = label
+        self.parent = parent
+        # First element of the child's label -> child
+        self.children: Dict[Hashable, "_TrieNode"] = {}
+        # Decayed number of added strings passing through this node.
+        self.count = 0.0
+        self.last_update_time = now  # In nanoseconds
+        # Eviction key of the latest heap entry of this node. See PrefixMatcher._push_leaf.
+        self.heap_key: Optional[float] = None
+
+    @property
+    def is_leaf(self) -> bool:
+        return len(self.children) == 0
 
 
 class PrefixMatcher:
-    """Prefix matcher uses a heuristic algorithm to find the most common prefix among a set of strings.
+    """Prefix matcher finds the common prefixes among a set of strings.
 
-    If there is a common prefix part between them, we will add the count of the common part.
-    If the count reaches a certain threshold, we will consider it as a GlobalPrefix.
+    Strings are added to a compressed character trie, where each node counts the strings
+    passing through it. Sequences of token ids (tuples) are supported as well, so that
+    prefixes are matched on token boundaries. Prefixes of different tokenizers are kept in
+    different namespaces. If the count of a node reaches a certain threshold, the string from
+    the root to the node is considered as a GlobalPrefix. Insertion and query take
+    O(len(prefix)) time.
+
+    Counts decay exponentially with time (halved every half_life seconds), so prefixes which
+    are no longer used lose their popularity. The trie stores at most max_chars characters.
+    When it's full, cold branches (leaves with the lowest counts) are evicted. Leaves are kept
+    in a heap, so an eviction costs O(log N) per evicted leaf instead of a scan of the trie.
     """
 
     _START_LEN = 40
     _GP_THRESHOLD = 3
 
-    def __init__(self):
-        # NOTE(chaofan): This table is two-level.
-        # The first level is the first _START_LEN characters of the prefix, to speed up the lookup.
-        # The second level is a list of prefix strings.
-        # TODO(chaofan): Advanced evict policy.
+    # When evicting, evict until the trie stores less than
+    # _EVICT_LOW_WATERMARK * max_chars characters.
+    _EVICT_LOW_WATERMARK = 0.8
+
+    def __init__(self, half_life: float = 3600, max_chars: int = 16 * 1024 * 1024):
+        """
+        Args:
+            half_life: float. The half-life (in seconds) of the counts.
+            max_chars: int. The maximum number of characters stored in the trie.
+        """
+
+        self.half_life = half_life
+        self.max_chars = max_chars
+
+        # Namespace -> root of the trie
+        self._roots: Dict[str, _TrieNode] = {}
+        self._chars_num = 0
+        self._nodes_num = 0
+
+        # Heap of (eviction key, seq, leaf). Entries are invalidated lazily: an entry is stale
+        # if the node is no longer a leaf in the trie, or its key changed.
+        self._leaf_heap: List = []
+        self._heap_seq = 0
+
+    @property
+    def chars_num(self) -> int:
+        """The number of characters stored in the trie."""
+
+        return self._chars_num
+
+    @property
+    def nodes_num(self) -> int:
+        """The number of nodes in the trie, including the roots."""
+
+        return self._nodes_num
+
+    def _decayed_count(self, node: _TrieNode, now: int) -> float:
+        elapsed = (now - node.last_update_time) / 1e9
+        if elapsed <= 0:
+            return node.count
+        return node.count * math.pow(0.5, elapsed / self.half_life)
+
+    def _hit(self, node: _TrieNode, now: int) -> None:
+        node.count = self._decayed_count(node, now) + 1
+        node.last_update_time = now
+
+    def _eviction_key(self, node: _TrieNode) -> float:
+        # NOTE: All counts decay at the same rate, so the order of decayed counts never
+        # changes over time. log2(count at now) = this key - now / half_life.
+        return math.log2(node.count) + node.last_update_time / 1e9 / self.half_life
 
-        self._prefix_counter: Dict[str, Dict[str, int]] = {}
+    def _push_leaf(self, node: _TrieNode) -> None:
+        node.heap_key = self._eviction_key(node)
+        self._heap_seq += 1
+        heapq.heappush(self._leaf_heap, (node.heap_key, self._heap_seq, node))
 
-    def add_prefix(self, prefix: str) -> None:
+        # Too many stale entries. Rebuild the heap from the leaves.
+        if len(self._leaf_heap) > 2 * self._nodes_num + 64:
+            self._leaf_heap = []
+            for leaf in self._iter_nodes():
+                if leaf.is_leaf and leaf.parent is not None:
+                    leaf.heap_key = self._eviction_key(leaf)
+                    self._heap_seq += 1
+                    self._leaf_heap.append((leaf.heap_key, self._heap_seq, leaf))
+            heapq.heapify(self._leaf_heap)
+
+    @staticmethod
+    def _is_attached_leaf(node: _TrieNode) -> bool:
+        return (
+            node.is_leaf
+            and node.parent is not None
+            and node.parent.children.get(node.label[0]) is node
+        )
+
+    def _merge_with_child(self, node: _TrieNode) -> None:
+        """Merge a node with its only child, to keep the trie compressed."""
+
+        (child,) = node.children.values()
+        parent = node.parent
+        child.label = node.label + child.label
+        child.parent = parent
+        parent.children[child.label[0]] = child
+
+        node.parent = None
+        node.children = {}
+        self._nodes_num -= 1
+
+    def _split(self, node: _TrieNode, pos: int) -> _TrieNode:
+        """Split the edge to node at pos of its label. Returns the new middle node."""
+
+        parent = node.parent
+        mid = _TrieNode(node.label[:pos], parent, node.last_update_time)
+        mid.count = node.count
+        parent.children[mid.label[0]] = mid
+
+        node.label = node.label[pos:]
+        node.parent = mid
+        mid.children[node.label[0]] = node
+
+        self._nodes_num += 1
+        return mid
+
+    def add_prefix(self, prefix: Prefix, namespace: str = "") -> None:
         """Add a prefix to the global prefix cache.
 
         Args:
-            prefix (str): The prefix to be added.
+            prefix (Prefix): The prefix to be added. A string or a tuple of token ids.
+            namespace (str): The namespace of the prefix, e.g. the tokenizer name.
         """
 
         # Too short
         if len(prefix) <= self._START_LEN:
             return
 
-        lookup = prefix[: self._START_LEN]
-        if lookup not in self._prefix_counter:
-            self._prefix_counter[lookup] = {}
-
-        prefixes = list(self._prefix_counter[lookup].keys())
-
-        for k in prefixes:
-            # Matched
-            if k[self._START_LEN] == prefix[self._START_LEN]:
-                # Reduce to common prefix
-                i = self._START_LEN
-                while i < len(k) and i < len(prefix) and k[i] == prefix[i]:
-                    i += 1
-
-                new_k = k[:i]
-
-                if i == len(k):
-                    # Common prefix is the same
-                    self._prefix_counter[lookup][k] += 1
-                else:
-                    # Common prefix changes
-                    self._prefix_counter[lookup][new_k] = (
-                        self._prefix_counter[lookup][k] + 1
-                    )
-                    self._prefix_counter[lookup].pop(k)
-                return
-
-        # Add to table
-        self._prefix_counter[lookup][prefix] = 1
-
-    def query_prefix(self, prefix: str) -> int:
+        now = time_counter_in_nanoseconds()
+        node = self._roots.get(namespace)
+        if node is None:
+            node = _TrieNode(prefix[:0], None, now)
+            self._roots[namespace] = node
+            self._nodes_num += 1
+        pos = 0
+
+        while pos < len(prefix):
+            child = node.children.get(prefix[pos])
+
+            if child is None:
+                # Add the rest as a new leaf.
+                leaf = _TrieNode(prefix[pos:], node, now)
+                node.children[prefix[pos]] = leaf
+                self._hit(leaf, now)
+                self._chars_num += len(leaf.label)
+                self._nodes_num += 1
+                node = leaf
+                break
+
+            label = child.label
+            if not _starts_with(prefix, label, pos):
+                # Diverge in the middle of the edge. Split it at the common part.
+                common_len = 1
+                while (
+                    pos + common_len < len(prefix)
+                    and label[common_len] == prefix[pos + common_len]
+                ):
+                    common_len += 1
+                child = self._split(child, common_len)
+
+            self._hit(child, now)
+            node = child
+            pos += len(child.label)
+
+        if node.is_leaf:
+            self._push_leaf(node)
+
+        if self._chars_num > self.max_chars:
+            self._evict(now)
+
+    def query_prefix(self, prefix: Prefix, namespace: str = "") -> int:
         """Query whether the prefix is a global prefix.
 
         Args:
-            prefix (str): The prefix to be queried.
+            prefix (Prefix): The prefix to be queried. A string or a tuple of token ids.
+            namespace (str): The namespace of the prefix, e.g. the tokenizer name.
 
         Returns:
             -1 if the prefix is not a global prefix.
-            Otherwise, returns the position of the last matched character.
+            Otherwise, returns the position of the last matched character (or token), i.e.
+            the length of the longest GlobalPrefix which the prefix starts with.
         """
 
-        if len(prefix) <= self._START_LEN:
+        if len(prefix) <= self._START_LEN or namespace not in self._roots:
             return -1
 
-        lookup = prefix[: self._START_LEN]
+        now = time_counter_in_nanoseconds()
+        node = self._roots[namespace]
+        pos = 0
+        matched_pos = -1
 
-        if lookup not in self._prefix_counter:
-            return -1
+        while pos < len(prefix):
+            child = node.children.get(prefix[pos])
+            if child is None or not _starts_with(prefix, child.label, pos):
+                break
+
+            node = child
+            pos += len(child.label)
+            if (
+                pos > self._START_LEN
+                and self._decayed_count(node, now) > self._GP_THRESHOLD
+            ):
+                matched_pos = pos
+
+        return matched_pos
+
+    def _evict(self, now: int) -> None:
+        """Evict cold branches until the trie is below the low watermark."""
+
+        target_chars_num = self._EVICT_LOW_WATERMARK * self.max_chars
+
+        # Evict the leaves with the lowest counts first. A parent becomes a candidate once
+        # all its children are evicted.
+        while self._chars_num > target_chars_num and len(self._leaf_heap) > 0:
+            key, _, node = heapq.heappop(self._leaf_heap)
+            if key != node.heap_key or not self._is_attached_leaf(node):
+                continue  # Stale
+
+            parent = node.parent
+            parent.children.pop(node.label[0])
+            node.parent = None
+            self._chars_num -= len(node.label)
+            self._nodes_num -= 1
 
-        for k, v in self._prefix_counter[lookup].items():
-            if v > self._GP_THRESHOLD and prefix.startswith(k):
-                return len(k)
+            if parent.parent is None:  # Root
+                continue
+            if parent.is_leaf:
+                self._push_leaf(parent)
+            elif (
+                len(parent.children) == 1
+                and self._decayed_count(parent, now) <= self._GP_THRESHOLD
+            ):
+                # NOTE: A parent with a popular count is kept even with one child, since it
+                # is the end of a GlobalPrefix. Merging it would lose its count.
+                self._merge_with_child(parent)
 
-        return -1
+    def _iter_nodes(self):
+        stack = list(self._roots.values())
+        while len(stack) > 0:
+            node = stack.pop()
+            yield node
+            stack.extend(node.children.values())
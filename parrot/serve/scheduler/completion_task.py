@@ -3,8 +3,8 @@
 
 
 from enum import Enum
-from typing import List, Dict, Optional
-from asyncio import Event
+from typing import List, Dict, Optional, Set
+from asyncio import Event, gather
 
 from parrot.exceptions import parrot_assert
 
@@ -42,6 +42,10 @@ class CompletionTask:
         # A tokenized result is a List of token ids, i.e. List[List[int]]
         self.tokenized_result: Optional[Dict[str, List[List[int]]]] = None
 
+        # Indices of Fill nodes whose SVs are still being generated when tokenizing.
+        # They are filled in pipelined mode. (See GraphExecutor.)
+        self.pipelined_fills: Set[int] = set()
+
         # Context bound to the task
         # A list of contexts that are bound to the task
         self.contexts: List[Context] = []
@@ -50,6 +54,8 @@ class CompletionTask:
         self._scheduled_event: Event = Event()
         self.schedule_annotation = schedule_annotation
         self.engine: Optional[ExecutionEngine] = None
+        # Set if the task is rejected by the scheduler, e.g. it can't meet its deadline.
+        self.schedule_exception: Optional[Exception] = None
 
     @property
     def is_tokenized(self) -> bool:
@@ -61,7 +67,11 @@ class CompletionTask:
 
     @property
     def is_scheduled(self) -> bool:
-        return self._scheduled_event.is_set()
+        return self._scheduled_event.is_set() and self.schedule_exception is None
+
+    @property
+    def is_rejected(self) -> bool:
+        return self.schedule_exception is not None
 
     def schedule_to(
         self, engine: ExecutionEngine, update_engine_info: bool = True
@@ -74,38 +84,106 @@ class CompletionTask:
         if update_engine_info:
             self.engine.update_servelayer_runtime_info_add_task(self)
 
+    def reject(self, exception: Exception) -> None:
+        """Reject the task. The waiter of scheduling gets the exception."""
+
+        self.schedule_exception = exception
+        self.status = TaskStatus.ERROR
+        self._scheduled_event.set()
+
     async def wait_scheduled(self) -> None:
-        """Wait until the task is scheduled."""
+        """Wait until the task is scheduled. Raise the exception if it's rejected."""
 
         await self._scheduled_event.wait()
+        if self.schedule_exception is not None:
+            raise self.schedule_exception
 
     def leave_scheduled(self) -> None:
         """Leave the scheduled status."""
 
         self.engine.update_servelayer_runtime_info_remove_task(self)
 
-    def tokenize_chain(self, tokenizers_wrapper: "TokenizersWrapper") -> None:
-        """Tokenize the chain using the tokenizers in the wrapper."""
+    def unschedule(self) -> None:
+        """Leave the engine and go back to the unscheduled state, so that the task can be
+        submitted to the scheduler again, e.g. when its engine fails.
 
-        parrot_assert(not self.is_tokenized, "Tokenized result is already available.")
-        parrot_assert(self.chain.sv_created, "SVs are not created yet.")
+        The contexts of the task should be freed before.
+        """
+
+        self.leave_scheduled()
+        self.engine = None
+        self.contexts = []
+        self._scheduled_event.clear()
+        self.status = TaskStatus.CREATED
+
+    def _set_tokenized_results(
+        self, tokenized_results: List[Optional[Dict]], tokenizer_names: List[str]
+    ) -> None:
+        """Set the tokenized result from the results of Fill nodes. None means the Fill is
+        pipelined."""
 
         self.tokenized_result = {}
-        for fill_node in self.chain.iter_fill():
-            tokenized_result: Dict = tokenizers_wrapper.tokenize_all(fill_node.get())
+        for i, tokenized_result in enumerate(tokenized_results):
+            if tokenized_result is None:
+                # Pipelined Fill: the content is not ready. Tokens are sent when generated.
+                self.pipelined_fills.add(i)
+                tokenized_result = {key: [] for key in tokenizer_names}
             for key, value in tokenized_result.items():
                 if key not in self.tokenized_result:
                     self.tokenized_result[key] = []
                 self.tokenized_result[key].append(value)
 
+    def tokenize_chain(self, tokenizers_wrapper: "TokenizersWrapper") -> None:
+        """Tokenize the chain using the tokenizers in the wrapper."""
+
+        parrot_assert(not self.is_tokenized, "Tokenized result is already available.")
+        parrot_assert(self.chain.sv_created, "SVs are not created yet.")
+
+        self._set_tokenized_results(
+            [
+                (
+                    tokenizers_wrapper.tokenize_var_all(fill_node.sv)
+                    if fill_node.sv.is_ready()
+                    else None
+                )
+                for fill_node in self.chain.iter_fill()
+            ],
+            list(tokenizers_wrapper.tokenizers),
+        )
+
+    async def atokenize_chain(self, tokenizers_wrapper: "TokenizersWrapper") -> None:
+        """Tokenize the chain using the tokenizers in the wrapper, off the event loop.
+        The Fill nodes are tokenized in batches."""
+
+        parrot_assert(not self.is_tokenized, "Tokenized result is already available.")
+        parrot_assert(self.chain.sv_created, "SVs are not created yet.")
+
+        async def _tokenize_fill(fill_node) -> Optional[Dict]:
+            if not fill_node.sv.is_ready():
+                return None
+            return await tokenizers_wrapper.atokenize_var_all(fill_node.sv)
+
+        tokenizer_names = list(tokenizers_wrapper.tokenizers)
+        tokenized_results = await gather(
+            *[_tokenize_fill(fill_node) for fill_node in self.chain.iter_fill()]
+        )
+        self._set_tokenized_results(tokenized_results, tokenizer_names)
+
     def get_token_nums(self, tokenizer_name: str) -> int:
         """Get the number of tokens in the tokenized result."""
 
         parrot_assert(self.is_tokenized, "Tokenized result is not available.")
         tokens_num = 0
         # Add the number of tokens in Fill part.
-        for token_ids in self.tokenized_result[tokenizer_name]:
-            tokens_num += len(token_ids)
+        # NOTE: Pipelined Fills are estimated by their producers, even after their
+        # tokens are filled, so that the result is the same when the task is added to and
+        # removed from an engine.
+        for i, fill_node in enumerate(self.chain.iter_fill()):
+            if i in self.pipelined_fills:
+                producer = fill_node.sv.get_producer()
+                tokens_num += producer.sampling_config.max_gen_length
+            else:
+                tokens_num += len(self.tokenized_result[tokenizer_name][i])
         # Add the number of tokens in Gen part.
         tokens_num += self.chain.gen_node.sampling_config.max_gen_length
         return tokens_num
@@ -2,31 +2,62 @@
 # Licensed under the MIT license.
 
 
-from typing import Optional, List, Set
+from typing import Optional, List, Set, Dict, Tuple, Deque
+from collections import defaultdict, deque
 from dataclasses import dataclass
+import asyncio
+import bisect
 
-from parrot.exceptions import ParrotCoreUserError
-from parrot.utils import get_logger, RecyclePool
+from parrot.exceptions import (
+    ParrotCoreUserError,
+    ParrotCoreInternalError,
+    parrot_assert,
+)
+from parrot.utils import get_logger, RecyclePool, time_counter_in_nanoseconds
 
-from parrot.serve.graph import RequestChain
+from parrot.serve.graph import RequestChain, CompletionChain
 from parrot.serve.backend_repr import ExecutionEngine
-from parrot.serve.backend_repr.model import get_model_type, ModelType
+from parrot.serve.backend_repr.model import get_model_type, ModelType, LanguageModel
 
 from ..engine_manager import EngineManager
 from ..context_manager import ServeCoreContextManager
 from .completion_task import CompletionTask, TaskStatus
+from .placement import create_placement_policy, LatencyModelPlacement
 
 
 logger = get_logger("GlobalScheduler")
 
 
+DDL_ORDERS = ["edf", "least_slack"]
+
+
 @dataclass
 class GlobalSchedulerConfig:
     app_fifo: bool = False
     graph_group: bool = False
     ctx_group: bool = False
     ctx_aware: bool = False
-    max_queue_size: int = 1024
+    max_queue_size: int = 65536
+
+    # Placement policy: "heuristic" or "latency_model". See placement.py.
+    placement_policy: str = "heuristic"
+    # For "latency_model": the per-iteration latency (ns) of engines which haven't reported
+    # one, and the number of prefill tokens costing about one (decode) iteration.
+    default_iter_latency: float = 20_000_000
+    prefill_tokens_per_iter: int = 512
+
+    # Order of tasks with deadlines in the queue: "edf" (earliest deadline first) or
+    # "least_slack" (deadline minus predicted runtime first). They go before tasks
+    # without deadlines.
+    ddl_order: str = "edf"
+
+    # Weighted fair queueing across sessions (deficit round robin). Otherwise tasks are
+    # scheduled in the global priority order.
+    fair_queueing: bool = False
+
+    # Split a task group across engines (bin packing), if no engine can take the whole
+    # group. Otherwise the group waits in the queue until an engine can take it.
+    group_split: bool = True
 
 
 class GlobalScheduler:
@@ -42,32 +73,78 @@ class GlobalScheduler:
         self.config = config
         self.engine_mgr = engine_mgr
         self.context_mgr = context_mgr
+        self.placement_policy = create_placement_policy(
+            policy=config.placement_policy,
+            context_mgr=context_mgr,
+            ctx_aware=config.ctx_aware,
+            default_iter_latency=config.default_iter_latency,
+            prefill_tokens_per_iter=config.prefill_tokens_per_iter,
+        )
+
+        if config.ddl_order not in DDL_ORDERS:
+            raise ParrotCoreInternalError(
+                ValueError(
+                    f"Unknown ddl_order: {config.ddl_order}. "
+                    f"Supported orders: {DDL_ORDERS}"
+                )
+            )
 
         # ---------- Task Queue ----------
-        self.task_queue: List[CompletionTask] = []
+        # A sorted list of (ddl_priority, priority, submit_order, task). See _get_queue_key.
+        # NOTE: It's kept sorted on insertion, so a scheduling round walks it in the priority
+        # order without sorting (or popping a heap) again.
+        self._task_entries: List[Tuple[float, int, int, CompletionTask]] = []
+        self._queue_keys: Dict[int, Tuple[float, int, int]] = {}  # task_id -> queue key
+        self._submit_counter = 0
+
+        # Estimated work of queued tasks, in engine iterations. See _estimate_task_work.
+        self._queued_work: Dict[int, float] = {}  # task_id -> work
+        self._queued_work_sum = 0.0
+
+        # Indices for grouping tasks, so that grouping doesn't scan the whole queue.
+        # - Graph group: chains in the same CompChainGroup (CompChainGroup.chains) -> queued tasks.
+        # - Context group: first SV id -> queued tasks (task_id -> task).
+        self._chain_tasks: Dict[CompletionChain, CompletionTask] = {}
+        self._ctx_group_buckets: Dict[str, Dict[int, CompletionTask]] = defaultdict(
+            dict
+        )
+
+        # ---------- Fair Queueing ----------
+        # session_id -> weight. Sessions not registered have weight 1.
+        self._session_weights: Dict[int, float] = {}
+        # Round robin list of sessions with queued tasks. The head is the current turn.
+        self._drr_sessions: Deque[int] = deque()
+        self._drr_head_topped_up = False  # Whether the head got its quantum in this turn.
+        self._session_deficits: Dict[int, float] = {}  # session_id -> deficit
+
+        # ---------- Schedule Event ----------
+        # Set when something may change the scheduling result, e.g. a task is submitted,
+        # a task is finished or an engine's status is updated.
+        self._schedule_event = asyncio.Event()
 
     def _get_engine_list(
         self,
         tasks: List[CompletionTask],
         tasks_num_upperbound: int,
     ) -> List[ExecutionEngine]:
-        engine_list = self.engine_mgr.get_live_engines()
-
         # NOTE(chaofan): Suppose all tasks noted the same "models" arg.
         models = tasks[0].chain.metadata.models
         model_type_str = tasks[0].chain.metadata.model_type
         model_type = get_model_type(model_type_str)
         # TODO(chaofan): Throughput/latency criteria
 
-        def check_engine_available(engine: ExecutionEngine):
-            # Check whether the mode type matches
-            if model_type != engine.model.model_type:
-                return False
+        # tokenizer_name -> total tokens num of the tasks. Computed once per tokenizer.
+        total_tokens_nums: Dict[str, int] = {}
 
-            # Check whether the model matches
-            if len(models) > 0 and engine.model_name not in models:
-                return False
+        def get_total_tokens_num(model: LanguageModel) -> int:
+            tokenizer_name = model.tokenizer_name
+            if tokenizer_name not in total_tokens_nums:
+                total_tokens_nums[tokenizer_name] = sum(
+                    [task.get_token_nums(tokenizer_name) for task in tasks]
+                )
+            return total_tokens_nums[tokenizer_name]
 
+        def check_engine_available(engine: ExecutionEngine):
             # Check whether it violates the tasks_num_upperbound of the tasks.
             # NOTE(chaofan): For TaskGroup (i.e. tasks passed to this function),
             # the whole group is considered as a single task.
@@ -82,18 +159,22 @@ class GlobalScheduler:
             if len(tasks) > engine.get_remain_tasks_capacity():
                 return False
 
-            if model_type == ModelType.TOKEN_ID:
-                total_tokens_num = 0
-                for task in tasks:
-                    total_tokens_num += task.get_token_nums(engine.model.tokenizer_name)
-
-                # Check whether the engine has enough token capacity.
-                if total_tokens_num > engine.get_remain_tokens_capacity():
-                    return False
-
             return True
 
-        return [engine for engine in engine_list if check_engine_available(engine)]
+        # The model type, models and tokens capacity are checked by the engine index, so
+        # unmatched engines are not scanned.
+        candidate_engines = self.engine_mgr.iter_candidate_engines(
+            model_type,
+            models,
+            get_total_tokens_num if model_type == ModelType.TOKEN_ID else None,
+        )
+        engine_list = [
+            engine for engine in candidate_engines if check_engine_available(engine)
+        ]
+
+        # Order by engine id, so the tie-breaking in placement is deterministic.
+        engine_list.sort(key=lambda engine: engine.engine_id)
+        return engine_list
 
     def _find_engine(self, tasks: List[CompletionTask]) -> None:
         """Find the best engine for a group of tasks."""
@@ -108,64 +189,370 @@ class GlobalScheduler:
         engine_list = self._get_engine_list(tasks, tasks_num_upperbound)
 
         if len(engine_list) == 0:
+            if len(tasks) > 1 and self.config.group_split:
+                self._split_group(tasks, tasks_num_upperbound)
             return
 
-        # if len(engine_list) == 0:
-        #     if len(tasks) == 1:
-        #         return
-        #     else:
-        #         # Split the group
-        #         for task in tasks:
-        #             self._find_engine([task])
-        #         return
-
-        # Get the engines with Context
-        # We use the first task's context to find the engines with the same context
-        if self.config.ctx_aware:
-            engine_ids_with_prefixes = self.context_mgr.query_prefixes_in_engines(
-                tasks[0]
-            )
-            # print(engine_ids_with_prefixes)
-
-        best_engine = None
-        for engine in engine_list:
-            if best_engine is None:
-                best_engine = engine
-            elif (
-                self.config.ctx_aware
-                and engine.engine_id in engine_ids_with_prefixes
-                and best_engine.engine_id not in engine_ids_with_prefixes
-            ):
-                # Context-aware engine is preferred
-                best_engine = engine
-            else:
-                # Select the best engine (minimizing the negative impacts, i.e. minimizing the decreasing of upperbound)
-                # If the upperbound is not affected, select the engine with the most capacity.
-                if (
-                    engine.get_tasks_num_upperbound()
-                    < best_engine.get_tasks_num_upperbound()
-                ):
-                    best_engine = engine
-                elif (
-                    engine.get_remain_tokens_capacity()
-                    < best_engine.get_remain_tokens_capacity()
-                ):
-                    best_engine = engine
+        best_engine = self.placement_policy.select_engine(tasks, engine_list)
 
         # Dispatch the tasks to the engine
         assert best_engine is not None
         for task in tasks:
             task.schedule_to(best_engine)
 
+    def _split_group(
+        self, tasks: List[CompletionTask], tasks_num_upperbound: int
+    ) -> None:
+        """Split a group which doesn't fit any single engine across engines. Tasks which
+        can't be placed stay in the queue."""
+
+        models = tasks[0].chain.metadata.models
+        model_type = get_model_type(tasks[0].chain.metadata.model_type)
+        # NOTE: Materialize the list, since scheduling changes the engines' capacity.
+        engine_list = list(self.engine_mgr.iter_candidate_engines(model_type, models))
+        engine_list.sort(key=lambda engine: engine.engine_id)
+
+        parts = self.placement_policy.split_group(
+            tasks, engine_list, tasks_num_upperbound
+        )
+        for engine, part in parts:
+            for task in part:
+                task.schedule_to(engine)
+
+        if len(parts) > 1:
+            logger.debug(
+                f"Split a group of {len(tasks)} tasks across {len(parts)} engines: "
+                + ", ".join(
+                    [f"engine {engine.engine_id}: {len(part)}" for engine, part in parts]
+                )
+            )
+
+    def _get_reported_iter_latencies(self) -> List[float]:
+        """Per-iteration latencies (ns) reported by live engines."""
+
+        return [
+            engine.get_recent_average_latency()
+            for engine in self.engine_mgr.get_live_engines()
+            if engine.get_recent_average_latency() > 0
+        ]
+
+    @staticmethod
+    def _estimate_runtime(task: CompletionTask, iter_latency: float) -> float:
+        """Estimate the time (ns) from the task's start to the deadline-bound output, i.e.
+        the generation of the task and its downstream tasks."""
+
+        gen_len = (
+            task.chain.gen_node.sampling_config.max_gen_length
+            + task.schedule_annotation.ddl_downstream_gen_len
+        )
+        return gen_len * iter_latency
+
+    def _get_queue_key(self, task: CompletionTask) -> Tuple[float, int, int]:
+        """The priority key of a task in the queue. Smaller key means higher priority."""
+
+        self._submit_counter += 1
+
+        ddl_priority = float("inf")
+        annotation = task.schedule_annotation
+        if annotation.has_ddl:
+            if self.config.ddl_order == "edf":
+                ddl_priority = annotation.ddl_requirement
+            else:
+                # NOTE: The slack of all tasks decreases at the same speed, so the
+                # order by (deadline - runtime) doesn't change over time.
+                latencies = self._get_reported_iter_latencies()
+                iter_latency = (
+                    sum(latencies) / len(latencies)
+                    if len(latencies) > 0
+                    else self.config.default_iter_latency
+                )
+                ddl_priority = annotation.ddl_requirement - self._estimate_runtime(
+                    task, iter_latency
+                )
+
+        if self.config.app_fifo:
+            # The deeper the chain, the higher the priority. FIFO for the same depth.
+            return (ddl_priority, -task.chain.depth, self._submit_counter)
+        return (ddl_priority, 0, self._submit_counter)
+
+    def _reject_ddl_missed_tasks(self, entries: List) -> int:
+        """Reject queued tasks which will certainly miss their deadlines, instead of letting
+        them wait in the queue. Returns the number of rejected tasks."""
+
+        cur_time = time_counter_in_nanoseconds()
+
+        # The lower bound of the per-iteration latency: the fastest engine with batch size 1.
+        # If no engine reports the latency, only tasks already past their deadlines are rejected.
+        latencies = self._get_reported_iter_latencies()
+        min_iter_latency = (
+            min(latencies) * LatencyModelPlacement.FIXED_LATENCY_FRACTION
+            if len(latencies) > 0
+            else 0
+        )
+
+        rejected_num = 0
+        for entry in entries:
+            # NOTE: Tasks with deadlines have finite ddl_priority, so they are at the head of
+            # the queue. The rest of the queue has no deadline to miss.
+            if entry[0] == float("inf"):
+                break
+
+            task: CompletionTask = entry[-1]
+            annotation = task.schedule_annotation
+
+            min_runtime = self._estimate_runtime(task, min_iter_latency)
+            if cur_time + min_runtime <= annotation.ddl_requirement:
+                continue
+
+            logger.warning(
+                f"Task(task_id={task.task_id}) will miss its deadline and is rejected. "
+                f"Time to deadline: {(annotation.ddl_requirement - cur_time) / 1e6:.2f} ms, "
+                f"min runtime: {min_runtime / 1e6:.2f} ms."
+            )
+            self._remove_from_indices(task)
+            task.reject(
+                ParrotCoreUserError(
+                    RuntimeError(
+                        f"Task(task_id={task.task_id}) can't be finished before its deadline."
+                    )
+                )
+            )
+            rejected_num += 1
+
+        return rejected_num
+
+    def _estimate_task_work(self, task: CompletionTask) -> float:
+        """Estimate the work of a task in engine iterations: one iteration per generated token,
+        and one per prefill_tokens_per_iter prompt tokens."""
+
+        gen_len = task.chain.gen_node.sampling_config.max_gen_length
+        if not task.is_tokenized or len(task.tokenized_result) == 0:
+            # E.g. text models. The prompt is processed remotely.
+            return gen_len
+
+        tokenizer_name = next(iter(task.tokenized_result))
+        prefill_tokens_num = task.get_token_nums(tokenizer_name) - gen_len
+        return prefill_tokens_num / self.config.prefill_tokens_per_iter + gen_len
+
+    def _remove_from_indices(self, task: CompletionTask) -> None:
+        self._queue_keys.pop(task.task_id)
+        self._queued_work_sum -= self._queued_work.pop(task.task_id)
+        if len(self._queued_work) == 0:
+            self._queued_work_sum = 0.0  # Clear the accumulated float error.
+        self._chain_tasks.pop(task.chain)
+
+        sv_id = task.chain.first_node.var_id
+        bucket = self._ctx_group_buckets[sv_id]
+        bucket.pop(task.task_id)
+        if len(bucket) == 0:
+            self._ctx_group_buckets.pop(sv_id)
+
+    def _get_group_candidates(
+        self, task: CompletionTask, grouped_task_ids: Set[int]
+    ) -> List[CompletionTask]:
+        """Get the tasks behind this task in the queue which may be grouped with it,
+        in the queue order."""
+
+        candidates: Dict[int, CompletionTask] = {}
+        if self.config.graph_group:
+            # NOTE: Chain groups may be added to a chain after it's submitted
+            # (when another consumer is activated). So we look up the groups' chains directly.
+            for chain_group in task.chain.chain_groups:
+                for chain in chain_group.chains:
+                    task_j = self._chain_tasks.get(chain)
+                    if task_j is not None:
+                        candidates[task_j.task_id] = task_j
+        if self.config.ctx_group:
+            candidates.update(
+                self._ctx_group_buckets.get(task.chain.first_node.var_id, {})
+            )
+
+        task_key = self._queue_keys[task.task_id]
+        candidates_list = [
+            task_j
+            for task_j in candidates.values()
+            if self._queue_keys[task_j.task_id] > task_key
+            and not task_j.is_scheduled
+            and task_j.task_id not in grouped_task_ids
+        ]
+        candidates_list.sort(key=lambda x: self._queue_keys[x.task_id])
+        return candidates_list
+
+    @staticmethod
+    def _can_lead_group(task: CompletionTask, grouped_task_ids: Set[int]) -> bool:
+        return not (
+            task.is_scheduled
+            or task.is_rejected
+            or task.task_id in grouped_task_ids
+        )
+
+    def _schedule_group(
+        self, task: CompletionTask, grouped_task_ids: Set[int]
+    ) -> List[CompletionTask]:
+        """Group the task with the tasks behind it in the queue, and try to find an engine
+        for the group. Returns the group."""
+
+        # Group tasks in rest queue
+        cur_group: List[CompletionTask] = [task]
+        chain_groups = set(task.chain.chain_groups)
+
+        # Only allow one type of grouping at a time
+        graph_group_enabled = self.config.graph_group
+        ctx_group_enabled = self.config.ctx_group
+
+        if graph_group_enabled or ctx_group_enabled:
+            # Only tasks sharing a CompChainGroup or the first SV with this task can be
+            # grouped. They are looked up in the buckets, instead of scanning the queue.
+            for task_j in self._get_group_candidates(task, grouped_task_ids):
+                # TODO(chaofan): Models match check
+                models_i = task.chain.metadata.models
+                models_j = task_j.chain.metadata.models
+
+                # TODO(chaofan): Criteria match check. Only group tasks with the same criteria.
+
+                # Graph group check
+                if graph_group_enabled:
+                    chain_groups_j = set(task_j.chain.chain_groups)
+                    common_groups = chain_groups.intersection(chain_groups_j)
+                    if len(common_groups) > 0:
+                        cur_group.append(task_j)
+                        chain_groups = common_groups
+                        ctx_group_enabled = False  # Use graph group this round
+
+                # Context group check
+                if ctx_group_enabled:
+                    if task.chain.first_node.sv == task_j.chain.first_node.sv:
+                        cur_group.append(task_j)
+                        graph_group_enabled = False  # Use context group this round
+
+            for task_j in cur_group:
+                grouped_task_ids.add(task_j.task_id)
+
+        # Try to find engines for the group
+        self._find_engine(cur_group)
+
+        return cur_group
+
+    def _get_session_quantum(self, session_id: int, min_weight: float) -> float:
+        # Normalized, so the session with the minimum weight gets 1 task per turn.
+        return self._session_weights.get(session_id, 1.0) / min_weight
+
+    def _schedule_fair(self, entries: List, grouped_task_ids: Set[int]) -> None:
+        """Schedule tasks with deficit round robin (DRR) across sessions.
+
+        Sessions with queued tasks take turns. In its turn, a session gets a quantum
+        proportional to its weight, and its tasks (in the priority order) are scheduled
+        until the deficit is used up. A group costs the number of its scheduled tasks.
+        The turn and the deficits are kept across scheduling rounds, since a round usually
+        schedules only a few tasks (when a few slots are released).
+        """
+
+        # session_id -> tasks to try in this round, in the priority order.
+        session_queues: Dict[int, Deque[CompletionTask]] = {}
+        for entry in entries:
+            task: CompletionTask = entry[-1]
+            session_queues.setdefault(task.chain.session_id, deque()).append(task)
+
+        # Sync the round robin list with the sessions having queued tasks.
+        active_sessions = deque(
+            [sid for sid in self._drr_sessions if sid in session_queues]
+        )
+        if len(active_sessions) == 0 or active_sessions[0] != self._drr_sessions[0]:
+            self._drr_head_topped_up = False
+        for sid in session_queues:
+            if sid not in self._session_deficits:
+                self._session_deficits[sid] = 0.0
+                active_sessions.append(sid)
+        for sid in list(self._session_deficits.keys()):
+            if sid not in session_queues:
+                self._session_deficits.pop(sid)
+        self._drr_sessions = active_sessions
+
+        if len(active_sessions) == 0:
+            return
+
+        min_weight = min(
+            [self._session_weights.get(sid, 1.0) for sid in active_sessions]
+        )
+        # Sessions with tasks not tried in this round.
+        untried_sessions = set(session_queues.keys())
+
+        while len(untried_sessions) > 0:
+            sid = active_sessions[0]
+            if sid in untried_sessions:
+                quantum = self._get_session_quantum(sid, min_weight)
+                queue = session_queues[sid]
+
+                if not self._drr_head_topped_up:
+                    self._session_deficits[sid] += quantum
+                    self._drr_head_topped_up = True
+
+                # Serve the session until its deficit is used up.
+                blocked = False
+                while len(queue) > 0 and self._session_deficits[sid] >= 1:
+                    task = queue.popleft()
+                    if not self._can_lead_group(task, grouped_task_ids):
+                        continue
+                    cur_group = self._schedule_group(task, grouped_task_ids)
+                    # NOTE: A split group may be partially scheduled.
+                    scheduled_num = len([t for t in cur_group if t.is_scheduled])
+                    self._session_deficits[sid] -= scheduled_num
+                    if scheduled_num < len(cur_group):
+                        blocked = True
+
+                if len(queue) == 0:
+                    untried_sessions.remove(sid)
+
+                    if blocked:
+                        # NOTE: Some tasks of the session can't be placed now (e.g.
+                        # engines are full). The session keeps its turn and the rest of its
+                        # deficit, so the released slots go to it first in the next round.
+                        # Other sessions only take the spare capacity, free of charge.
+                        for other_sid in active_sessions:
+                            if other_sid not in untried_sessions:
+                                continue
+                            for task in session_queues[other_sid]:
+                                if self._can_lead_group(task, grouped_task_ids):
+                                    self._schedule_group(task, grouped_task_ids)
+                        break
+
+                    # All tasks are scheduled. Bound the deficit, so that a session can't
+                    # accumulate credits while it has nothing to send.
+                    self._session_deficits[sid] = min(
+                        self._session_deficits[sid], quantum
+                    )
+
+                if len(untried_sessions) == 0:
+                    break
+
+            active_sessions.rotate(-1)
+            self._drr_head_topped_up = False
+
     # ---------- Public Methods ----------
 
+    @property
+    def task_queue(self) -> List[CompletionTask]:
+        """Tasks in the queue, in the order of priority."""
+
+        return [entry[-1] for entry in self._task_entries]
+
+    @property
+    def num_queued_tasks(self) -> int:
+        return len(self._task_entries)
+
+    @property
+    def queued_work(self) -> float:
+        """Estimated work of the tasks in the queue, in engine iterations."""
+
+        return self._queued_work_sum
+
     def submit_task(self, task: CompletionTask) -> None:
         """Submit a task to the scheduler's queue."""
 
-        if len(self.task_queue) >= self.config.max_queue_size:
+        if len(self._task_entries) >= self.config.max_queue_size:
             raise ParrotCoreUserError(
                 RuntimeError(
-                    f"Task queue is full. Current size: {len(self.task_queue)}. "
+                    f"Task queue is full. Current size: {len(self._task_entries)}. "
                     f"Hence the incoming task is rejected."
                 )
             )
@@ -175,63 +562,105 @@ class GlobalScheduler:
             " to GlobalScheduler."
         )
 
-        self.task_queue.append(task)
+        queue_key = self._get_queue_key(task)
+        self._queue_keys[task.task_id] = queue_key
+        work = self._estimate_task_work(task)
+        self._queued_work[task.task_id] = work
+        self._queued_work_sum += work
+        bisect.insort(self._task_entries, (*queue_key, task))
+        self._chain_tasks[task.chain] = task
+        self._ctx_group_buckets[task.chain.first_node.var_id][task.task_id] = task
+
         task.status = TaskStatus.INQUEUE
+        self.notify_schedule()
         return
 
-    def schedule(self) -> None:
-        """Try to schedule all tasks in scheduler's queue."""
+    def register_session(self, session_id: int, weight: float = 1.0) -> None:
+        """Register a session with its weight in fair queueing.
 
-        if self.config.app_fifo:
-            # Sort the tasks by the order of depth
-            # The deeper the chain, the higher the priority
-            self.task_queue.sort(key=lambda x: -x.chain.depth)
+        Args:
+            session_id: int. The session ID.
+            weight: float. The weight of the session. A session with weight w gets w times
+                the share of a session with weight 1, when both have queued tasks.
+        """
 
-        # NOTE(chaofan): The tasks are sorted by priority, by default.
-        for i, task in enumerate(self.task_queue):
-            if task.is_scheduled:
-                continue
+        parrot_assert(weight > 0, f"Session weight must be positive. Got: {weight}")
+        self._session_weights[session_id] = weight
+
+    def free_session(self, session_id: int) -> None:
+        """Free the scheduling states of a session."""
 
-            # Group tasks in rest queue
-            cur_group: List[CompletionTask] = [task]
-            chain_groups = set(task.chain.chain_groups)
+        self._session_weights.pop(session_id, None)
 
-            # Only allow one type of grouping at a time
-            graph_group_enabled = self.config.graph_group
-            ctx_group_enabled = self.config.ctx_group
+    def notify_schedule(self) -> None:
+        """Trigger a scheduling round in the ServeCore loop."""
 
-            if graph_group_enabled or ctx_group_enabled:
-                for j in range(i + 1, len(self.task_queue)):
-                    task_j = self.task_queue[j]
+        self._schedule_event.set()
 
-                    # TODO(chaofan): Models match check
-                    models_i = task.chain.metadata.models
-                    models_j = task_j.chain.metadata.models
+    async def wait_schedule(self) -> None:
+        """Wait until a scheduling round is triggered."""
 
-                    # TODO(chaofan): Criteria match check. Only group tasks with the same criteria.
+        await self._schedule_event.wait()
+        self._schedule_event.clear()
 
-                    # Graph group check
-                    if graph_group_enabled:
-                        chain_groups_j = set(task_j.chain.chain_groups)
-                        common_groups = chain_groups.intersection(chain_groups_j)
-                        if len(common_groups) > 0:
-                            cur_group.append(task_j)
-                            chain_groups = common_groups
-                            ctx_group_enabled = False  # Use graph group this round
+    def _has_free_engine(self) -> bool:
+        """Whether any live engine can take one more task."""
 
-                    # Context group check
-                    if ctx_group_enabled:
-                        if task.chain.first_node.sv == task_j.chain.first_node.sv:
-                            cur_group.append(task_j)
-                            graph_group_enabled = False  # Use context group this round
+        return any(
+            engine.get_remain_tasks_capacity() > 0
+            for engine in self.engine_mgr.get_live_engines()
+        )
 
-            # Try to find engines for the group
-            self._find_engine(cur_group)
+    def schedule(self) -> None:
+        """Try to schedule tasks in scheduler's queue, in the order of priority.
+
+        A round costs O(D + S * (E + G)), plus O(Q) if any task leaves the queue or fair
+        queueing is enabled. Here Q is the queue length, D the number of queued tasks with
+        deadlines, S the number of tasks tried as the leading task of a group, E the number of
+        engines and G the group size. Trying stops once no engine can take more tasks, so S is
+        small when the cluster is saturated. Otherwise (e.g. engines have free slots but not
+        enough tokens capacity for the queued tasks), S may be up to Q.
+        """
+
+        entries = self._task_entries
+        queue_changed = self._reject_ddl_missed_tasks(entries) > 0
+
+        # Tasks which have been considered in a group in this round. If the group is not
+        # scheduled, they are not regrouped as the leading task again in this round.
+        grouped_task_ids: Set[int] = set()
+
+        # NOTE: Every placement needs a free task slot. If no engine has one, no task in the
+        # queue can be scheduled, and there is no need to try them one by one.
+        if self._has_free_engine():
+            if self.config.fair_queueing:
+                self._schedule_fair(entries, grouped_task_ids)
+                queue_changed = True
+            else:
+                # NOTE: The tasks are sorted by priority, by default.
+                for entry in entries:
+                    task: CompletionTask = entry[-1]
+                    if not self._can_lead_group(task, grouped_task_ids):
+                        continue
+                    cur_group = self._schedule_group(task, grouped_task_ids)
+                    if any([task_j.is_scheduled for task_j in cur_group]):
+                        queue_changed = True
+                        if not self._has_free_engine():
+                            break
+
+        if not queue_changed:
+            return
 
         # Update the task queue
-        prev_task_queue = self.task_queue
-        scheduled_task = [task for task in prev_task_queue if task.is_scheduled]
-        self.task_queue = [task for task in prev_task_queue if not task.is_scheduled]
+        scheduled_task = []
+        remained_entries = []
+        for entry in entries:
+            task = entry[-1]
+            if task.is_scheduled:
+                scheduled_task.append(task)
+                self._remove_from_indices(task)
+            elif not task.is_rejected:
+                remained_entries.append(entry)
+        self._task_entries = remained_entries
 
         # Display the scheduled results.
         # NOTE(chaofan): Only display >0 case to reduce the log size.
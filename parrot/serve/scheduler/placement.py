@@ -0,0 +1,438 @@
+# Copyright (c) 2023 by Microsoft Corporation.
+# Licensed under the MIT license.
+
+"""Placement policies: choose an engine for a group of tasks among the available engines."""
+
+
+from abc import ABC, abstractmethod
+from typing import List, Dict, Optional, Tuple
+
+from parrot.exceptions import ParrotCoreInternalError
+from parrot.utils import time_counter_in_nanoseconds
+
+from parrot.serve.backend_repr import ExecutionEngine, ModelType
+
+from ..context_manager import ServeCoreContextManager
+from .completion_task import CompletionTask
+
+
+class PlacementPolicy(ABC):
+    """Base class of placement policies."""
+
+    def __init__(self, context_mgr: ServeCoreContextManager, ctx_aware: bool):
+        self.context_mgr = context_mgr
+        self.ctx_aware = ctx_aware
+
+    @abstractmethod
+    def select_engine(
+        self, tasks: List[CompletionTask], engine_list: List[ExecutionEngine]
+    ) -> ExecutionEngine:
+        """Select an engine for a group of tasks.
+
+        Args:
+            tasks: List[CompletionTask]. The task group.
+            engine_list: List[ExecutionEngine]. The available engines. Not empty.
+
+        Returns:
+            ExecutionEngine. The selected engine.
+        """
+        ...
+
+    def split_group(
+        self,
+        tasks: List[CompletionTask],
+        engine_list: List[ExecutionEngine],
+        tasks_num_upperbound: int,
+    ) -> List[Tuple[ExecutionEngine, List[CompletionTask]]]:
+        """Split a group which doesn't fit any single engine across engines.
+
+        It's a best-fit-decreasing bin packing on the remaining capacity of engines. Tasks
+        sharing the same prefix (the first SV) are packed as a unit, so they can share the
+        prefix context. A unit is split into tasks only if no engine can hold it as a whole.
+        With ctx_aware, engines which cache the unit's prefix are preferred.
+
+        Args:
+            tasks: List[CompletionTask]. The task group.
+            engine_list: List[ExecutionEngine]. The engines of the group's model.
+            tasks_num_upperbound: int. The minimum tasks_num_upperbound of the tasks.
+
+        Returns:
+            List of (engine, tasks). Tasks not in the result can't be placed now.
+        """
+
+        # engine_id -> remaining [tasks num, tokens num] during packing.
+        # Text engines don't count tokens.
+        remain_capacities: Dict[int, List[float]] = {}
+        for engine in engine_list:
+            if 1 + engine.get_num_tasks() > tasks_num_upperbound:
+                continue
+            remain_tasks_num = min(
+                engine.get_remain_tasks_capacity(),
+                engine.get_tasks_num_upperbound() - engine.get_num_tasks(),
+            )
+            remain_tokens_num = (
+                engine.get_remain_tokens_capacity()
+                if engine.model_type == ModelType.TOKEN_ID
+                else float("inf")
+            )
+            if remain_tasks_num > 0 and remain_tokens_num > 0:
+                remain_capacities[engine.engine_id] = [
+                    remain_tasks_num,
+                    remain_tokens_num,
+                ]
+        engines = [
+            engine for engine in engine_list if engine.engine_id in remain_capacities
+        ]
+        if len(engines) == 0:
+            return []
+
+        def get_tokens_num(unit: List[CompletionTask], engine: ExecutionEngine) -> int:
+            if engine.model_type != ModelType.TOKEN_ID:
+                return 0
+            return sum([task.get_token_nums(engine.tokenizer_name) for task in unit])
+
+        def select_engine(unit: List[CompletionTask]) -> Optional[ExecutionEngine]:
+            prefix_depths = (
+                self.context_mgr.query_prefix_depths_in_engines(unit[0])
+                if self.ctx_aware
+                else {}
+            )
+
+            best_engine = None
+            best_key = None
+            for engine in engines:
+                remain_tasks_num, remain_tokens_num = remain_capacities[engine.engine_id]
+                tokens_num = get_tokens_num(unit, engine)
+                if len(unit) > remain_tasks_num or tokens_num > remain_tokens_num:
+                    continue
+                # Cached prefix first, then the tightest fit.
+                key = (
+                    -prefix_depths.get(engine.engine_id, 0),
+                    remain_tokens_num - tokens_num,
+                    remain_tasks_num - len(unit),
+                )
+                if best_key is None or key < best_key:
+                    best_engine = engine
+                    best_key = key
+            return best_engine
+
+        # Units of tasks sharing the same prefix, in the decreasing order of size.
+        units: Dict[str, List[CompletionTask]] = {}
+        for task in tasks:
+            units.setdefault(task.chain.first_node.var_id, []).append(task)
+        size_engine = engines[0]
+        units_list = sorted(
+            units.values(),
+            key=lambda unit: (get_tokens_num(unit, size_engine), len(unit)),
+            reverse=True,
+        )
+
+        placement: Dict[int, List[CompletionTask]] = {}
+
+        def place(unit: List[CompletionTask], engine: ExecutionEngine) -> None:
+            capacity = remain_capacities[engine.engine_id]
+            capacity[0] -= len(unit)
+            capacity[1] -= get_tokens_num(unit, engine)
+            placement.setdefault(engine.engine_id, []).extend(unit)
+
+        for unit in units_list:
+            engine = select_engine(unit)
+            if engine is not None:
+                place(unit, engine)
+                continue
+
+            # Split the unit.
+            for task in sorted(
+                unit, key=lambda task: get_tokens_num([task], size_engine), reverse=True
+            ):
+                engine = select_engine([task])
+                if engine is not None:
+                    place([task], engine)
+
+        return [
+            (engine, placement[engine.engine_id])
+            for engine in engines
+            if engine.engine_id in placement
+        ]
+
+
+class HeuristicPlacement(PlacementPolicy):
+    """Prefer engines with cached prefixes, then engines with the smallest tasks_num_upperbound,
+    then engines with the least remaining tokens capacity (i.e. packing tasks)."""
+
+    # override
+    def select_engine(
+        self, tasks: List[CompletionTask], engine_list: List[ExecutionEngine]
+    ) -> ExecutionEngine:
+        # Get the engines with Context
+        # We use the first task's context to find the engines with the same context
+        if self.ctx_aware:
+            # engine_id -> cached prefix depth. Looked up in the global prefix index,
+            # so the cost does not grow with the number of engines.
+            engine_ids_with_prefixes = self.context_mgr.query_prefix_depths_in_engines(
+                tasks[0]
+            )
+
+        best_engine = None
+        for engine in engine_list:
+            if best_engine is None:
+                best_engine = engine
+            elif (
+                self.ctx_aware
+                and engine.engine_id in engine_ids_with_prefixes
+                and best_engine.engine_id not in engine_ids_with_prefixes
+            ):
+                # Context-aware engine is preferred
+                best_engine = engine
+            else:
+                # Select the best engine (minimizing the negative impacts, i.e. minimizing the decreasing of upperbound)
+                # If the upperbound is not affected, select the engine with the most capacity.
+                if (
+                    engine.get_tasks_num_upperbound()
+                    < best_engine.get_tasks_num_upperbound()
+                ):
+                    best_engine = engine
+                elif (
+                    engine.get_remain_tokens_capacity()
+                    < best_engine.get_remain_tokens_capacity()
+                ):
+                    best_engine = engine
+
+        return best_engine
+
+
+class LatencyModelPlacement(PlacementPolicy):
+    """Predict the completion time of the task group on each engine, and select the engine with
+    the minimum predicted time.
+
+    The prediction uses the runtime info in engines' heartbeats:
+
+        iter_latency(b) = L * (F + (1 - F) * b / r)
+        completion_time = iter_latency(b) * (prefill_tokens / prefill_tokens_per_iter + decode_len)
+
+    where L is the measured per-iteration latency with r running jobs, b is the batch size
+    after adding the group (running + waiting jobs + the group), and F is the fraction of the
+    iteration latency that doesn't grow with the batch size (e.g. loading weights).
+    Prefixes cached in the engine are not counted in prefill tokens.
+    """
+
+    # The fraction of the per-iteration latency that is independent of the batch size.
+    FIXED_LATENCY_FRACTION = 0.8
+
+    def __init__(
+        self,
+        context_mgr: ServeCoreContextManager,
+        ctx_aware: bool,
+        default_iter_latency: float,
+        prefill_tokens_per_iter: int,
+    ):
+        super().__init__(context_mgr, ctx_aware)
+        self.default_iter_latency = default_iter_latency
+        self.prefill_tokens_per_iter = prefill_tokens_per_iter
+
+    def _get_prefill_tokens_num(
+        self,
+        task: CompletionTask,
+        engine: ExecutionEngine,
+        prefix_depths: Optional[Dict[int, int]],
+    ) -> int:
+        # NOTE: Text models don't expose tokens. Only the decode part is predicted.
+        if engine.model_type != ModelType.TOKEN_ID:
+            return 0
+
+        cached_depth = 0
+        if prefix_depths is not None:
+            cached_depth = prefix_depths.get(engine.engine_id, 0)
+
+        token_ids_list = task.tokenized_result[engine.tokenizer_name]
+        return sum(
+            [
+                len(token_ids)
+                for i, token_ids in enumerate(token_ids_list)
+                if i >= cached_depth
+            ]
+        )
+
+    def query_prefix_depths_list(
+        self, tasks: List[CompletionTask]
+    ) -> List[Optional[Dict[int, int]]]:
+        """For each task, engine_id -> cached prefix depth. None if not ctx_aware."""
+
+        if self.ctx_aware:
+            return [
+                self.context_mgr.query_prefix_depths_in_engines(task) for task in tasks
+            ]
+        return [None] * len(tasks)
+
+    def predict_iter_latency(
+        self, tasks: List[CompletionTask], engine: ExecutionEngine
+    ) -> float:
+        """Predict the per-iteration latency (in nanoseconds) of the engine after the task
+        group is added to it."""
+
+        iter_latency = engine.get_recent_average_latency()
+        if iter_latency <= 0:
+            iter_latency = self.default_iter_latency
+
+        # NOTE: Heartbeats may be outdated. The serve-layer number of tasks is exact.
+        running_num = max(engine.get_num_running_jobs(), engine.get_num_tasks(), 1)
+        waiting_num = max(engine.get_num_total_jobs() - engine.get_num_running_jobs(), 0)
+        batch_size = running_num + waiting_num + len(tasks)
+
+        fixed_fraction = self.FIXED_LATENCY_FRACTION
+        return iter_latency * (
+            fixed_fraction + (1 - fixed_fraction) * batch_size / running_num
+        )
+
+    def predict_completion_time(
+        self,
+        tasks: List[CompletionTask],
+        engine: ExecutionEngine,
+        prefix_depths_list: List[Optional[Dict[int, int]]],
+    ) -> float:
+        """Predict the time (in nanoseconds) to finish the task group on the engine.
+
+        Args:
+            tasks: List[CompletionTask]. The task group.
+            engine: ExecutionEngine. The engine.
+            prefix_depths_list: For each task, engine_id -> cached prefix depth. None if not
+                ctx_aware.
+
+        Returns:
+            float. The predicted completion time.
+        """
+
+        predicted_iter_latency = self.predict_iter_latency(tasks, engine)
+
+        prefill_tokens_num = sum(
+            [
+                self._get_prefill_tokens_num(task, engine, prefix_depths)
+                for task, prefix_depths in zip(tasks, prefix_depths_list)
+            ]
+        )
+        decode_len = max(
+            [task.chain.gen_node.sampling_config.max_gen_length for task in tasks]
+        )
+
+        iters_num = prefill_tokens_num / self.prefill_tokens_per_iter + decode_len
+        return predicted_iter_latency * iters_num
+
+    # override
+    def select_engine(
+        self, tasks: List[CompletionTask], engine_list: List[ExecutionEngine]
+    ) -> ExecutionEngine:
+        prefix_depths_list = self.query_prefix_depths_list(tasks)
+
+        best_engine = None
+        best_time = 0.0
+        for engine in engine_list:
+            predicted_time = self.predict_completion_time(
+                tasks, engine, prefix_depths_list
+            )
+            if best_engine is None or predicted_time < best_time:
+                best_engine = engine
+                best_time = predicted_time
+
+        return best_engine
+
+
+class DeadlineAwarePlacement(PlacementPolicy):
+    """Place task groups with deadlines (ScheduleAnnotation.ddl_requirement) only on engines
+    which are predicted to meet the deadline, then delegate to the base policy. If no engine
+    can meet it, select the engine with the earliest predicted finish time.
+
+    Task groups without deadlines are placed by the base policy directly.
+    """
+
+    def __init__(
+        self,
+        base_policy: PlacementPolicy,
+        latency_model: LatencyModelPlacement,
+    ):
+        super().__init__(base_policy.context_mgr, base_policy.ctx_aware)
+        self.base_policy = base_policy
+        self.latency_model = latency_model
+
+    def predict_finish_time(
+        self,
+        tasks: List[CompletionTask],
+        engine: ExecutionEngine,
+        prefix_depths_list: List[Optional[Dict[int, int]]],
+        cur_time: float,
+    ) -> float:
+        """Predict the time (absolute, in nanoseconds) when the task group and the downstream
+        generation before the deadline are finished, if the group is placed on the engine."""
+
+        completion_time = self.latency_model.predict_completion_time(
+            tasks, engine, prefix_depths_list
+        )
+        downstream_gen_len = max(
+            [task.schedule_annotation.ddl_downstream_gen_len for task in tasks]
+        )
+        # NOTE: Downstream tasks may run on other engines. Estimate them by this one.
+        downstream_time = downstream_gen_len * self.latency_model.predict_iter_latency(
+            tasks, engine
+        )
+        return cur_time + completion_time + downstream_time
+
+    # override
+    def select_engine(
+        self, tasks: List[CompletionTask], engine_list: List[ExecutionEngine]
+    ) -> ExecutionEngine:
+        ddls = [
+            task.schedule_annotation.ddl_requirement
+            for task in tasks
+            if task.schedule_annotation.has_ddl
+        ]
+        if len(ddls) == 0:
+            return self.base_policy.select_engine(tasks, engine_list)
+
+        ddl = min(ddls)
+        cur_time = time_counter_in_nanoseconds()
+        prefix_depths_list = self.latency_model.query_prefix_depths_list(tasks)
+        finish_times = {
+            engine.engine_id: self.predict_finish_time(
+                tasks, engine, prefix_depths_list, cur_time
+            )
+            for engine in engine_list
+        }
+
+        feasible_engines = [
+            engine for engine in engine_list if finish_times[engine.engine_id] <= ddl
+        ]
+        if len(feasible_engines) > 0:
+            return self.base_policy.select_engine(tasks, feasible_engines)
+
+        return min(engine_list, key=lambda engine: finish_times[engine.engine_id])
+
+
+PLACEMENT_POLICIES = ["heuristic", "latency_model"]
+
+
+def create_placement_policy(
+    policy: str,
+    context_mgr: ServeCoreContextManager,
+    ctx_aware: bool,
+    default_iter_latency: float,
+    prefill_tokens_per_iter: int,
+) -> PlacementPolicy:
+    """Create a placement policy by its name. Deadlines are always respected, see
+    DeadlineAwarePlacement."""
+
+    latency_model = LatencyModelPlacement(
+        context_mgr, ctx_aware, default_iter_latency, prefill_tokens_per_iter
+    )
+
+    if policy == "heuristic":
+        base_policy = HeuristicPlacement(context_mgr, ctx_aware)
+    elif policy == "latency_model":
+        base_policy = latency_model
+    else:
+        raise ParrotCoreInternalError(
+            ValueError(
+                f"Unknown placement policy: {policy}. "
+                f"Supported policies: {PLACEMENT_POLICIES}"
+            )
+        )
+
+    return DeadlineAwarePlacement(base_policy, latency_model)
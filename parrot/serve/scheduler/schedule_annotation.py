@@ -5,6 +5,8 @@
 
 from dataclasses import dataclass
 
+from parrot.constants import DECODE_NO_BATCH_SIZE_LIMIT
+
 
 @dataclass
 class ScheduleAnnotation:
@@ -18,5 +20,22 @@ class ScheduleAnnotation:
     # with more than this number of tokens.
     tokens_num_upperbound: int = 2048
 
-    # Unimplemented
+    # This field means the Fills of this task should be scheduled before other
+    # waiting jobs in the engine.
+    prefill_priority: bool = False
+
+    # This field means the Generate of this task should not be batched with more
+    # than this number of decoding jobs in the engine.
+    decode_batch_size_upperbound: int = DECODE_NO_BATCH_SIZE_LIMIT
+
+    # This field means this task should be finished before this deadline (absolute time
+    # in ns, see time_counter_in_nanoseconds). 0 means no deadline.
     ddl_requirement: float = 0.0
+
+    # The number of tokens generated by the downstream tasks, which must be finished before
+    # the same deadline.
+    ddl_downstream_gen_len: int = 0
+
+    @property
+    def has_ddl(self) -> bool:
+        return self.ddl_requirement > 0
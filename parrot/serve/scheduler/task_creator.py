@@ -33,6 +33,20 @@ class TaskCreator:
                 tasks_num_upperbound=99999,
                 tokens_num_upperbound=9999999999999,
             )
+        elif criteria == PerformanceCriteria.TTFT:
+            # Small batch and prefill first, so the first token comes out quickly.
+            return ScheduleAnnotation(
+                tasks_num_upperbound=4,
+                tokens_num_upperbound=4096,
+                prefill_priority=True,
+            )
+        elif criteria == PerformanceCriteria.TPOT:
+            # Cap the decode batch, so each decoding iteration stays short.
+            return ScheduleAnnotation(
+                tasks_num_upperbound=16,
+                tokens_num_upperbound=16384,
+                decode_batch_size_upperbound=16,
+            )
         else:
             raise NotImplementedError(
                 f"PerformanceCriteria {criteria} is not supported."
@@ -53,6 +67,10 @@ class TaskCreator:
         # Create a new Task
         task_id = self._task_id_pool.allocate()
         schedule_annotation = self._lower_criteria(completion_chain.criteria)
+        schedule_annotation.ddl_requirement = completion_chain.ddl
+        schedule_annotation.ddl_downstream_gen_len = (
+            completion_chain.ddl_downstream_gen_len
+        )
 
         logger.debug(
             f"Create Task(task_id={task_id}) for CompletionChain(request_id={completion_chain.request_id},"
@@ -75,5 +93,6 @@ class TaskCreator:
         self._task_id_pool.free(task.task_id)
 
         # Remove from the engine
-        task.leave_scheduled()
+        if task.is_scheduled:
+            task.leave_scheduled()
         return
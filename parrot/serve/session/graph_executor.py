@@ -1,10 +1,12 @@
 # Copyright (c) 2023 by Microsoft Corporation.
 # Licensed under the MIT license.
 
-from typing import Optional, Dict
+import asyncio
+from typing import Optional, Dict, List
 
+from parrot.constants import PIPELINE_SEND_CHUNK_NUM, TASK_MAX_REDISPATCH_TIMES
 from parrot.utils import get_logger, create_task_in_loop
-from parrot.exceptions import parrot_assert
+from parrot.exceptions import parrot_assert, ParrotCoreUserError
 from parrot.protocol.internal.primitive_request import Primitive, Fill, Generate
 from parrot.protocol.internal.layer_apis import FillResponse, GenerateResponse
 
@@ -12,6 +14,8 @@ from parrot.serve.graph import (
     ComputeGraph,
     RequestChain,
     CompletionChain,
+    BaseNode,
+    SemanticVariable,
 )
 from parrot.serve.scheduler import (
     CompletionTask,
@@ -19,7 +23,7 @@ from parrot.serve.scheduler import (
     GlobalScheduler,
     TaskStatus,
 )
-from parrot.serve.backend_repr import ModelType
+from parrot.serve.backend_repr import ModelType, ExecutionEngine
 
 from ..context_manager import ServeCoreContextManager
 from ..engine_manager import EngineManager
@@ -61,6 +65,7 @@ class GraphExecutor:
     async def _execute_coroutine(self, completion_chain: CompletionChain) -> None:
         """Coroutine for executing a CompletionChain."""
 
+        task: Optional[CompletionTask] = None
         try:
             # Block until it's activated by a GET.
             await completion_chain.wait_activated()
@@ -69,33 +74,115 @@ class GraphExecutor:
             task = self.task_creator.create_task(completion_chain)
 
             # Block until all inputs are ready.
+            # For pipelined inputs, only block until their producers start generating.
             for node in completion_chain.iter_fill():
-                await node.wait_ready()
+                if self._can_pipeline(completion_chain, node):
+                    await node.sv.wait_stream_token_ids(1)
+                elif node is completion_chain.first_node:
+                    await node.wait_ready()
+                else:
+                    # NOTE: The previous Fills are waited in this loop. node.wait_ready()
+                    # would wait for the whole content of a previous pipelined Fill.
+                    await node.sv.wait_ready()
 
             # Tokenize the task.
-            task.tokenize_chain(self.tokenizers_wrapper)
+            await task.atokenize_chain(self.tokenizers_wrapper)
 
             # Submit the task to the scheduler and wait for the task to be scheduled.
             self.scheduler.submit_task(task)
             await task.wait_scheduled()
+        except ParrotCoreUserError as e:
+            # NOTE: User errors (e.g. the deadline can't be met) only fail this
+            # chain. They are passed back to the client through the output SV.
+            logger.warning(
+                f"Chain is rejected by the scheduler. (session_id={self.session_id}): "
+                f"{e.exception}"
+            )
+            completion_chain.gen_node.sv.set_exception(e)
+            if task is not None:
+                self.task_creator.free_task(task)
+            return
         except Exception as e:
             logger.error(
                 f"Error when scheduling chain. (session_id={self.session_id}): {e}"
             )
+            # Wake up the waiters of the output, e.g. streaming Gets and pipelined Fills.
+            completion_chain.gen_node.sv.set_exception(e)
             self.exception_interrupt(e)
             return
 
-        # The task is scheduled. Assign contexts to the task.
-        self.context_mgr.set_task_contexts(task)
+        # Execute the task. If its engine fails, the task is re-dispatched to another engine,
+        # where its contexts (including prefixes) are rebuilt.
+        redispatch_times = 0
+        while True:
+            # The task is scheduled. Assign contexts to the task.
+            self.context_mgr.set_task_contexts(task)
 
-        # Execute the task.
-        await self.execute(task)
+            try:
+                await self.execute(task)
+                break
+            except Exception as e:
+                # NOTE: If a pipelined input fails, re-executing the task fails again.
+                input_failed = any(
+                    [node.sv.exception is e for node in completion_chain.iter_fill()]
+                )
+                if (
+                    redispatch_times >= TASK_MAX_REDISPATCH_TIMES
+                    or not self._can_redispatch(task)
+                    or input_failed
+                ):
+                    completion_chain.gen_node.sv.set_exception(e)
+                    self.exception_interrupt(e)
+                    break
+
+            redispatch_times += 1
+            logger.warning(
+                f"Task (task_id={task.task_id}, session_id={self.session_id}) is re-dispatched, "
+                f"since Engine {task.engine.name} (id={task.engine.engine_id}) fails. "
+                f"(redispatch_times={redispatch_times})"
+            )
+            self.context_mgr.free_task_contexts(task)
+            task.unschedule()
+            try:
+                self.scheduler.submit_task(task)
+                await task.wait_scheduled()
+            except ParrotCoreUserError as e:
+                completion_chain.gen_node.sv.set_exception(e)
+                self.task_creator.free_task(task)
+                return
 
         # Free the task resources.
         # TODO(chaofan): Current implementation has BUGS in stateful generation cases.
         self.task_creator.free_task(task)
         self.context_mgr.free_task_contexts(task)
 
+        # The engine's capacity is released. Trigger scheduling of waiting tasks.
+        self.scheduler.notify_schedule()
+
+    @staticmethod
+    def _can_pipeline(completion_chain: CompletionChain, node: BaseNode) -> bool:
+        """Whether a Fill node can be filled in pipelined mode, i.e. sending its tokens in chunks
+        while its producer is still generating."""
+
+        # NOTE: Fuse Fill merges the tokens of adjacent nodes into one Fill, which
+        # conflicts with pipelining.
+        return (
+            completion_chain.metadata.pipeline_fill
+            and not completion_chain.metadata.fuse_fill
+            and node.sv.is_streaming
+            and not node.sv.is_ready()
+        )
+
+    @staticmethod
+    def _can_redispatch(task: CompletionTask) -> bool:
+        """Whether a failed task can be re-executed in another engine."""
+
+        # NOTE: Streamed tokens may be consumed already. They can't be taken back.
+        return (
+            not task.engine.is_running
+            and len(task.chain.gen_node.sv.stream_token_ids) == 0
+        )
+
     def exception_interrupt(self, exception: BaseException):
         self.bad_exception = exception
 
@@ -109,12 +196,21 @@ class GraphExecutor:
         # Insert the request chain into the graph.
         self.graph.insert_and_update_request_chain(request_chain)
 
+        # Let the producers of inputs stream, so that the Fills can be pipelined.
+        if request_chain.metadata.pipeline_fill and not request_chain.metadata.fuse_fill:
+            for node in request_chain.iter():
+                if not node.is_gen and node.sv.has_producer and not node.sv.is_ready():
+                    node.sv.is_streaming = True
+
         # Create execution coroutines for the request chain.
         for completion_chain in request_chain.comp_chains:
             create_task_in_loop(self._execute_coroutine(completion_chain))
 
     async def execute(self, completion_task: CompletionTask) -> None:
-        """Execute a CompletionTask."""
+        """Execute a CompletionTask.
+
+        If the execution fails, the engine is marked bad and the exception is raised.
+        """
 
         parrot_assert(completion_task.is_scheduled, "Task is not scheduled.")
 
@@ -141,6 +237,13 @@ class GraphExecutor:
             # Wait for the context to be ready if the Context is started.
             if context.start_event.is_set():
                 await context.ready_event.wait()
+                # NOTE: The task filling the context may fail with the engine.
+                if not engine.is_running:
+                    completion_task.status = TaskStatus.ERROR
+                    raise RuntimeError(
+                        f"Engine {engine.name} (id={engine.engine_id}) fails when filling "
+                        f"Context (context_id={context.context_id})."
+                    )
                 continue
 
             # Set the start event to indicate the context is started.
@@ -148,10 +251,13 @@ class GraphExecutor:
 
             try:
                 if node.is_gen:
-                    # TODO(chaofan): Add streaming generation support.
                     if type_token_id_flag:
                         # If not ignore_tokenizer_eos, we should add eos_token_id to stop_token_ids
-                        if not node.sampling_config.ignore_tokenizer_eos:
+                        # It may be added already, if the task is re-dispatched.
+                        if (
+                            not node.sampling_config.ignore_tokenizer_eos
+                            and eos_token_id not in node.sampling_config.stop_token_ids
+                        ):
                             node.sampling_config.stop_token_ids.append(eos_token_id)
 
                     primitive = Generate(
@@ -161,6 +267,7 @@ class GraphExecutor:
                         parent_context_id=context.parent_context_id,
                         end_flag=False,
                         sampling_config=node.sampling_config,
+                        decode_batch_size_upperbound=completion_task.schedule_annotation.decode_batch_size_upperbound,
                     )
 
                     logger.debug(
@@ -168,20 +275,39 @@ class GraphExecutor:
                         f"submit Generate primitive. (sampling_config={node.sampling_config})"
                     )
 
-                    resp = await primitive.apost(engine.http_address)
+                    if type_token_id_flag and node.sv.is_streaming:
+                        # Streaming: consume the engine stream and detokenize incrementally,
+                        # so that the partial content is visible to streaming Gets.
+                        node.sv.stream_tokenizer_name = tokenizer_name
+                        generated_ids = await self._execute_streaming_generate(
+                            primitive, engine, node.sv, tokenizer_name
+                        )
 
-                    if type_token_id_flag:
+                        logger.debug(
+                            f"Task (task_id={completion_task.task_id}, session_id={self.session_id}) "
+                            f"finish streaming Generate primitive. (generated_tokens_num={len(generated_ids)})"
+                        )
+
+                        context.tokens_num = len(generated_ids)
+                        generated_text = await self.tokenizers_wrapper.adetokenize(
+                            token_ids=generated_ids,
+                            tokenizer_name=tokenizer_name,
+                        )
+                    elif type_token_id_flag:
+                        resp = await primitive.apost(engine.http_address)
                         generated_ids = resp.generated_ids
                         logger.debug(
                             f"Task (task_id={completion_task.task_id}, session_id={self.session_id}) "
                             f"receive Generate primitive's result. (generated_tokens_num={len(generated_ids)})"
                         )
 
-                        generated_text = self.tokenizers_wrapper.detokenize(
+                        context.tokens_num = len(generated_ids)
+                        generated_text = await self.tokenizers_wrapper.adetokenize(
                             token_ids=generated_ids,
                             tokenizer_name=tokenizer_name,
                         )
                     else:
+                        resp = await primitive.apost(engine.http_address)
                         generated_text = resp.generated_text
 
                         logger.debug(
@@ -191,6 +317,10 @@ class GraphExecutor:
 
                     # Set the content of the node.
                     node.sv.set(content=generated_text)
+                elif type_token_id_flag and i in completion_task.pipelined_fills:
+                    await self._execute_pipelined_fill(
+                        completion_task, i, node, tokenizer_name
+                    )
                 else:
                     if type_token_id_flag:
                         token_ids = completion_task.tokenized_result[tokenizer_name][
@@ -217,13 +347,16 @@ class GraphExecutor:
                             parent_context_id=context.parent_context_id,
                             end_flag=False,
                             token_ids=token_ids,
+                            prefill_priority=completion_task.schedule_annotation.prefill_priority,
                         )
+                        context.tokens_num = len(token_ids)
                         logger.debug(
                             f"Task (task_id={completion_task.task_id}, session_id={self.session_id}) "
                             f"submit Fill primitive. (tokens_num={len(token_ids)})"
                         )
                         resp = await primitive.apost(engine.http_address)
                     else:
+                        await node.wait_ready()
                         text = node.get()
                         primitive = Fill(
                             session_id=self.session_id,
@@ -232,6 +365,7 @@ class GraphExecutor:
                             parent_context_id=context.parent_context_id,
                             end_flag=False,
                             text=text,
+                            prefill_priority=completion_task.schedule_annotation.prefill_priority,
                         )
                         logger.debug(
                             f"Task (task={completion_task.task_id}, session_id={self.session_id}) "
@@ -247,7 +381,162 @@ class GraphExecutor:
                 logger.error(
                     f"Error when executing node {node}. (session_id={self.session_id}): {e}"
                 )
-                self.engine_mgr.raise_exception(engine_id=engine.engine_id, exception=e)
-                self.exception_interrupt(e)
+                # NOTE: A pipelined Fill fails with its producer. The engine is not to blame.
+                if e is not node.sv.exception:
+                    self.engine_mgr.raise_exception(
+                        engine_id=engine.engine_id, exception=e
+                    )
                 completion_task.status = TaskStatus.ERROR
-                break
+                # Wake up the tasks waiting for the context. They find the engine is bad.
+                context.ready_event.set()
+                raise e
+
+    async def _execute_streaming_generate(
+        self,
+        primitive: Generate,
+        engine: ExecutionEngine,
+        sv: SemanticVariable,
+        tokenizer_name: str,
+    ) -> List[int]:
+        """Run a Generate primitive in streaming mode, and stream the content into the SV.
+
+        Token ids are appended to the SV as soon as they arrive, for pipelined Fills. The text
+        is detokenized incrementally in the tokenizer pool, off the event loop. Tokens arriving
+        while a chunk is being detokenized are detokenized together as the next chunk. So a
+        stream has at most one detokenization job in flight, and each job decodes only the
+        window after the last complete text (see TokenizersWrapper.detokenize_incrementally),
+        not the whole generated sequence.
+
+        Returns:
+            The generated token ids.
+        """
+
+        generated_ids: List[int] = []
+        new_token_event = asyncio.Event()
+        stream_done = False
+
+        async def _receive() -> None:
+            nonlocal stream_done
+            try:
+                async for token_id in primitive.astream(engine.http_address):
+                    generated_ids.append(token_id)
+                    sv.append_stream("", token_id)
+                    new_token_event.set()
+            finally:
+                stream_done = True
+                new_token_event.set()
+
+        receive_task = asyncio.create_task(_receive())
+        try:
+            prefix_offset = 0
+            read_offset = 0
+            detokenized_num = 0  # Number of tokens covered by the last detokenization
+            while True:
+                if detokenized_num == len(generated_ids):
+                    if stream_done:
+                        break
+                    new_token_event.clear()
+                    await new_token_event.wait()
+                    continue
+
+                # NOTE: Pass a window copy. The received list grows during the job.
+                detokenized_num = len(generated_ids)
+                (
+                    new_text,
+                    window_prefix_offset,
+                    window_read_offset,
+                ) = await self.tokenizers_wrapper.adetokenize_incrementally(
+                    token_ids=generated_ids[prefix_offset:detokenized_num],
+                    prefix_offset=0,
+                    read_offset=read_offset - prefix_offset,
+                    tokenizer_name=tokenizer_name,
+                )
+                prefix_offset, read_offset = (
+                    prefix_offset + window_prefix_offset,
+                    prefix_offset + window_read_offset,
+                )
+                sv.append_stream(new_text)
+        finally:
+            if not receive_task.done():
+                receive_task.cancel()
+
+        # Raise the error of the stream, if any.
+        await receive_task
+        return generated_ids
+
+    async def _execute_pipelined_fill(
+        self,
+        completion_task: CompletionTask,
+        index: int,
+        node: BaseNode,
+        tokenizer_name: str,
+    ) -> None:
+        """Fill a context with the content of a SV while its producer is still generating.
+
+        Generated token ids are forwarded to the engine in chunks of PIPELINE_SEND_CHUNK_NUM.
+        If the producer runs with a different tokenizer, its token ids are meaningless here,
+        so we fall back to waiting for the whole content and filling it at once.
+        """
+
+        context = completion_task.contexts[index]
+        sv = node.sv
+
+        if sv.stream_tokenizer_name == tokenizer_name:
+            # NOTE: The stop token (e.g. EOS) is streamed before the producer stops. It's not
+            # part of the content, so it's not filled, the same as the non-pipelined Fill.
+            stop_token_ids = set(sv.get_producer().sampling_config.stop_token_ids)
+            filled_token_ids = []
+            read_num = 0  # Number of streamed token ids read
+            while True:
+                await sv.wait_stream_token_ids(read_num + PIPELINE_SEND_CHUNK_NUM)
+                new_token_ids = sv.stream_token_ids[read_num:]
+                read_num += len(new_token_ids)
+                token_ids = [
+                    token_id
+                    for token_id in new_token_ids
+                    if token_id not in stop_token_ids
+                ]
+                if len(token_ids) > 0:
+                    primitive = Fill(
+                        session_id=self.session_id,
+                        task_id=completion_task.task_id,
+                        context_id=context.context_id,
+                        parent_context_id=context.parent_context_id,
+                        end_flag=False,
+                        token_ids=token_ids,
+                        prefill_priority=completion_task.schedule_annotation.prefill_priority,
+                    )
+                    logger.debug(
+                        f"Task (task_id={completion_task.task_id}, session_id={self.session_id}) "
+                        f"submit pipelined Fill primitive. (tokens_num={len(token_ids)}, "
+                        f"sent_tokens_num={len(filled_token_ids)})"
+                    )
+                    await primitive.apost(context.engine.http_address)
+                    filled_token_ids += token_ids
+
+                if sv.is_ready() and read_num == len(sv.stream_token_ids):
+                    break
+
+            # The SV is also ready if the producer fails. Don't go on with a truncated prompt.
+            await sv.wait_ready()
+            token_ids = filled_token_ids
+        else:
+            await sv.wait_ready()
+            token_ids = await self.tokenizers_wrapper.atokenize_var(sv, tokenizer_name)
+            primitive = Fill(
+                session_id=self.session_id,
+                task_id=completion_task.task_id,
+                context_id=context.context_id,
+                parent_context_id=context.parent_context_id,
+                end_flag=False,
+                token_ids=token_ids,
+                prefill_priority=completion_task.schedule_annotation.prefill_priority,
+            )
+            logger.debug(
+                f"Task (task_id={completion_task.task_id}, session_id={self.session_id}) "
+                f"submit Fill primitive. (tokens_num={len(token_ids)})"
+            )
+            await primitive.apost(context.engine.http_address)
+
+        context.tokens_num = len(token_ids)
+        completion_task.tokenized_result[tokenizer_name][index] = token_ids
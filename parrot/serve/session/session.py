@@ -14,10 +14,13 @@ from parrot.serve.graph import (
     ChunkedSemanticCallRequest,
     RequestChain,
     get_performance_criteria,
+    get_ddl_from_time_budget,
     activate_completion_chain,
 )
+from parrot.serve.graph.request import TextChunk
 
-from parrot.serve.backend_repr import Context
+from parrot.serve.backend_repr import Context, ModelType
+from parrot.serve.backend_repr.model import get_model_type
 from parrot.serve.scheduler import TaskCreator, GlobalScheduler
 
 from ..prefix_matcher import PrefixMatcher
@@ -49,22 +52,29 @@ class Session:
         self,
         session_id: int,
         life_span: int,
-        prefix_matcher: PrefixMatcher,
+        prefix_matcher: Optional[PrefixMatcher],
         task_creator: TaskCreator,
         scheduler: GlobalScheduler,
         var_mgr: SemanticVariableManager,
         engine_mgr: EngineManager,
         context_mgr: ServeCoreContextManager,
         tokenizers_wrapper: TokenizersWrapper,
+        weight: float = 1.0,
+        prefix_token_aligned: bool = True,
     ):
         # ---------- Basic Info ----------
         self.session_id = session_id
         self.life_span = life_span  # In seconds
+        self.weight = weight  # Weight in fair queueing. See GlobalScheduler.
 
         # ---------- Global Components ----------
-        self.prefix_matcher = prefix_matcher
+        self.prefix_matcher = prefix_matcher  # None if prefix matching is disabled
+        self.prefix_token_aligned = prefix_token_aligned
+        self.scheduler = scheduler
         self.var_mgr = var_mgr
+        self.engine_mgr = engine_mgr
         self.context_mgr = context_mgr
+        self.tokenizers_wrapper = tokenizers_wrapper
 
         # ---------- Executor ----------
         self.executor = GraphExecutor(
@@ -88,6 +98,104 @@ class Session:
 
     # ---------- Internal methods ----------
 
+    async def _atokenize_constant(self, text: str, tokenizer_name: str) -> List[int]:
+        # NOTE: If the text is the content of an existing constant-prefix SV, reuse its
+        # cached token ids. Otherwise, don't cache: most candidates never become SVs, and
+        # their entries would push the SVs' entries out of the cache.
+        var = self.var_mgr.find_constant_prefix_var(text)
+        if var is not None and var.is_ready():
+            return await self.tokenizers_wrapper.atokenize_var(var, tokenizer_name)
+        return await self.tokenizers_wrapper.atokenize(text, tokenizer_name)
+
+    async def _query_token_aligned_prefix(self, models: List[str], text: str) -> int:
+        """Add the text to the PrefixMatcher as token ids and query its global prefix.
+
+        The text is tokenized by the tokenizer of a candidate engine, and the length of the
+        global prefix is aligned down to the engine's KV cache block size. Hence when the
+        prefix is split out, the prefix context is filled with exactly the same tokens as in
+        the whole text, and forking from it needs no padding (see BlockContext.pad_to).
+
+        Returns:
+            -1 if the text has no global prefix. Otherwise, the length (in characters) of the
+            aligned global prefix.
+        """
+
+        engines = list(self.engine_mgr.iter_candidate_engines(ModelType.TOKEN_ID, models))
+        if len(engines) == 0:
+            return -1
+
+        # NOTE: Use a deterministic engine, so the same text always goes to the same
+        # namespace. Engines serving the same models usually share the tokenizer.
+        engine = min(engines, key=lambda e: e.engine_id)
+        tokenizer_name = engine.tokenizer_name
+        token_ids = tuple(await self._atokenize_constant(text, tokenizer_name))
+
+        self.prefix_matcher.add_prefix(token_ids, namespace=tokenizer_name)
+        prefix_len = self.prefix_matcher.query_prefix(token_ids, namespace=tokenizer_name)
+        if prefix_len <= 0:
+            return -1
+        # The whole text is the global prefix. It's shared already.
+        if prefix_len == len(token_ids):
+            return len(text)
+
+        block_size = max(engine.config.block_size, 1)
+        prefix_len -= prefix_len % block_size
+        if prefix_len == 0:
+            return -1
+
+        # The split must be at a character position whose left part tokenizes to exactly the
+        # prefix tokens. Otherwise (e.g. a token across the boundary), don't split.
+        prefix_text = await self.tokenizers_wrapper.adetokenize(
+            list(token_ids[:prefix_len]), tokenizer_name
+        )
+        if not text.startswith(prefix_text) or tuple(
+            await self._atokenize_constant(prefix_text, tokenizer_name)
+        ) != token_ids[:prefix_len]:
+            return -1
+
+        return len(prefix_text)
+
+    async def _split_global_prefix(
+        self, chunked_request: ChunkedSemanticCallRequest
+    ) -> None:
+        """Split the first text chunk of the request at the end of its global prefix.
+
+        Requests whose first text chunks share a long common prefix (e.g. the same few-shot
+        examples followed by different questions) are detected by the PrefixMatcher. After
+        splitting, the shared part becomes a separate constant-prefix SV, so its context is
+        cached and shared across requests.
+        """
+
+        if self.prefix_matcher is None or not chunked_request.metadata.cache_prefix:
+            return
+
+        if len(chunked_request.body) == 0 or not isinstance(
+            chunked_request.body[0], TextChunk
+        ):
+            return
+
+        metadata = chunked_request.metadata
+        prefix_text = chunked_request.body[0].text
+        if (
+            self.prefix_token_aligned
+            and get_model_type(metadata.model_type) == ModelType.TOKEN_ID
+        ):
+            split_pos = await self._query_token_aligned_prefix(
+                metadata.models, prefix_text
+            )
+        else:
+            self.prefix_matcher.add_prefix(prefix_text)
+            split_pos = self.prefix_matcher.query_prefix(prefix_text)
+
+        # NOTE: If the whole chunk is the global prefix, it's shared already.
+        if 0 < split_pos < len(prefix_text):
+            chunked_request.split_prefix_chunk(split_pos)
+            logger.debug(
+                f"Request (request_id={chunked_request.request_id}) in "
+                f"Session (session_id={self.session_id}) splits the global prefix "
+                f"at position {split_pos}."
+            )
+
     # ---------- Status Methods ----------
 
     @property
@@ -96,7 +204,7 @@ class Session:
 
     # ---------- Interfaces to ServeCore ----------
 
-    def add_request(self, request_payload: Dict) -> (int, List):
+    async def add_request(self, request_payload: Dict) -> (int, List):
         """Add a request to the session and assign a coroutine to the request.
 
         Args:
@@ -119,6 +227,13 @@ class Session:
         )
 
         # Prefix matching and splitting.
+        await self._split_global_prefix(chunked_request)
+
+        # NOTE: The session may be swept while the prefix is being tokenized.
+        if not self.is_running:
+            raise ParrotCoreUserError(
+                RuntimeError(f"Session (session_id={self.session_id}) is not valid.")
+            )
 
         # Convert the ChunkedRequest to a RequestChain.
         request_chain = RequestChain.from_chunked_request(chunked_request)
@@ -136,7 +251,8 @@ class Session:
             criteria = chunked_request.metadata.output_criteria
             if isinstance(criteria, str):
                 criteria = get_performance_criteria(criteria)
-            activate_completion_chain(request_chain.comp_chains[-1], criteria)
+            ddl = get_ddl_from_time_budget(chunked_request.metadata.output_ddl)
+            activate_completion_chain(request_chain.comp_chains[-1], criteria, ddl)
 
         # It must be inserted. So we can get the mapping.
         placeholders_mapping = request_chain.get_placeholders_mapping()
@@ -182,6 +298,7 @@ class Session:
     def _register_session_resources(self) -> None:
         self.context_mgr.register_session_contexts(session_id=self.session_id)
         self.var_mgr.register_local_var_space(session_id=self.session_id)
+        self.scheduler.register_session(session_id=self.session_id, weight=self.weight)
 
     def free_session_resources(self) -> None:
         """Free the session and all its resources."""
@@ -190,7 +307,12 @@ class Session:
         self.context_mgr.free_session_contexts(session_id=self.session_id)
 
         # Free the local var space of the session.
-        self.var_mgr.free_local_var_space(session_id=self.session_id)
+        freed_vars = self.var_mgr.free_local_var_space(session_id=self.session_id)
+        for var in freed_vars:
+            self.tokenizers_wrapper.invalidate_var(var.id)
+
+        # Free the scheduling states of the session.
+        self.scheduler.free_session(session_id=self.session_id)
 
         logger.info(
             f"Free Session(session_id={self.session_id}) with running tasks num: {0}"
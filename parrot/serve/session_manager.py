@@ -46,16 +46,26 @@ class SessionManager:
 
     # ---------- Methods for Core ----------
 
-    def register_session(self) -> int:
+    def register_session(self, weight: float = 1.0) -> int:
         """Create a new session.
 
+        Args:
+            weight: float. The weight of the session in fair queueing.
+
         Returns:
             int: The session ID.
         """
 
+        if weight <= 0:
+            raise ParrotCoreUserError(
+                ValueError(f"Session weight must be positive. Got: {weight}")
+            )
+
         # Create session object
         session_id = self._session_id_pool.allocate()
-        session = Session(session_id=session_id, **self._session_create_kwargs)
+        session = Session(
+            session_id=session_id, weight=weight, **self._session_create_kwargs
+        )
 
         # Maintain session info
         self.sessions[session_id] = session
@@ -2,10 +2,16 @@
 # Licensed under the MIT license.
 
 
-from typing import Dict, List, Union
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 from transformers import AutoTokenizer, PreTrainedTokenizer, PreTrainedTokenizerFast
 
 from parrot.exceptions import parrot_assert
+from parrot.constants import TOKENIZATION_CACHE_MAX_TOKENS, TOKENIZATION_POOL_SIZE
+
+from parrot.serve.graph.semantic_variable import SemanticVariable
 
 
 HFTokenizer = Union[PreTrainedTokenizer, PreTrainedTokenizerFast]
@@ -16,12 +22,45 @@ class TokenizersWrapper:
 
     Different engines in OS may use different tokenizers, which are stored as a
     dictionary in this manager.
+
+    The token ids of Semantic Variables are cached by (var_id, tokenizer_name), since the
+    same constants (e.g. system prompts, few-shot examples) are filled again and again. The
+    content of a SV never changes once it's ready, so a cached entry is valid until the SV is
+    freed, and the owner of the SV must invalidate it then. The cache is LRU and stores at
+    most cache_max_tokens token ids.
+
+    The async methods (atokenize, adetokenize, ...) run the tokenizers in a pool of pool_size
+    threads, so that long texts don't block the event loop. Texts submitted in the same loop
+    iteration are batched into one call per tokenizer. If pool_size is 0, they run inline.
     """
 
-    def __init__(self):
+    def __init__(
+        self,
+        cache_max_tokens: int = TOKENIZATION_CACHE_MAX_TOKENS,
+        pool_size: int = TOKENIZATION_POOL_SIZE,
+    ):
         # Map from tokenizer name to tokenizer object
         self.tokenizers: Dict[str, HFTokenizer] = {}
 
+        # ---------- Worker Pool ----------
+        # NOTE: Fast tokenizers only mutate their states when the truncation/padding
+        # settings change, and we always use the same settings. So they can be shared among
+        # threads.
+        self.pool_size = pool_size
+        self._pool: Optional[ThreadPoolExecutor] = None  # Created on the first use.
+        # (batch function, tokenizer_name) -> pending (input, future) pairs
+        self._pending_jobs: Dict[Tuple[Callable, str], List] = {}
+
+        # (var_id, tokenizer_name) -> token ids, in LRU order.
+        # NOTE: Cached token ids are shared. Don't modify them in place.
+        self._cache: OrderedDict[Tuple[str, str], List[int]] = OrderedDict()
+        self._cache_max_tokens = cache_max_tokens
+        self._cached_tokens_num = 0
+
+        # Stats
+        self.cache_hits_num = 0
+        self.cache_misses_num = 0
+
     def register_tokenizer(self, tokenizer_name: str):
         """Register a new tokenizer in the server."""
 
@@ -39,6 +78,9 @@ class TokenizersWrapper:
         )
         self.tokenizers.pop(tokenizer_name)
 
+        for key in [key for key in self._cache if key[1] == tokenizer_name]:
+            self._pop_cache(key)
+
     def get_tokenizer(self, tokenizer_name: str):
         parrot_assert(
             tokenizer_name in self.tokenizers,
@@ -55,6 +97,12 @@ class TokenizersWrapper:
         tokenizer = self.get_tokenizer(tokenizer_name)
         return tokenizer.encode(text, add_special_tokens=False)
 
+    def tokenize_batch(self, texts: List[str], tokenizer_name: str) -> List[List[int]]:
+        """Tokenize a batch of texts using a specific tokenizer."""
+
+        tokenizer = self.get_tokenizer(tokenizer_name)
+        return tokenizer(texts, add_special_tokens=False)["input_ids"]
+
     def tokenize_all(self, text: str) -> Dict[str, List[int]]:
         """Tokenize a text using all tokenizers.
 
@@ -67,6 +115,74 @@ class TokenizersWrapper:
             result[tokenizer_name] = self.tokenize(text, tokenizer_name)
         return result
 
+    # ---------- Tokenization Cache ----------
+
+    @property
+    def cached_tokens_num(self) -> int:
+        """The number of token ids stored in the tokenization cache."""
+
+        return self._cached_tokens_num
+
+    def _pop_cache(self, key: Tuple[str, str]) -> None:
+        token_ids = self._cache.pop(key, None)
+        if token_ids is not None:
+            self._cached_tokens_num -= len(token_ids)
+
+    def _get_cache(self, key: Tuple[str, str]) -> Optional[List[int]]:
+        token_ids = self._cache.get(key)
+        if token_ids is not None:
+            self._cache.move_to_end(key)
+            self.cache_hits_num += 1
+        else:
+            self.cache_misses_num += 1
+        return token_ids
+
+    def _put_cache(self, key: Tuple[str, str], token_ids: List[int]) -> None:
+        # Too large to be cached.
+        if len(token_ids) > self._cache_max_tokens:
+            return
+
+        # It may be tokenized concurrently.
+        self._pop_cache(key)
+
+        self._cache[key] = token_ids
+        self._cached_tokens_num += len(token_ids)
+        while self._cached_tokens_num > self._cache_max_tokens:
+            _, evicted_token_ids = self._cache.popitem(last=False)
+            self._cached_tokens_num -= len(evicted_token_ids)
+
+    def tokenize_var(self, sv: SemanticVariable, tokenizer_name: str) -> List[int]:
+        """Tokenize the content of a ready SV using a specific tokenizer, with the cache.
+
+        Returns:
+            The token ids. They are shared with the cache and must not be modified.
+        """
+
+        key = (sv.id, tokenizer_name)
+        token_ids = self._get_cache(key)
+        if token_ids is None:
+            token_ids = self.tokenize(sv.get(), tokenizer_name)
+            self._put_cache(key, token_ids)
+        return token_ids
+
+    def tokenize_var_all(self, sv: SemanticVariable) -> Dict[str, List[int]]:
+        """Tokenize the content of a ready SV using all tokenizers, with the cache.
+
+        Returns:
+            A dictionary from tokenizer name to token ids.
+        """
+
+        result = {}
+        for tokenizer_name in self.tokenizers:
+            result[tokenizer_name] = self.tokenize_var(sv, tokenizer_name)
+        return result
+
+    def invalidate_var(self, var_id: str) -> None:
+        """Remove the cached token ids of a SV. Called when the SV is freed."""
+
+        for tokenizer_name in self.tokenizers:
+            self._pop_cache((var_id, tokenizer_name))
+
     def detokenize(
         self,
         token_ids: List[int],
@@ -79,3 +195,191 @@ class TokenizersWrapper:
             spaces_between_special_tokens=False,
             clean_up_tokenization_spaces=False,
         )
+
+    def detokenize_batch(
+        self,
+        token_ids_list: List[List[int]],
+        tokenizer_name: str,
+    ) -> List[str]:
+        """Detokenize a batch of token ids using a specific tokenizer."""
+
+        return [
+            self.detokenize(token_ids, tokenizer_name) for token_ids in token_ids_list
+        ]
+
+    def detokenize_incrementally_batch(
+        self,
+        jobs: List[Tuple[List[int], int, int]],
+        tokenizer_name: str,
+    ) -> List[Tuple[str, int, int]]:
+        """Detokenize a batch of streams incrementally. Each job is
+        (token_ids, prefix_offset, read_offset). See detokenize_incrementally."""
+
+        return [
+            self.detokenize_incrementally(
+                token_ids, prefix_offset, read_offset, tokenizer_name
+            )
+            for token_ids, prefix_offset, read_offset in jobs
+        ]
+
+    def detokenize_incrementally(
+        self,
+        token_ids: List[int],
+        prefix_offset: int,
+        read_offset: int,
+        tokenizer_name: str,
+    ) -> Tuple[str, int, int]:
+        """Detokenize the newly generated tokens in a stream, without decoding the whole
+        sequence every time.
+
+        Some tokenizers (e.g. SentencePiece) decide the leading space / merged bytes of a token
+        by its previous tokens. So we decode a small window token_ids[prefix_offset:], and take
+        the text after the already-read part token_ids[prefix_offset:read_offset].
+
+        Args:
+            token_ids: All generated token ids so far.
+            prefix_offset: Start of the decoding window.
+            read_offset: End of the tokens whose text has been returned.
+            tokenizer_name: The tokenizer.
+
+        Returns:
+            (new_text, new_prefix_offset, new_read_offset). new_text is empty if the new tokens
+            do not form complete characters yet.
+        """
+
+        prefix_text = self.detokenize(token_ids[prefix_offset:read_offset], tokenizer_name)
+        new_text = self.detokenize(token_ids[prefix_offset:], tokenizer_name)
+
+        # Hold back incomplete UTF-8 characters (decoded as U+FFFD).
+        if len(new_text) > len(prefix_text) and not new_text.endswith("\ufffd"):
+            return new_text[len(prefix_text) :], read_offset, len(token_ids)
+
+        return "", prefix_offset, read_offset
+
+    # ---------- Off-loop (Async) Methods ----------
+
+    def _flush_pending_jobs(self, job_key: Tuple[Callable, str]) -> None:
+        """Run the pending jobs of a batch function and a tokenizer as one batch in the pool."""
+
+        jobs = self._pending_jobs.pop(job_key, None)
+        if jobs is None:  # Cancelled by close()
+            return
+        batch_func, tokenizer_name = job_key
+
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(
+                max_workers=self.pool_size, thread_name_prefix="ParrotTokenizer"
+            )
+
+        batch_future = asyncio.get_running_loop().run_in_executor(
+            self._pool, batch_func, [job[0] for job in jobs], tokenizer_name
+        )
+
+        def _done_callback(batch_future: asyncio.Future) -> None:
+            # NOTE: The batch is cancelled if the pool is shut down before it runs.
+            # exception() raises CancelledError in this case.
+            if batch_future.cancelled():
+                for _, future in jobs:
+                    future.cancel()
+                return
+
+            exception = batch_future.exception()
+            for i, (_, future) in enumerate(jobs):
+                if future.done():  # Cancelled
+                    continue
+                if exception is not None:
+                    future.set_exception(exception)
+                else:
+                    future.set_result(batch_future.result()[i])
+
+        batch_future.add_done_callback(_done_callback)
+
+    async def _submit_job(
+        self, batch_func: Callable, job_input: Any, tokenizer_name: str
+    ) -> Any:
+        if self.pool_size <= 0:
+            return batch_func([job_input], tokenizer_name)[0]
+
+        # Check the tokenizer here, so that the error is raised in the caller.
+        self.get_tokenizer(tokenizer_name)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        job_key = (batch_func, tokenizer_name)
+        if job_key not in self._pending_jobs:
+            self._pending_jobs[job_key] = []
+            # Flush after the other coroutines in this loop iteration submit their jobs.
+            loop.call_soon(self._flush_pending_jobs, job_key)
+        self._pending_jobs[job_key].append((job_input, future))
+        return await future
+
+    async def atokenize(self, text: str, tokenizer_name: str) -> List[int]:
+        """Tokenize a text using a specific tokenizer, in the worker pool."""
+
+        return await self._submit_job(self.tokenize_batch, text, tokenizer_name)
+
+    async def atokenize_var(
+        self, sv: SemanticVariable, tokenizer_name: str
+    ) -> List[int]:
+        """Tokenize the content of a ready SV using a specific tokenizer, with the cache.
+        Cache misses are tokenized in the worker pool.
+
+        Returns:
+            The token ids. They are shared with the cache and must not be modified.
+        """
+
+        key = (sv.id, tokenizer_name)
+        token_ids = self._get_cache(key)
+        if token_ids is None:
+            token_ids = await self.atokenize(sv.get(), tokenizer_name)
+            self._put_cache(key, token_ids)
+        return token_ids
+
+    async def atokenize_var_all(self, sv: SemanticVariable) -> Dict[str, List[int]]:
+        """Tokenize the content of a ready SV using all tokenizers, with the cache.
+
+        Returns:
+            A dictionary from tokenizer name to token ids.
+        """
+
+        tokenizer_names = list(self.tokenizers)
+        token_ids_list = await asyncio.gather(
+            *[self.atokenize_var(sv, tokenizer_name) for tokenizer_name in tokenizer_names]
+        )
+        return dict(zip(tokenizer_names, token_ids_list))
+
+    async def adetokenize(self, token_ids: List[int], tokenizer_name: str) -> str:
+        """Detokenize token ids using a specific tokenizer, in the worker pool."""
+
+        return await self._submit_job(self.detokenize_batch, token_ids, tokenizer_name)
+
+    async def adetokenize_incrementally(
+        self,
+        token_ids: List[int],
+        prefix_offset: int,
+        read_offset: int,
+        tokenizer_name: str,
+    ) -> Tuple[str, int, int]:
+        """Detokenize the newly generated tokens in a stream, in the worker pool. Jobs of
+        concurrent streams are batched. See detokenize_incrementally.
+
+        NOTE: token_ids must not be modified until the job is done.
+        """
+
+        return await self._submit_job(
+            self.detokenize_incrementally_batch,
+            (token_ids, prefix_offset, read_offset),
+            tokenizer_name,
+        )
+
+    def close(self) -> None:
+        """Shut down the worker pool. Pending and queued jobs are cancelled."""
+
+        for jobs in self._pending_jobs.values():
+            for _, future in jobs:
+                future.cancel()
+        self._pending_jobs.clear()
+
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -162,6 +162,11 @@ class SemanticVariableManager:
         )
         return pc_var
 
+    def find_constant_prefix_var(self, content: str) -> Optional[SemanticVariable]:
+        """Find the prefix-constant variable of the content, without creating it."""
+
+        return self.constant_prefix_namespace.get_var_by_content(content)
+
     def _get_local_var_by_content(
         self, session_id: int, content: str
     ) -> SemanticVariable:
@@ -196,15 +201,20 @@ class SemanticVariableManager:
 
         self.session_namespaces[session_id] = SemanticVariableNamespace()
 
-    def free_local_var_space(self, session_id: int) -> None:
-        """Free a local namespace."""
+    def free_local_var_space(self, session_id: int) -> List[SemanticVariable]:
+        """Free a local namespace.
+
+        Returns:
+            List[SemanticVariable]: The list of freed variables.
+        """
 
         parrot_assert(
             session_id in self.session_namespaces,
             "Session ID does not exist.",
         )
 
-        self.session_namespaces.pop(session_id)
+        namespace = self.session_namespaces.pop(session_id)
+        return list(namespace.vars.values())
 
     def free_expired_constant_prefix_vars(self) -> List[SemanticVariable]:
         """Free expired constant prefix variables.
@@ -67,22 +67,25 @@ def fake_core_server():
     time.sleep(0.1)
 
 
-def _launch_fake_engine():
+def _launch_fake_engine(port: int):
     uvicorn.run(
         FakeEngineApp,
         host=DEFAULT_SERVER_HOST,
-        port=DEFAULT_ENGINE_SERVER_PORT,
+        port=port,
         log_level="info",
     )
 
 
 @contextlib.contextmanager
-def fake_engine_server():
-    p = StdProcess(target=_launch_fake_engine, daemon=True)
+def fake_engine_server(port: int = DEFAULT_ENGINE_SERVER_PORT):
+    """Launch a fake engine server. It yields the server process, so that tests can kill
+    it to inject faults."""
+
+    p = StdProcess(target=_launch_fake_engine, args=(port,), daemon=True)
     p.start()
     time.sleep(0.1)
 
-    yield
+    yield p
 
     p.terminate()
     time.sleep(0.1)
@@ -0,0 +1,741 @@
+# Copyright (c) 2023 by Microsoft Corporation.
+# Licensed under the MIT license.
+
+
+"""An offline discrete-event simulator of the Serve layer.
+
+It drives the real ParrotServeCore (sessions, GlobalScheduler, ServeCoreContextManager, ...)
+through its public APIs, while engines are simulated in-process with a latency model instead
+of HTTP servers. Time is virtual: the event loop jumps to the next timer instead of sleeping,
+so a trace of hours is replayed in seconds, without GPUs.
+
+Usage:
+    python -m parrot.testing.serve_simulator --trace trace.jsonl --engines_num 2
+
+Each line of the trace is a JSON object (a semantic call):
+    - arrival_time: float. Arrival time in seconds. If missing, arrivals are a Poisson
+      process with --request_rate.
+    - session_id: Any. Calls with the same session_id are in the same session. Default: 0.
+    - prefix: str. A prompt prefix, shared by calls with the same prefix. Default: "".
+    - prompt: str. The rest of the prompt. If missing, "body" or "text" is used, so a
+      JSONL file of documents (e.g. a backlog of requests) can be replayed as well.
+    - output_len: int. The number of generated tokens. Default: --output_len.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import selectors
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Any, AsyncGenerator, Dict, List, Optional
+
+import numpy as np
+
+import parrot.serve.scheduler  # Import first to avoid circular import.
+from parrot.constants import NONE_CONTEXT_ID
+from parrot.engine.config import EngineConfig
+from parrot.protocol.base_response import BaseResponse
+from parrot.protocol.internal import layer_apis, primitive_request
+from parrot.protocol.internal.runtime_info import EngineRuntimeInfo
+from parrot.serve.core import ParrotServeCore
+from parrot.utils import get_logger
+
+
+logger = get_logger("Serve Simulator")
+
+
+SIM_TOKENIZER_NAME = "sim-tokenizer"
+SIM_MODEL_NAME = "sim-model"
+SIM_ENGINE_HOST = "sim-engine"
+SIM_HEARTBEAT_INTERVAL = 0.5  # s
+SIM_RECENT_ITERS_NUM = 10
+
+
+# ---------- Virtual Time ----------
+
+
+class _VirtualClockSelector(selectors.DefaultSelector):
+    """A selector which never blocks. Instead, it advances the virtual clock by the timeout,
+    i.e. to the time of the next scheduled callback."""
+
+    def __init__(self):
+        super().__init__()
+        self.time = 0.0
+
+    def select(self, timeout: Optional[float] = None):
+        events = super().select(0)
+        if len(events) > 0:
+            return events
+        if timeout is None:
+            raise RuntimeError("Simulation is stuck: no pending events.")
+        self.time += timeout
+        return events
+
+
+class VirtualClockEventLoop(asyncio.SelectorEventLoop):
+    """An event loop running in virtual time (in seconds, starting from 0)."""
+
+    def __init__(self):
+        super().__init__(selector=_VirtualClockSelector())
+
+    def time(self) -> float:
+        return self._selector.time
+
+
+# ---------- Simulated Engine ----------
+
+
+@dataclass
+class SimLatencyModel:
+    """Latency model of an engine iteration (in seconds):
+
+    iter_latency = base + per_seq * batch_size + per_prefill_token * prefill_tokens
+
+    where batch_size counts both the Fills and the decoding sequences in the iteration.
+    """
+
+    base: float = 0.010
+    per_seq: float = 0.0002
+    per_prefill_token: float = 0.00005
+
+
+class SimTokenizer:
+    """A whitespace tokenizer, in place of HuggingFace tokenizers."""
+
+    eos_token_id = 0
+
+    def __init__(self):
+        self._vocab: Dict[str, int] = {}
+        self._words: List[str] = ["</s>"]
+
+    def encode(self, text: str, add_special_tokens: bool = False) -> List[int]:
+        token_ids = []
+        for word in text.split():
+            if word not in self._vocab:
+                self._vocab[word] = len(self._words)
+                self._words.append(word)
+            token_ids.append(self._vocab[word])
+        return token_ids
+
+    def __call__(self, texts: List[str], add_special_tokens: bool = False) -> Dict:
+        return {"input_ids": [self.encode(text) for text in texts]}
+
+    def decode(self, token_ids: List[int], **kwargs) -> str:
+        return " ".join(
+            [self._words[i] if i < len(self._words) else "x" for i in token_ids]
+        )
+
+
+@dataclass
+class _SimJob:
+    context_id: int
+    fill_tokens_num: int = 0  # Fill
+    remain_tokens_num: int = 0  # Generate
+    generated_ids: List[int] = field(default_factory=list)
+    stream_queue: Optional[asyncio.Queue] = None
+    done: Optional[asyncio.Future] = None
+
+
+class SimEngine:
+    """A simulated engine with iteration-level (continuous) batching.
+
+    It serves the same APIs as the fake engine server (fake_engine_server.py), but in-process:
+    Fills are prefilled in one iteration, and Generates decode one token per iteration.
+
+    Like BlockContext, when a context forks from a parent context for the first time, the
+    parent is padded to a multiple of block_size.
+    """
+
+    def __init__(self, engine_config: EngineConfig, latency_model: SimLatencyModel):
+        self.engine_config = engine_config
+        self.latency_model = latency_model
+
+        self.context_len_map: Dict[int, int] = {}  # context_id -> context_length
+        self.padded_context_ids = set()
+        self.waiting: List[_SimJob] = []
+        self.running: List[_SimJob] = []
+        self.recent_latencies: List[float] = []
+        self._job_event = asyncio.Event()
+
+        # Stats
+        self.filled_tokens_num = 0
+        self.generated_tokens_num = 0
+        self.padded_slots_num = 0
+        self.iters_num = 0
+
+    @property
+    def http_address(self) -> str:
+        return f"http://{self.engine_config.host}:{self.engine_config.port}"
+
+    @property
+    def runtime_info(self) -> EngineRuntimeInfo:
+        recent = self.recent_latencies[-SIM_RECENT_ITERS_NUM:]
+        return EngineRuntimeInfo(
+            num_cached_tokens=sum(self.context_len_map.values()),
+            num_running_jobs=len(self.running),
+            num_total_jobs=len(self.running) + len(self.waiting),
+            recent_average_latency=sum(recent) / len(recent) * 1e9 if recent else 0,
+        )
+
+    def _fork_context(self, payload: Dict) -> None:
+        parent_context_id = payload["parent_context_id"]
+        if (
+            parent_context_id == NONE_CONTEXT_ID
+            or parent_context_id in self.padded_context_ids
+        ):
+            return
+
+        parent_len = self.context_len_map.get(parent_context_id, 0)
+        padded_len = -parent_len % self.engine_config.block_size
+        self.context_len_map[parent_context_id] = parent_len + padded_len
+        self.padded_slots_num += padded_len
+        self.padded_context_ids.add(parent_context_id)
+
+    def _add_job(self, job: _SimJob) -> None:
+        job.done = asyncio.get_running_loop().create_future()
+        self.waiting.append(job)
+        self._job_event.set()
+
+    async def engine_loop(self) -> None:
+        while True:
+            if len(self.waiting) == 0 and len(self.running) == 0:
+                self._job_event.clear()
+                await self._job_event.wait()
+
+            new_jobs = self.waiting
+            self.waiting = []
+            prefill_tokens_num = sum([job.fill_tokens_num for job in new_jobs])
+            batch_size = len(new_jobs) + len(self.running)
+
+            latency = (
+                self.latency_model.base
+                + self.latency_model.per_seq * batch_size
+                + self.latency_model.per_prefill_token * prefill_tokens_num
+            )
+            await asyncio.sleep(latency)
+            self.recent_latencies.append(latency)
+            self.iters_num += 1
+
+            running = []
+            for job in self.running + new_jobs:
+                if job.remain_tokens_num == 0:  # Fill
+                    self.context_len_map[job.context_id] = (
+                        self.context_len_map.get(job.context_id, 0)
+                        + job.fill_tokens_num
+                    )
+                    self.filled_tokens_num += job.fill_tokens_num
+                    job.done.set_result(None)
+                    continue
+
+                # Decode one token.
+                token_id = 1
+                job.generated_ids.append(token_id)
+                job.remain_tokens_num -= 1
+                self.context_len_map[job.context_id] = (
+                    self.context_len_map.get(job.context_id, 0) + 1
+                )
+                self.generated_tokens_num += 1
+                if job.stream_queue is not None:
+                    job.stream_queue.put_nowait(token_id)
+
+                if job.remain_tokens_num == 0:
+                    if job.stream_queue is not None:
+                        job.stream_queue.put_nowait(None)
+                    job.done.set_result(None)
+                else:
+                    running.append(job)
+            self.running = running
+
+    async def fill(self, payload: Dict) -> Dict:
+        if payload["token_ids"] is not None:
+            length = len(payload["token_ids"])
+        else:
+            length = len(payload["text"].split())
+
+        self._fork_context(payload)
+        job = _SimJob(context_id=payload["context_id"], fill_tokens_num=length)
+        self._add_job(job)
+        await job.done
+        return {"filled_len": length}
+
+    def _create_generate_job(self, payload: Dict) -> _SimJob:
+        # The generation length is controlled by max_gen_length.
+        gen_len = max(payload["sampling_config"]["max_gen_length"], 1)
+        self._fork_context(payload)
+        return _SimJob(context_id=payload["context_id"], remain_tokens_num=gen_len)
+
+    async def generate(self, payload: Dict) -> Dict:
+        job = self._create_generate_job(payload)
+        self._add_job(job)
+        await job.done
+        return {
+            "generated_text": " ".join(["x"] * len(job.generated_ids)),
+            "generated_ids": job.generated_ids,
+        }
+
+    async def generate_stream(self, payload: Dict) -> AsyncGenerator[int, None]:
+        job = self._create_generate_job(payload)
+        job.stream_queue = asyncio.Queue()
+        self._add_job(job)
+        while True:
+            token_id = await job.stream_queue.get()
+            if token_id is None:
+                break
+            yield token_id
+
+    async def free_contexts(self, payload: Dict) -> Dict:
+        context_lens = [
+            self.context_len_map.pop(context_id, 0)
+            for context_id in payload["context_ids"]
+        ]
+        self.padded_context_ids.difference_update(payload["context_ids"])
+        return {"context_lens": context_lens}
+
+
+@contextmanager
+def simulated_transport(sim_engines: Dict[str, SimEngine]):
+    """Route the requests from ServeCore to engines (by http address) to simulated engines,
+    instead of sending them over HTTP."""
+
+    async def async_send_http_request(
+        client_session: Any,
+        response_cls: BaseResponse,
+        http_addr: str,
+        api_url: str,
+        timeout=None,
+        method: str = "POST",
+        **kwargs,
+    ) -> BaseResponse:
+        sim_engine = sim_engines[http_addr]
+        handler = getattr(sim_engine, api_url.strip("/"))
+        return response_cls(**(await handler(kwargs)))
+
+    async def async_send_http_request_streaming(
+        client_session: Any,
+        http_addr: str,
+        api_url: str,
+        **kwargs,
+    ) -> AsyncGenerator[int, None]:
+        sim_engine = sim_engines[http_addr]
+        async for token_id in sim_engine.generate_stream(kwargs):
+            yield token_id
+
+    patches = [
+        (primitive_request, "get_client_session", lambda http_addr: None),
+        (primitive_request, "async_send_http_request", async_send_http_request),
+        (
+            primitive_request,
+            "async_send_http_request_streaming",
+            async_send_http_request_streaming,
+        ),
+        (layer_apis, "get_client_session", lambda http_addr: None),
+        (layer_apis, "async_send_http_request", async_send_http_request),
+    ]
+    originals = [(module, name, getattr(module, name)) for module, name, _ in patches]
+    for module, name, func in patches:
+        setattr(module, name, func)
+    try:
+        yield
+    finally:
+        for module, name, func in originals:
+            setattr(module, name, func)
+
+
+# ---------- Trace ----------
+
+
+@dataclass
+class TraceRequest:
+    arrival_time: float
+    session_id: Any
+    prefix: str
+    prompt: str
+    output_len: int
+
+
+def load_trace(
+    trace_path: str,
+    request_rate: float = 1.0,
+    output_len: int = 128,
+    seed: int = 0,
+) -> List[TraceRequest]:
+    """Load a JSONL trace. See the module docstring for the format.
+
+    Args:
+        trace_path: str. The path of the trace.
+        request_rate: float. Requests per second, for requests without arrival_time.
+        output_len: int. Default number of generated tokens.
+        seed: int. Random seed of arrivals.
+
+    Returns:
+        List[TraceRequest]. Requests sorted by arrival time.
+    """
+
+    rng = random.Random(seed)
+    trace = []
+    cur_time = 0.0
+
+    with open(trace_path) as f:
+        for line in f:
+            if line.strip() == "":
+                continue
+            record = json.loads(line)
+
+            if "arrival_time" in record:
+                arrival_time = float(record["arrival_time"])
+            else:
+                cur_time += rng.expovariate(request_rate)
+                arrival_time = cur_time
+
+            prompt = record.get("prompt", record.get("body", record.get("text", "")))
+            trace.append(
+                TraceRequest(
+                    arrival_time=arrival_time,
+                    session_id=record.get("session_id", 0),
+                    prefix=record.get("prefix", ""),
+                    prompt=prompt,
+                    output_len=int(record.get("output_len", output_len)),
+                )
+            )
+
+    trace.sort(key=lambda request: request.arrival_time)
+    return trace
+
+
+# ---------- Simulator ----------
+
+
+@dataclass
+class SimulationResult:
+    requests_num: int
+    makespan: float  # s
+    jcts: np.ndarray  # s, in the order of the trace
+    prompt_tokens_num: int
+    filled_tokens_num: int
+    generated_tokens_num: int
+    padded_slots_num: int  # KV cache slots padded when forking from parent contexts
+
+    @property
+    def throughput(self) -> float:
+        """Requests per second."""
+
+        return self.requests_num / self.makespan if self.makespan > 0 else 0.0
+
+    @property
+    def prefix_hit_rate(self) -> float:
+        """Fraction of prompt tokens not filled in engines, i.e. served by shared prefixes."""
+
+        if self.prompt_tokens_num == 0:
+            return 0.0
+        return 1.0 - self.filled_tokens_num / self.prompt_tokens_num
+
+    def summary(self) -> str:
+        return (
+            f"throughput {self.throughput:.2f} req/s, "
+            f"{self.generated_tokens_num / self.makespan:.1f} tokens/s; "
+            f"JCT mean {self.jcts.mean():.2f} s, "
+            f"p50 {np.percentile(self.jcts, 50):.2f} s, "
+            f"p90 {np.percentile(self.jcts, 90):.2f} s, "
+            f"p99 {np.percentile(self.jcts, 99):.2f} s; "
+            f"prefix hit rate {self.prefix_hit_rate:.2%}, "
+            f"padded slots {self.padded_slots_num}"
+        )
+
+
+class ServeSimulator:
+    """Replay a trace on ParrotServeCore with simulated engines."""
+
+    def __init__(
+        self,
+        engines_num: int = 1,
+        latency_model: SimLatencyModel = SimLatencyModel(),
+        tasks_capacity: int = 256,
+        tokens_capacity: int = 262144,
+        criteria: str = "latency",
+        max_sim_time: float = 24 * 3600,
+        core_config: Dict = {},
+        inline_prompt: bool = False,
+        block_size: int = 1,
+    ):
+        """
+        Args:
+            block_size: int. Tokens per KV cache block of the engines.
+            core_config: Dict. Overrides of ServeCoreConfig fields.
+            inline_prompt: bool. Whether to inline the prompt in the template text, right
+                after the prefix. Then ServeCore has to find the shared prefix itself.
+                Otherwise, the prompt is passed as an input SV.
+        """
+
+        self.engines_num = engines_num
+        self.latency_model = latency_model
+        self.tasks_capacity = tasks_capacity
+        self.tokens_capacity = tokens_capacity
+        self.criteria = criteria
+        self.max_sim_time = max_sim_time  # s
+        self.core_config = core_config
+        self.inline_prompt = inline_prompt
+        self.block_size = block_size
+
+    def run(
+        self, trace: List[TraceRequest], global_scheduler_config: Dict
+    ) -> SimulationResult:
+        """Replay the trace under a GlobalScheduler config.
+
+        Args:
+            trace: List[TraceRequest]. The trace.
+            global_scheduler_config: Dict. Fields of GlobalSchedulerConfig.
+
+        Returns:
+            SimulationResult. The result.
+        """
+
+        loop = VirtualClockEventLoop()
+        try:
+            return loop.run_until_complete(
+                asyncio.wait_for(
+                    self._simulate(trace, global_scheduler_config), self.max_sim_time
+                )
+            )
+        finally:
+            loop.close()
+
+    async def _simulate(
+        self, trace: List[TraceRequest], global_scheduler_config: Dict
+    ) -> SimulationResult:
+        loop = asyncio.get_running_loop()
+        core = ParrotServeCore(
+            {
+                "session_life_span": 1e9,
+                # NOTE: Threads run in real time, which the virtual clock can't wait.
+                "tokenization_pool_size": 0,
+                **self.core_config,
+                "global_scheduler": dict(global_scheduler_config),
+            }
+        )
+        tokenizer = SimTokenizer()
+        core.tokenizers_wrapper.tokenizers[SIM_TOKENIZER_NAME] = tokenizer
+
+        sim_engines: Dict[str, SimEngine] = {}
+        background_tasks = []
+
+        with simulated_transport(sim_engines):
+            for i in range(self.engines_num):
+                engine_config = EngineConfig(
+                    model=SIM_MODEL_NAME,
+                    host=SIM_ENGINE_HOST,
+                    port=i,
+                    engine_name=f"sim_engine_{i}",
+                    tokenizer=SIM_TOKENIZER_NAME,
+                    tasks_capacity=self.tasks_capacity,
+                    tokens_capacity=self.tokens_capacity,
+                    block_size=self.block_size,
+                )
+                sim_engine = SimEngine(engine_config, self.latency_model)
+                sim_engines[sim_engine.http_address] = sim_engine
+                resp = core.register_engine({"engine_config": asdict(engine_config)})
+                background_tasks.append(loop.create_task(sim_engine.engine_loop()))
+                background_tasks.append(
+                    loop.create_task(
+                        self._heartbeat_loop(core, resp["engine_id"], sim_engine)
+                    )
+                )
+            background_tasks.append(loop.create_task(core.serve_loop()))
+
+            session_ids = {}
+            for request in trace:
+                if request.session_id not in session_ids:
+                    session_ids[request.session_id] = core.register_session({})[
+                        "session_id"
+                    ]
+
+            jcts = await asyncio.gather(
+                *[
+                    self._replay_request(core, session_ids[request.session_id], request)
+                    for request in trace
+                ]
+            )
+            makespan = loop.time()
+
+            for task in background_tasks:
+                task.cancel()
+            await asyncio.gather(*background_tasks, return_exceptions=True)
+            core.close()
+
+        prompt_tokens_num = sum(
+            [
+                len(tokenizer.encode(request.prefix))
+                + len(tokenizer.encode(request.prompt))
+                for request in trace
+            ]
+        )
+        return SimulationResult(
+            requests_num=len(trace),
+            makespan=makespan,
+            jcts=np.array(jcts),
+            prompt_tokens_num=prompt_tokens_num,
+            filled_tokens_num=sum([e.filled_tokens_num for e in sim_engines.values()]),
+            generated_tokens_num=sum(
+                [e.generated_tokens_num for e in sim_engines.values()]
+            ),
+            padded_slots_num=sum([e.padded_slots_num for e in sim_engines.values()]),
+        )
+
+    async def _heartbeat_loop(
+        self, core: ParrotServeCore, engine_id: int, sim_engine: SimEngine
+    ) -> None:
+        while True:
+            core.engine_heartbeat(
+                {
+                    "engine_id": engine_id,
+                    "engine_name": sim_engine.engine_config.engine_name,
+                    "runtime_info": asdict(sim_engine.runtime_info),
+                }
+            )
+            await asyncio.sleep(SIM_HEARTBEAT_INTERVAL)
+
+    async def _replay_request(
+        self, core: ParrotServeCore, session_id: int, request: TraceRequest
+    ) -> float:
+        """Submit the request at its arrival time and get its output. Returns its JCT."""
+
+        loop = asyncio.get_running_loop()
+        await asyncio.sleep(max(request.arrival_time - loop.time(), 0))
+
+        if self.inline_prompt:
+            template = request.prefix + request.prompt + "{{output}}"
+            placeholders = []
+        else:
+            # The prompt is passed as an input SV, so that only the prefix is shared.
+            resp = core.register_semantic_variable(
+                {"session_id": session_id, "var_name": "prompt"}
+            )
+            prompt_var_id = resp["var_id"]
+            core.set_semantic_variable(
+                prompt_var_id, {"session_id": session_id, "content": request.prompt}
+            )
+            template = request.prefix + "{{prompt}}{{output}}"
+            placeholders = [
+                {"name": "prompt", "is_output": False, "var_id": prompt_var_id}
+            ]
+
+        resp = await core.submit_semantic_call(
+            {
+                "session_id": session_id,
+                "template": template,
+                "placeholders": placeholders
+                + [
+                    {
+                        "name": "output",
+                        "is_output": True,
+                        "sampling_config": {
+                            "max_gen_length": request.output_len,
+                            "ignore_tokenizer_eos": True,
+                        },
+                    },
+                ],
+                "cache_prefix": True,
+                "output_criteria": None,
+                "fuse_fill": False,
+            }
+        )
+        output_var_id = [
+            mapping["var_id"]
+            for mapping in resp["placeholders_mapping"]
+            if mapping["placeholder_name"] == "output"
+        ][0]
+
+        await core.get_semantic_variable(
+            output_var_id,
+            {"session_id": session_id, "criteria": self.criteria, "ddl": None},
+        )
+        return loop.time() - request.arrival_time
+
+
+# ---------- Main ----------
+
+
+DEFAULT_CONFIGS = {
+    "baseline": {},
+    "app_fifo": {"app_fifo": True},
+    "graph_group": {"graph_group": True},
+    "ctx_group": {"ctx_group": True},
+    "ctx_aware": {"ctx_aware": True},
+    "all": {
+        "app_fifo": True,
+        "graph_group": True,
+        "ctx_group": True,
+        "ctx_aware": True,
+    },
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve Layer Simulator")
+    parser.add_argument("--trace", type=str, required=True, help="JSONL trace path.")
+    parser.add_argument("--engines_num", type=int, default=1)
+    parser.add_argument("--tasks_capacity", type=int, default=256)
+    parser.add_argument("--tokens_capacity", type=int, default=262144)
+    parser.add_argument("--block_size", type=int, default=1)
+    parser.add_argument(
+        "--request_rate",
+        type=float,
+        default=1.0,
+        help="Requests per second, for requests without arrival_time.",
+    )
+    parser.add_argument("--output_len", type=int, default=128)
+    parser.add_argument(
+        "--criteria",
+        type=str,
+        default="latency",
+        choices=["latency", "throughput", "TTFT", "TPOT"],
+        help="Performance criteria of the outputs.",
+    )
+    parser.add_argument("--base_latency", type=float, default=0.010)
+    parser.add_argument("--per_seq_latency", type=float, default=0.0002)
+    parser.add_argument("--per_prefill_token_latency", type=float, default=0.00005)
+    parser.add_argument(
+        "--configs",
+        type=str,
+        nargs="+",
+        default=list(DEFAULT_CONFIGS.keys()),
+        choices=list(DEFAULT_CONFIGS.keys()),
+    )
+    parser.add_argument(
+        "--inline_prompt",
+        action="store_true",
+        help="Inline the prompt in the template text, instead of passing it as an SV.",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args()
+
+    import logging
+
+    logging.disable(logging.WARNING)
+
+    trace = load_trace(
+        args.trace,
+        request_rate=args.request_rate,
+        output_len=args.output_len,
+        seed=args.seed,
+    )
+    simulator = ServeSimulator(
+        engines_num=args.engines_num,
+        latency_model=SimLatencyModel(
+            base=args.base_latency,
+            per_seq=args.per_seq_latency,
+            per_prefill_token=args.per_prefill_token_latency,
+        ),
+        tasks_capacity=args.tasks_capacity,
+        tokens_capacity=args.tokens_capacity,
+        criteria=args.criteria,
+        inline_prompt=args.inline_prompt,
+        block_size=args.block_size,
+    )
+
+    print(f"Trace: {args.trace}, {len(trace)} requests.", flush=True)
+    for name in args.configs:
+        result = simulator.run(trace, DEFAULT_CONFIGS[name])
+        print(f"{name}: {result.summary()}", flush=True)
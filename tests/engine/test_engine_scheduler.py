@@ -0,0 +1,171 @@
+from parrot.engine.engine_scheduler import EngineScheduler
+from parrot.engine.config import SchedulerConfig
+from parrot.engine.primitive_job import Fill, Generate
+from parrot.engine.context.text_context import TextContext
+from parrot.sampling_config import SamplingConfig
+
+
+def _run_iter(scheduler: EngineScheduler):
+    """Simulate an iteration of the runner. Return the number of tokens in the batch."""
+
+    jobs = scheduler.schedule()
+    num_tokens = 0
+    for job in jobs:
+        if isinstance(job, Fill):
+            num_tokens += len(job.iter_token_ids)
+            if job.finish_iter():
+                job.finish_event.set()
+        else:
+            num_tokens += 1
+    scheduler.finish()
+    return jobs, num_tokens
+
+
+def _make_job(job, context_id: int):
+    job.context = TextContext(context_id, None)
+    return job
+
+
+def test_chunked_fill():
+    config = SchedulerConfig(
+        max_batch_size=16,
+        max_num_batched_tokens=64,
+        max_total_tokens=99999,
+    )
+    scheduler = EngineScheduler(config, fill_chunk_size=32)
+
+    # Running decodes.
+    for i in range(4):
+        gen = Generate(
+            session_id=0,
+            task_id=i,
+            context_id=i,
+            parent_context_id=-1,
+            sampling_config=SamplingConfig(max_gen_length=99999),
+        )
+        scheduler.add_job(_make_job(gen, i))
+
+    fill = Fill(
+        session_id=0,
+        task_id=4,
+        context_id=4,
+        parent_context_id=-1,
+        token_ids=list(range(100)),
+    )
+    scheduler.add_job(_make_job(fill, 4))
+
+    chunks = []
+    while not fill.finish_event.is_set():
+        jobs, num_tokens = _run_iter(scheduler)
+        print(f"Batched tokens: {num_tokens}, filled: {fill.filled_num}")
+        assert num_tokens <= config.max_num_batched_tokens
+        # Decodes are never blocked by the Fill.
+        assert sum([isinstance(job, Generate) for job in jobs]) == 4
+        chunks.append(fill.filled_num)
+
+    assert chunks == [32, 64, 96, 100]
+    assert fill not in scheduler.running_jobs
+
+
+def test_no_chunked_fill():
+    config = SchedulerConfig(
+        max_batch_size=16,
+        max_num_batched_tokens=256,
+        max_total_tokens=99999,
+    )
+    scheduler = EngineScheduler(config)
+
+    fill = Fill(
+        session_id=0,
+        task_id=0,
+        context_id=0,
+        parent_context_id=-1,
+        token_ids=list(range(100)),
+    )
+    scheduler.add_job(_make_job(fill, 0))
+
+    _, num_tokens = _run_iter(scheduler)
+    assert num_tokens == 100
+    assert fill.finish_event.is_set()
+
+
+def test_prefill_priority():
+    config = SchedulerConfig(
+        max_batch_size=16,
+        max_num_batched_tokens=100,
+        max_total_tokens=99999,
+    )
+    scheduler = EngineScheduler(config)
+
+    # Two normal Fills arrive first, each takes the whole token budget.
+    for i in range(2):
+        fill = Fill(
+            session_id=0,
+            task_id=i,
+            context_id=i,
+            parent_context_id=-1,
+            token_ids=list(range(100)),
+        )
+        scheduler.add_job(_make_job(fill, i))
+
+    prior_fill = Fill(
+        session_id=0,
+        task_id=2,
+        context_id=2,
+        parent_context_id=-1,
+        token_ids=list(range(100)),
+        prefill_priority=True,
+    )
+    scheduler.add_job(_make_job(prior_fill, 2))
+
+    jobs, _ = _run_iter(scheduler)
+    print(f"First batch: {jobs}")
+    assert jobs == [prior_fill]
+    assert prior_fill.finish_event.is_set()
+
+
+def test_decode_batch_size_upperbound():
+    config = SchedulerConfig(
+        max_batch_size=16,
+        max_num_batched_tokens=256,
+        max_total_tokens=99999,
+    )
+    scheduler = EngineScheduler(config)
+
+    capped_gen = Generate(
+        session_id=0,
+        task_id=0,
+        context_id=0,
+        parent_context_id=-1,
+        sampling_config=SamplingConfig(max_gen_length=99999),
+        decode_batch_size_upperbound=4,
+    )
+    scheduler.add_job(_make_job(capped_gen, 0))
+
+    for i in range(1, 8):
+        gen = Generate(
+            session_id=0,
+            task_id=i,
+            context_id=i,
+            parent_context_id=-1,
+            sampling_config=SamplingConfig(max_gen_length=99999),
+        )
+        scheduler.add_job(_make_job(gen, i))
+
+    jobs, _ = _run_iter(scheduler)
+    print(f"Decode batch size: {len(jobs)}")
+    assert len(jobs) == 4
+    assert capped_gen in jobs
+
+    # Once the capped job finishes, the others are not limited anymore.
+    capped_gen.finish_event.set()
+    scheduler.finish()
+    jobs, _ = _run_iter(scheduler)
+    assert len(jobs) == 7
+
+
+if __name__ == "__main__":
+    test_chunked_fill()
+    test_no_chunked_fill()
+    test_prefill_priority()
+    test_decode_batch_size_upperbound()
@@ -1,12 +1,19 @@
+import asyncio
 import json
 
+from parrot.constants import NONE_CONTEXT_ID
+from parrot.protocol.internal.runtime_info import EngineRuntimeInfo
 from parrot.serve.backend_repr import Context, ExecutionEngine, LanguageModel
 from parrot.engine.config import EngineConfig
 from parrot.testing.get_configs import get_sample_engine_config_path
 
 from parrot.serve.variable_manager import SemanticVariableManager
 from parrot.serve.scheduler import CompletionTask
-from parrot.serve.context_manager import PrefixCache, ServeCoreContextManager
+from parrot.serve.context_manager import (
+    PrefixCache,
+    PrefixIndex,
+    ServeCoreContextManager,
+)
 from parrot.sampling_config import SamplingConfig
 from parrot.serve.graph import (
     RequestChain,
@@ -20,11 +27,54 @@ from parrot.serve.graph.request import SemanticCallMetadata, RequestPlaceholder
 def test_prefix_cache():
     svs = ["sv0", "sv1", "sv2"]
     prefix_cache = PrefixCache()
-    prefix_hash = ""
     for context_id, sv in enumerate(svs):
-        prefix_hash += ServeCoreContextManager._hash_var_id(sv)
-        prefix_cache.cache_prefix_context(prefix_hash, context_id)
-    print(prefix_cache._prefix_ctx_map)
+        prefix_cache.cache_prefix_context(svs[: context_id + 1], context_id)
+    prefix_cache.cache_prefix_context(["sv0", "sv1", "sv3"], 3)
+
+    assert prefix_cache.get_cached_prefix_context(["sv0", "sv1"]) == 1
+    assert prefix_cache.get_cached_prefix_context(["sv1"]) == NONE_CONTEXT_ID
+    assert prefix_cache.get_longest_cached_prefix(["sv0", "sv1", "sv3", "sv4"]) == [
+        0,
+        1,
+        3,
+    ]
+
+    # Remove a middle context: the longer prefixes are no longer reachable.
+    prefix_cache.remove_context_id(1)
+    assert prefix_cache.get_longest_cached_prefix(["sv0", "sv1", "sv2"]) == [0]
+
+    # Remove the leaves: the whole branch is pruned.
+    prefix_cache.remove_context_id(2)
+    prefix_cache.remove_context_id(3)
+    assert prefix_cache.get_cached_prefix_context(["sv0", "sv1"]) == NONE_CONTEXT_ID
+    assert len(prefix_cache._index._edges) == 1
+    assert len(prefix_cache) == 1
+
+
+def test_prefix_index():
+    prefix_index = PrefixIndex()
+    prefix_caches = [PrefixCache(engine_id=i, prefix_index=prefix_index) for i in range(3)]
+
+    prefix_caches[0].cache_prefix_contexts(["sv0", "sv1", "sv2"], [0, 1, 2])
+    prefix_caches[1].cache_prefix_contexts(["sv0", "sv1"], [0, 1])
+    prefix_caches[2].cache_prefix_contexts(["sv3"], [0])
+
+    depths = prefix_index.query_prefix_engines(["sv0", "sv1", "sv2", "sv4"])
+    print(depths)
+    assert depths == {0: 3, 1: 2}
+    assert prefix_index.query_prefix_engines(["sv3", "sv0"]) == {2: 1}
+    assert prefix_index.query_prefix_engines(["sv4"]) == {}
+
+    # The tree is shared: engine 1 reuses the nodes of engine 0.
+    assert len(prefix_index._edges) == 4
+
+    prefix_caches[0].clear()
+    assert prefix_index.query_prefix_engines(["sv0", "sv1", "sv2"]) == {1: 2}
+    assert len(prefix_index._edges) == 3
+
+    prefix_caches[1].clear()
+    prefix_caches[2].clear()
+    assert len(prefix_index._edges) == 0
 
 
 def test_context_manager():
@@ -67,9 +117,173 @@ def test_context_manager():
     context_mgr.set_task_contexts(task)
 
     print(context_mgr._context_ref_counter)
-    print(context_mgr.prefix_caches[engine.engine_id]._prefix_ctx_map)
+    prefix = [node.var_id for node in task.chain.iter_fill()]
+    print(context_mgr.prefix_caches[engine.engine_id].get_longest_cached_prefix(prefix))
+
+    # Frees are queued per engine, and context ids are not recycled before flushing.
+    context_mgr.free_task_contexts(task)
+    pending_contexts = context_mgr._pending_free_contexts[engine.engine_id]
+    for context in pending_contexts:
+        assert context_mgr._context_ref_counter[context.context_id] == 0
+        assert context.context_id not in context_mgr.contexts
+    assert context_mgr._context_id_pool.get_allocated_num() == len(
+        context_mgr._context_ref_counter
+    )
+
+
+def test_select_eviction_contexts():
+    session_id = 0
+    var_mgr = SemanticVariableManager(666)
+    var_mgr.register_local_var_space(session_id=0)
+
+    config_path = get_sample_engine_config_path("opt-13b.json")
+    with open(config_path, "r") as f:
+        engine_config = EngineConfig.from_dict(json.load(f))
+    engine_config.tokens_capacity = 1000
+    engine = ExecutionEngine.from_engine_config(0, engine_config)
+
+    context_mgr = ServeCoreContextManager(
+        evict_high_watermark=0.9, evict_low_watermark=0.5
+    )
+    context_mgr.register_engine_prefix_cache(engine.engine_id)
+
+    # Three system prompts: (tokens_num, extra hits)
+    prompts = [("Cold", 100, 0), ("Hot", 100, 5), ("Long", 400, 0)]
+    tasks = []
+    for i, (text, tokens_num, hits) in enumerate(prompts):
+        request_chain = RequestChain.from_nodes(
+            nodes=[
+                ConstantFill(text),
+                PlaceholderGen(
+                    placeholder=RequestPlaceholder(
+                        name="b", is_output=True, sampling_config=SamplingConfig()
+                    )
+                ),
+            ]
+        )
+        request_chain.metadata.cache_prefix = True
+        var_mgr.create_vars_for_request(session_id, request_chain)
+        task = CompletionTask(task_id=i, chain=request_chain.comp_chains[0])
+        task.schedule_to(engine, update_engine_info=False)
+        context_mgr.set_task_contexts(task)
+        task.contexts[0].tokens_num = tokens_num
+        for _ in range(hits):
+            context_mgr._touch_context(task.contexts[0])
+        tasks.append(task)
+
+    # Not under memory pressure.
+    engine._real_time_runtime_info.num_cached_tokens = 600
+    assert context_mgr.select_eviction_contexts(engine) == []
+
+    # Under memory pressure, but all prefixes are used by running tasks.
+    engine._real_time_runtime_info.num_cached_tokens = 950
+    assert context_mgr.select_eviction_contexts(engine) == []
+
+    # Tasks finish. Only the extra ref_counters of constant prefixes remain.
+    for task in tasks:
+        context_mgr._context_ref_counter[task.contexts[0].context_id] = 1
+        for context in task.contexts[1:]:
+            context_mgr._context_ref_counter[context.context_id] = 0
+
+    # Same idle time for all prefixes.
+    for task in tasks:
+        context_mgr._context_last_access_time[task.contexts[0].context_id] = 0
+
+    # Need to free 450 tokens: "Cold" goes first, then "Long"; "Hot" stays resident.
+    evicted = context_mgr.select_eviction_contexts(engine)
+    print([context.context_id for context in evicted])
+    assert evicted == [tasks[0].contexts[0], tasks[2].contexts[0]]
+
+
+def test_evict_on_back_to_back_heartbeats():
+    session_id = 0
+    var_mgr = SemanticVariableManager(666)
+    var_mgr.register_local_var_space(session_id=0)
+
+    config_path = get_sample_engine_config_path("opt-13b.json")
+    with open(config_path, "r") as f:
+        engine_config = EngineConfig.from_dict(json.load(f))
+    engine_config.tokens_capacity = 1000
+    engine = ExecutionEngine.from_engine_config(0, engine_config)
+
+    context_mgr = ServeCoreContextManager(
+        evict_high_watermark=0.9, evict_low_watermark=0.5
+    )
+    context_mgr.register_engine_prefix_cache(engine.engine_id)
+
+    # Four idle system prompts of 200 tokens.
+    for i in range(4):
+        request_chain = RequestChain.from_nodes(
+            nodes=[
+                ConstantFill(f"Prompt {i}"),
+                PlaceholderGen(
+                    placeholder=RequestPlaceholder(
+                        name="b", is_output=True, sampling_config=SamplingConfig()
+                    )
+                ),
+            ]
+        )
+        request_chain.metadata.cache_prefix = True
+        var_mgr.create_vars_for_request(session_id, request_chain)
+        task = CompletionTask(task_id=i, chain=request_chain.comp_chains[0])
+        task.schedule_to(engine, update_engine_info=False)
+        context_mgr.set_task_contexts(task)
+        task.contexts[0].tokens_num = 200
+        context_mgr.free_task_contexts(task)
+
+    # Two heartbeats report the same usage before the frees reach the engine.
+    heartbeat = EngineRuntimeInfo(num_cached_tokens=950)
+    engine.update_realtime_runtime_info(heartbeat)
+    assert context_mgr.evict_prefix_contexts(engine) == 3  # 950 - 600 < 500
+    assert context_mgr.get_freeing_tokens_num(engine.engine_id) == 600
+    engine.update_realtime_runtime_info(heartbeat)
+    assert context_mgr.evict_prefix_contexts(engine) == 0
+
+
+def test_free_contexts_failure():
+    config_path = get_sample_engine_config_path("opt-13b.json")
+    with open(config_path, "r") as f:
+        engine_config = EngineConfig.from_dict(json.load(f))
+    engine_config.port = 1  # Nothing listens here.
+    engine = ExecutionEngine.from_engine_config(0, engine_config)
+
+    context_mgr = ServeCoreContextManager()
+    context_mgr.register_engine_prefix_cache(engine.engine_id)
+
+    def free_new_contexts():
+        contexts = [context_mgr._new_context(engine) for _ in range(3)]
+        for context in contexts:
+            context_mgr.free_context(context)
+        return context_mgr._pending_free_contexts.pop(engine.engine_id)
+
+    async def main():
+        # Cancelled (e.g. at shutdown): the engine is not marked bad.
+        contexts = free_new_contexts()
+        task = asyncio.create_task(context_mgr._afree_contexts(engine, contexts))
+        await asyncio.sleep(0)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        assert engine.is_running
+
+        # Failed after retries: the engine is bad and the ids are kept until it's removed.
+        contexts = free_new_contexts()
+        await context_mgr._afree_contexts(engine, contexts)
+        assert not engine.is_running
+        assert context_mgr._failed_free_context_ids[engine.engine_id] == [
+            context.context_id for context in contexts
+        ]
+
+    asyncio.run(main())
+
+    allocated_num = context_mgr._context_id_pool.get_allocated_num()
+    context_mgr.remove_engine_prefix_cache(engine.engine_id)
+    assert context_mgr._context_id_pool.get_allocated_num() == allocated_num - 3
 
 
 if __name__ == "__main__":
     test_prefix_cache()
+    test_prefix_index()
     test_context_manager()
+    test_select_eviction_contexts()
+    test_evict_on_back_to_back_heartbeats()
+    test_free_contexts_failure()
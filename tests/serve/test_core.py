@@ -1,6 +1,25 @@
+import asyncio
+import threading
+import pytest
+from dataclasses import asdict
+
+from parrot.exceptions import ParrotCoreOverloadedError
+from parrot.engine.config import EngineConfig
+from parrot.constants import ENGINE_TYPE_OPENAI
+from parrot.protocol.internal.runtime_info import EngineRuntimeInfo
+from parrot.sampling_config import SamplingConfig
 from parrot.serve.core import create_serve_core
+from parrot.serve.graph import RequestChain, ConstantFill, PlaceholderGen
+from parrot.serve.graph.request import RequestPlaceholder
+from parrot.serve.scheduler import CompletionTask
 
 from parrot.testing.get_configs import get_sample_core_config_path
+from parrot.testing.serve_simulator import (
+    SimEngine,
+    SimLatencyModel,
+    SimTokenizer,
+    simulated_transport,
+)
 
 
 def test_launch_core():
@@ -15,6 +34,458 @@ def test_core_register_session():
     core.register_session({})
 
 
+def test_core_get_without_ddl():
+    config_path = get_sample_core_config_path("localhost_serve_core.json")
+    core = create_serve_core(config_path)
+    session_id = core.register_session({})["session_id"]
+    var_id = core.register_semantic_variable(
+        {"session_id": session_id, "var_name": "a"}
+    )["var_id"]
+    core.set_semantic_variable(var_id, {"session_id": session_id, "content": "Hello"})
+
+    # "ddl" is optional. Clients of the original protocol don't send it.
+    async def main():
+        resp = await core.get_semantic_variable(
+            var_id, {"session_id": session_id, "criteria": "latency"}
+        )
+        assert resp["content"] == "Hello"
+
+        stream = core.get_semantic_variable_stream(
+            var_id, {"session_id": session_id, "criteria": "latency"}
+        )
+        assert "".join([chunk async for chunk in stream]) == "Hello"
+
+    asyncio.run(main())
+
+
+def test_core_event_driven_schedule():
+    config_path = get_sample_core_config_path("localhost_serve_core.json")
+    core = create_serve_core(config_path)
+
+    schedule_rounds = 0
+    schedule = core.global_scheduler.schedule
+
+    def counted_schedule():
+        nonlocal schedule_rounds
+        schedule_rounds += 1
+        schedule()
+
+    core.global_scheduler.schedule = counted_schedule
+
+    async def main():
+        loop_task = asyncio.create_task(core.serve_loop())
+
+        # Idle: no scheduling rounds.
+        await asyncio.sleep(0.1)
+        assert schedule_rounds == 0
+
+        # Triggered: exactly one round, even if notified multiple times.
+        core.global_scheduler.notify_schedule()
+        core.global_scheduler.notify_schedule()
+        await asyncio.sleep(0.1)
+        print(f"Schedule rounds: {schedule_rounds}")
+        assert schedule_rounds == 1
+
+        loop_task.cancel()
+
+    asyncio.run(main())
+
+
+def test_core_admission_control():
+    config_path = get_sample_core_config_path("localhost_serve_core.json")
+    core = create_serve_core(
+        config_path,
+        override_args={
+            "admission_control": True,
+            "admission_max_queueing_delay": 1.0,
+        },
+    )
+    session_id = core.register_session({})["session_id"]
+
+    # An engine running one task at a time, 10 ms per iteration.
+    engine_config = EngineConfig(
+        model="gpt-3.5-turbo", engine_type=ENGINE_TYPE_OPENAI, tasks_capacity=1
+    )
+    engine_id = core.engine_mgr.register_engine(engine_config)
+    core.engine_mgr.engine_heartbeat(
+        engine_id, EngineRuntimeInfo(recent_average_latency=10_000_000)
+    )
+
+    # Not overloaded.
+    core.admission_controller.check_admission(session_id)
+
+    # 20 queued tasks, 100 iterations each: 20 s to work them off.
+    for task_id in range(20):
+        request_chain = RequestChain.from_nodes(
+            nodes=[
+                ConstantFill("This is a test "),
+                PlaceholderGen(
+                    placeholder=RequestPlaceholder(
+                        name="a",
+                        is_output=True,
+                        sampling_config=SamplingConfig(max_gen_length=100),
+                    )
+                ),
+            ]
+        )
+        task = CompletionTask(task_id=task_id, chain=request_chain.comp_chains[0])
+        task.tokenized_result = {}
+        core.global_scheduler.submit_task(task)
+
+    queueing_delay = core.admission_controller.estimate_queueing_delay()
+    print(f"Estimated queueing delay: {queueing_delay:.2f} s")
+    assert abs(queueing_delay - 20.0) < 1e-6
+
+    with pytest.raises(ParrotCoreOverloadedError) as e:
+        asyncio.run(core.submit_semantic_call({"session_id": session_id}))
+    # Retry after the queue drains below the limit.
+    assert abs(e.value.retry_after - 19.0) < 1e-6
+
+
+def test_core_prefix_matching():
+    few_shot = (
+        "Translate English to French. "
+        "sea otter => loutre de mer. "
+        "peppermint => menthe poivrée. "
+        "plush girafe => girafe peluche. "
+    )
+
+    async def submit_calls(prefix_matching: bool):
+        config_path = get_sample_core_config_path("localhost_serve_core.json")
+        core = create_serve_core(
+            config_path, override_args={"prefix_matching": prefix_matching}
+        )
+        session_id = core.register_session({})["session_id"]
+
+        # The first chunks of calls share the few-shot examples, but are not identical.
+        prefix_nodes = []
+        for i in range(6):
+            resp = await core.submit_semantic_call(
+                {
+                    "session_id": session_id,
+                    "template": few_shot + f"word {i} => {{{{output}}}}",
+                    "placeholders": [{"name": "output", "is_output": True}],
+                    "model_type": "text",
+                    "cache_prefix": True,
+                    "output_criteria": None,
+                    "fuse_fill": False,
+                }
+            )
+            var = core.var_mgr.get_var(
+                session_id, resp["placeholders_mapping"][0]["var_id"]
+            )
+            prefix_nodes.append(var.get_producer().comp_chain.first_node)
+        return prefix_nodes
+
+    async def main():
+        # Without prefix matching, every call has its own prefix SV.
+        prefix_nodes = await submit_calls(prefix_matching=False)
+        assert len(set([node.var_id for node in prefix_nodes])) == 6
+
+        # With prefix matching, the common prefix is split out once it's a global prefix.
+        prefix_nodes = await submit_calls(prefix_matching=True)
+        for node in prefix_nodes:
+            print(repr(node.constant_text))
+        for node in prefix_nodes[3:]:
+            assert node.constant_text == few_shot + "word "
+            assert node.var_id == prefix_nodes[3].var_id
+
+    asyncio.run(main())
+
+
+class EOSSimEngine(SimEngine):
+    """A simulated engine which ends every streamed generation with the EOS token, like an
+    engine stopping at it. It records the token ids of Fills."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.filled_token_ids = []
+
+    async def fill(self, payload):
+        if payload["token_ids"] is not None:
+            self.filled_token_ids.append(list(payload["token_ids"]))
+        return await super().fill(payload)
+
+    async def generate_stream(self, payload):
+        async for token_id in super().generate_stream(payload):
+            yield token_id
+        yield SimTokenizer.eos_token_id
+
+
+def run_with_sim_engine(sim_engine_cls, main):
+    """Run main(core, sim_engine) with a ServeCore serving a simulated engine."""
+
+    config_path = get_sample_core_config_path("localhost_serve_core.json")
+    core = create_serve_core(config_path)
+    tokenizer_name = "sim_tokenizer"
+    core.tokenizers_wrapper.tokenizers[tokenizer_name] = SimTokenizer()
+
+    engine_config = EngineConfig(model="sim_model", tokenizer=tokenizer_name)
+    sim_engine = sim_engine_cls(engine_config, SimLatencyModel())
+
+    async def run():
+        with simulated_transport({sim_engine.http_address: sim_engine}):
+            core.register_engine({"engine_config": asdict(engine_config)})
+            background_tasks = [
+                asyncio.create_task(sim_engine.engine_loop()),
+                asyncio.create_task(core.serve_loop()),
+            ]
+            try:
+                await main(core, sim_engine)
+            finally:
+                for task in background_tasks:
+                    task.cancel()
+                await asyncio.gather(*background_tasks, return_exceptions=True)
+
+    asyncio.run(run())
+
+
+async def submit_producer_and_consumer(core, session_id: int):
+    """Submit a call generating a, and a call filling a in pipelined mode and generating b.
+    Returns (a's var_id, b's var_id)."""
+
+    resp = await core.submit_semantic_call(
+        {
+            "session_id": session_id,
+            "template": "Say something. {{a}}",
+            "placeholders": [
+                {
+                    "name": "a",
+                    "is_output": True,
+                    "sampling_config": {"max_gen_length": 8},
+                }
+            ],
+            "cache_prefix": False,
+            "output_criteria": None,
+            "fuse_fill": False,
+        }
+    )
+    a_var_id = resp["placeholders_mapping"][0]["var_id"]
+
+    resp = await core.submit_semantic_call(
+        {
+            "session_id": session_id,
+            "template": "Repeat: {{a}} {{b}}",
+            "placeholders": [
+                {"name": "a", "is_output": False, "var_id": a_var_id},
+                {
+                    "name": "b",
+                    "is_output": True,
+                    "sampling_config": {"max_gen_length": 4},
+                },
+            ],
+            "cache_prefix": False,
+            "output_criteria": None,
+            "fuse_fill": False,
+            "pipeline_fill": True,
+        }
+    )
+    b_var_id = [
+        mapping["var_id"]
+        for mapping in resp["placeholders_mapping"]
+        if mapping["placeholder_name"] == "b"
+    ][0]
+    return a_var_id, b_var_id
+
+
+def test_core_pipelined_fill():
+    async def main(core, sim_engine):
+        session_id = core.register_session({})["session_id"]
+        _, b_var_id = await submit_producer_and_consumer(core, session_id)
+
+        await asyncio.wait_for(
+            core.get_semantic_variable(
+                b_var_id, {"session_id": session_id, "criteria": "latency"}
+            ),
+            timeout=5,
+        )
+
+        # The EOS token ends the producer's stream, but it's not filled to the consumer.
+        print(sim_engine.filled_token_ids)
+        for token_ids in sim_engine.filled_token_ids:
+            assert SimTokenizer.eos_token_id not in token_ids
+
+    run_with_sim_engine(EOSSimEngine, main)
+
+
+class FailingSimEngine(SimEngine):
+    """A simulated engine which fails in the middle of every streamed generation."""
+
+    async def generate_stream(self, payload):
+        generated_num = 0
+        async for token_id in super().generate_stream(payload):
+            yield token_id
+            generated_num += 1
+            if generated_num == 6:
+                raise RuntimeError("Engine fails.")
+
+
+async def get_all_outputs(core, session_id: int, a_var_id: str, b_var_id: str):
+    """Get a in streaming mode and b, concurrently. Returns their results or exceptions."""
+
+    async def stream_a():
+        stream = core.get_semantic_variable_stream(
+            a_var_id, {"session_id": session_id, "criteria": "latency"}
+        )
+        return "".join([chunk async for chunk in stream])
+
+    get_b = core.get_semantic_variable(
+        b_var_id, {"session_id": session_id, "criteria": "latency"}
+    )
+    return await asyncio.wait_for(
+        asyncio.gather(stream_a(), get_b, return_exceptions=True), timeout=5
+    )
+
+
+def test_core_execution_failure():
+    async def main(core, sim_engine):
+        session_id = core.register_session({})["session_id"]
+        a_var_id, b_var_id = await submit_producer_and_consumer(core, session_id)
+
+        # The producer fails in the middle. Both the streaming Get of its output and its
+        # pipelined consumer get the error, instead of waiting forever.
+        results = await get_all_outputs(core, session_id, a_var_id, b_var_id)
+        print(results)
+        assert all([isinstance(result, RuntimeError) for result in results])
+
+    run_with_sim_engine(FailingSimEngine, main)
+
+
+def test_core_schedule_failure():
+    async def main(core, sim_engine):
+        session_id = core.register_session({})["session_id"]
+        a_var_id, b_var_id = await submit_producer_and_consumer(core, session_id)
+
+        def failing_submit_task(task):
+            raise RuntimeError("Scheduler fails.")
+
+        core.global_scheduler.submit_task = failing_submit_task
+
+        results = await get_all_outputs(core, session_id, a_var_id, b_var_id)
+        print(results)
+        assert all([isinstance(result, RuntimeError) for result in results])
+
+    run_with_sim_engine(SimEngine, main)
+
+
+def test_core_prefix_matching_tokenize_once():
+    prompt = " ".join([f"word{i}" for i in range(64)])
+
+    async def main(core, sim_engine):
+        session_id = core.register_session({})["session_id"]
+
+        tokenized_texts = []
+        tokenize_batch = core.tokenizers_wrapper.tokenize_batch
+
+        def counted_tokenize_batch(texts, tokenizer_name):
+            tokenized_texts.extend(texts)
+            return tokenize_batch(texts, tokenizer_name)
+
+        core.tokenizers_wrapper.tokenize_batch = counted_tokenize_batch
+
+        async def submit_call() -> str:
+            resp = await core.submit_semantic_call(
+                {
+                    "session_id": session_id,
+                    "template": prompt + " {{output}}",
+                    "placeholders": [
+                        {
+                            "name": "output",
+                            "is_output": True,
+                            "sampling_config": {"max_gen_length": 4},
+                        }
+                    ],
+                    "cache_prefix": True,
+                    "output_criteria": None,
+                    "fuse_fill": False,
+                }
+            )
+            return resp["placeholders_mapping"][0]["var_id"]
+
+        # The constant prefix is tokenized (and cached) when the call is executed.
+        var_id = await submit_call()
+        await asyncio.wait_for(
+            core.get_semantic_variable(
+                var_id, {"session_id": session_id, "criteria": "latency"}
+            ),
+            timeout=5,
+        )
+        assert len(tokenized_texts) > 0
+
+        # Prefix matching of the repeated prompt reuses the token ids from the cache.
+        tokenized_texts.clear()
+        await submit_call()
+        assert tokenized_texts == []
+
+    run_with_sim_engine(SimEngine, main)
+
+
+def test_core_streaming_detokenization():
+    async def main(core, sim_engine):
+        session_id = core.register_session({})["session_id"]
+
+        window_lens = []
+        thread_ids = set()
+        detokenize_incrementally_batch = (
+            core.tokenizers_wrapper.detokenize_incrementally_batch
+        )
+
+        def recorded_detokenize_incrementally_batch(jobs, tokenizer_name):
+            window_lens.extend([len(job[0]) for job in jobs])
+            thread_ids.add(threading.get_ident())
+            return detokenize_incrementally_batch(jobs, tokenizer_name)
+
+        core.tokenizers_wrapper.detokenize_incrementally_batch = (
+            recorded_detokenize_incrementally_batch
+        )
+
+        resp = await core.submit_semantic_call(
+            {
+                "session_id": session_id,
+                "template": "Say something. {{a}}",
+                "placeholders": [
+                    {
+                        "name": "a",
+                        "is_output": True,
+                        "sampling_config": {"max_gen_length": 32},
+                    }
+                ],
+                "cache_prefix": False,
+                "output_criteria": None,
+                "fuse_fill": False,
+            }
+        )
+        var_id = resp["placeholders_mapping"][0]["var_id"]
+        stream = core.get_semantic_variable_stream(
+            var_id, {"session_id": session_id, "criteria": "latency"}
+        )
+        streamed_text = "".join([chunk async for chunk in stream])
+        content = (
+            await core.get_semantic_variable(
+                var_id, {"session_id": session_id, "criteria": "latency"}
+            )
+        )["content"]
+
+        # Tokens are detokenized off the event loop, and each job only decodes a small
+        # window instead of the whole generated sequence.
+        print(f"Window lengths: {window_lens}")
+        assert streamed_text == content
+        assert threading.get_ident() not in thread_ids
+        assert 0 < len(window_lens) <= 32
+        assert max(window_lens) < 16
+
+    run_with_sim_engine(SimEngine, main)
+
+
 if __name__ == "__main__":
     test_launch_core()
     test_core_register_session()
+    test_core_get_without_ddl()
+    test_core_event_driven_schedule()
+    test_core_admission_control()
+    test_core_prefix_matching()
+    test_core_pipelined_fill()
+    test_core_execution_failure()
+    test_core_schedule_failure()
+    test_core_prefix_matching_tokenize_once()
+    test_core_streaming_detokenization()
@@ -6,6 +6,8 @@ from parrot.engine.config import EngineConfig
 from parrot.serve.context_manager import ServeCoreContextManager
 from parrot.serve.tokenizer_wrapper import TokenizersWrapper
 from parrot.serve.engine_manager import EngineManager
+from parrot.serve.backend_repr import ModelType
+from parrot.constants import ENGINE_TYPE_OPENAI
 from parrot.testing.get_configs import get_sample_engine_config_path
 
 
@@ -37,5 +39,51 @@ def test_engine_manager():
     print(engine_mgr.engines, engine_mgr.models)
 
 
+def test_engine_index():
+    context_mgr = ServeCoreContextManager()
+    tokenizers_wrapper = TokenizersWrapper()
+    engine_mgr = EngineManager(
+        tokenizers_wrapper=tokenizers_wrapper,
+        context_mgr=context_mgr,
+        engine_heartbeat_timeout=5,
+    )
+
+    for i, (model, tasks_capacity) in enumerate(
+        [("gpt-3.5", 4), ("gpt-4", 8), ("gpt-3.5", 16), ("gpt-4", 2)]
+    ):
+        engine_config = EngineConfig(
+            engine_name=f"engine_{i}",
+            model=model,
+            engine_type=ENGINE_TYPE_OPENAI,
+            tasks_capacity=tasks_capacity,
+        )
+        engine_mgr.register_engine(engine_config)
+
+    def candidates(models):
+        return [
+            engine.engine_id
+            for engine in engine_mgr.iter_candidate_engines(ModelType.TEXT, models)
+        ]
+
+    # Ordered by remaining capacity.
+    assert candidates(["gpt-3.5"]) == [2, 0]
+    assert candidates(["gpt-4"]) == [1, 3]
+    assert sorted(candidates([])) == [0, 1, 2, 3]
+    assert candidates(["unknown"]) == []
+    assert (
+        list(engine_mgr.iter_candidate_engines(ModelType.TOKEN_ID, ["gpt-3.5"])) == []
+    )
+
+    # Dead engines are skipped.
+    engine_mgr.get_engine(2).mark_bad(RuntimeError("bad"))
+    assert candidates(["gpt-3.5"]) == [0]
+
+    # Removed engines are dropped from the index.
+    engine_mgr.sweep_not_running_engines()
+    assert candidates(["gpt-3.5"]) == [0]
+    print(engine_mgr._engine_index)
+
+
 if __name__ == "__main__":
     test_engine_manager()
+    test_engine_index()
@@ -220,6 +220,47 @@ def test_graph_traverse():
         print(req.comp_chains[0].depth)
 
 
+def test_graph_traverse_ttft():
+    # A -> B, B is TTFT-critical
+    graph = ComputeGraph()
+
+    var_mgr = SemanticVariableManager(666)
+    session_id = 0
+    var_mgr.register_local_var_space(session_id)
+
+    request1 = RequestChain.from_nodes(
+        nodes=[
+            ConstantFill("This is a test "),
+            PlaceholderGen(placeholder=RequestPlaceholder(name="a", is_output=True)),
+        ]
+    )
+
+    var_mgr.create_vars_for_request(session_id, request1)
+    graph.insert_and_update_request_chain(request1)
+    out_var0 = request1.comp_chains[0].gen_node.sv
+
+    request2 = RequestChain.from_nodes(
+        nodes=[
+            PlaceholderFill(
+                placeholder=RequestPlaceholder(
+                    name="a", var_id=out_var0.id, is_output=False
+                )
+            ),
+            PlaceholderGen(placeholder=RequestPlaceholder(name="b", is_output=True)),
+        ]
+    )
+
+    var_mgr.create_vars_for_request(session_id, request2)
+    graph.insert_and_update_request_chain(request2)
+
+    activate_completion_chain(request2.comp_chains[0], PerformanceCriteria.TTFT)
+
+    # Expected results: A becomes latency-critical.
+    assert request2.comp_chains[0].criteria == PerformanceCriteria.TTFT
+    assert request1.comp_chains[0].is_activated
+    assert request1.comp_chains[0].criteria == PerformanceCriteria.LATENCY
+
+
 if __name__ == "__main__":
     # test_request_parse()
     # test_request_chain_print()
@@ -227,3 +268,4 @@ if __name__ == "__main__":
     # test_graph_remove()
     # test_view_graph()
     test_graph_traverse()
+    test_graph_traverse_ttft()
@@ -1,3 +1,5 @@
+import time
+
 from parrot.serve.prefix_matcher import PrefixMatcher
 
 
@@ -11,7 +13,7 @@ def test_prefix_matcher():
     for i in range(PrefixMatcher._GP_THRESHOLD + 1):
         prefix_matcher.add_prefix("A" * PrefixMatcher._START_LEN + "BBB" + str(i))
 
-    print(prefix_matcher._prefix_counter)
+    print(f"Nodes: {prefix_matcher.nodes_num}, chars: {prefix_matcher.chars_num}")
 
     query_str = "A" * PrefixMatcher._START_LEN + "BBB" + "XXX"
     pos = prefix_matcher.query_prefix(query_str)
@@ -19,5 +21,114 @@ def test_prefix_matcher():
     print("prefix: " + query_str[:pos], "suffix: " + query_str[pos:])
 
 
+def test_prefix_matcher_longest_prefix():
+    prefix_matcher = PrefixMatcher()
+
+    system_prompt = "S" * PrefixMatcher._START_LEN + " You are a helpful assistant. "
+    task_a = system_prompt + "Task A: translate the following sentences. "
+    task_b = system_prompt + "Task B: summarize the following articles. "
+
+    for i in range(PrefixMatcher._GP_THRESHOLD + 1):
+        prefix_matcher.add_prefix(task_a + f"Input {i}")
+        prefix_matcher.add_prefix(task_b + f"Input {i}")
+
+    # The longest global prefix of each task, not only the common system prompt.
+    assert prefix_matcher.query_prefix(task_a + "Input X") == len(task_a + "Input ")
+    assert prefix_matcher.query_prefix(task_b + "Input X") == len(task_b + "Input ")
+    assert prefix_matcher.query_prefix(system_prompt + "Task C") == len(
+        system_prompt + "Task "
+    )
+    assert prefix_matcher.query_prefix("T" * PrefixMatcher._START_LEN + "XXX") == -1
+
+
+def test_prefix_matcher_decay():
+    prefix_matcher = PrefixMatcher(half_life=0.05)
+
+    prefix = "A" * PrefixMatcher._START_LEN + "BBB"
+    for i in range(PrefixMatcher._GP_THRESHOLD + 1):
+        prefix_matcher.add_prefix(prefix + str(i))
+    assert prefix_matcher.query_prefix(prefix + "X") == len(prefix)
+
+    # The prefix is not popular anymore after a few half-lives.
+    time.sleep(0.2)
+    assert prefix_matcher.query_prefix(prefix + "X") == -1
+
+
+def test_prefix_matcher_memory_cap():
+    max_chars = 10000
+    prefix_matcher = PrefixMatcher(max_chars=max_chars)
+
+    popular_prefix = "P" * 100
+    for i in range(1000):
+        prefix_matcher.add_prefix(popular_prefix + f"request {i}")
+        # Distinct cold prompts
+        prefix_matcher.add_prefix(f"{i:04d}" + "C" * 100)
+        assert prefix_matcher.chars_num <= max_chars
+
+    print(f"Nodes: {prefix_matcher.nodes_num}, chars: {prefix_matcher.chars_num}")
+
+    # The trie stays compressed: nodes left with one child by eviction are merged, unless
+    # they end a GlobalPrefix.
+    now = time.perf_counter_ns()
+    nodes = list(prefix_matcher._iter_nodes())
+    assert len(nodes) == prefix_matcher.nodes_num
+    assert sum([len(node.label) for node in nodes]) == prefix_matcher.chars_num
+    for node in nodes:
+        if node.parent is not None and len(node.children) == 1:
+            assert (
+                prefix_matcher._decayed_count(node, now) > PrefixMatcher._GP_THRESHOLD
+            )
+    # Stale heap entries are bounded.
+    assert len(prefix_matcher._leaf_heap) <= 2 * prefix_matcher.nodes_num + 64
+
+    # The popular prefix survives the eviction.
+    assert prefix_matcher.query_prefix(popular_prefix + "request X") == len(
+        popular_prefix + "request "
+    )
+
+
+def test_prefix_matcher_evict_merge():
+    prefix_matcher = PrefixMatcher(max_chars=340)
+
+    base = "X" * 50
+    prefix_matcher.add_prefix(base + "a" * 100)
+    prefix_matcher.add_prefix(base + "b" * 100)
+    assert prefix_matcher.nodes_num == 4  # Root, base, a, b
+
+    # Over the cap. The coldest leaf (the oldest one) is evicted, and its parent, left with
+    # one child, is merged with it.
+    prefix_matcher.add_prefix("Z" * 100)
+    assert prefix_matcher.chars_num == 250
+    assert prefix_matcher.nodes_num == 3  # Root, base + b, Z
+    assert prefix_matcher.query_prefix(base + "a" * 100) == -1
+
+    # The merged node matches the whole string.
+    prefix_matcher.add_prefix(base + "b" * 100)
+    assert prefix_matcher.nodes_num == 3
+    assert prefix_matcher.chars_num == 250
+
+
+def test_prefix_matcher_token_ids():
+    prefix_matcher = PrefixMatcher()
+
+    prefix = tuple(range(100, 100 + PrefixMatcher._START_LEN)) + (7, 8, 9)
+    for i in range(PrefixMatcher._GP_THRESHOLD + 1):
+        prefix_matcher.add_prefix(prefix + (i,), namespace="tokenizer_a")
+
+    # Matched on token ids.
+    assert prefix_matcher.query_prefix(prefix + (42,), namespace="tokenizer_a") == len(
+        prefix
+    )
+
+    # Different tokenizers have their own namespaces.
+    assert prefix_matcher.query_prefix(prefix + (42,), namespace="tokenizer_b") == -1
+    assert prefix_matcher.query_prefix(prefix + (42,)) == -1
+
+
 if __name__ == "__main__":
     test_prefix_matcher()
+    test_prefix_matcher_longest_prefix()
+    test_prefix_matcher_decay()
+    test_prefix_matcher_memory_cap()
+    test_prefix_matcher_evict_merge()
+    test_prefix_matcher_token_ids()
@@ -17,10 +17,14 @@ from parrot.serve.graph import (
     ComputeGraph,
     PerformanceCriteria,
     activate_completion_chain,
+    get_ddl_from_time_budget,
     SemanticVariable,
 )
 from parrot.serve.graph.request import SemanticCallMetadata, RequestPlaceholder
 from parrot.engine.config import EngineConfig
+from parrot.constants import ENGINE_TYPE_OPENAI
+from parrot.protocol.internal.runtime_info import EngineRuntimeInfo
+from parrot.sampling_config import SamplingConfig
 from parrot.serve.engine_manager import EngineManager
 from parrot.serve.graph.visualize_utils import view_graph
 
@@ -449,14 +453,327 @@ def test_ctx_aware():
     # Assign context in a round-robin manner (hacky)
     for i in range(4):
         prefix_cache = context_mgr.prefix_caches[i]
-        prefix_hash = context_mgr._hash_var_id(first_vars[i].id)
-        prefix_cache.cache_prefix_context(prefix_hash=prefix_hash, context_id=i)
+        prefix_cache.cache_prefix_context(prefix=[first_vars[i].id], context_id=i)
 
     scheduler.schedule()
 
     # Expected results: 0, 4, 8, 12 tasks go to engine 0, 1, 2, 3 respectively.
 
 
+def test_ddl():
+    scheduler_cfg = GlobalSchedulerConfig(ddl_order="edf")
+
+    tokenizers_wrapper = TokenizersWrapper()
+    context_mgr = ServeCoreContextManager()
+    engine_mgr = EngineManager(
+        tokenizers_wrapper=tokenizers_wrapper,
+        context_mgr=context_mgr,
+        engine_heartbeat_timeout=666,
+    )
+
+    scheduler = GlobalScheduler(
+        config=scheduler_cfg,
+        engine_mgr=engine_mgr,
+        context_mgr=context_mgr,
+    )
+    task_creator = TaskCreator()
+
+    # An engine running one task at a time, 10 ms per iteration.
+    engine_config = EngineConfig(
+        model="gpt-3.5-turbo", engine_type=ENGINE_TYPE_OPENAI, tasks_capacity=1
+    )
+    engine_id = engine_mgr.register_engine(engine_config)
+    engine_mgr.engine_heartbeat(
+        engine_id, EngineRuntimeInfo(recent_average_latency=10_000_000)
+    )
+
+    var_mgr = SemanticVariableManager(666)
+    session_id = 0
+    var_mgr.register_local_var_space(session_id)
+
+    metadata = SemanticCallMetadata.get_default()
+    metadata.model_type = "text"
+
+    def submit(time_budget: Optional[float]) -> CompletionTask:
+        request_chain = RequestChain.from_nodes(
+            nodes=[
+                ConstantFill("This is a test "),
+                PlaceholderGen(
+                    placeholder=RequestPlaceholder(
+                        name="a",
+                        is_output=True,
+                        sampling_config=SamplingConfig(max_gen_length=10),
+                    )
+                ),
+            ],
+            metadata=metadata,
+        )
+        var_mgr.create_vars_for_request(session_id, request_chain)
+        comp_chain = request_chain.comp_chains[0]
+        activate_completion_chain(
+            comp_chain,
+            PerformanceCriteria.LATENCY,
+            get_ddl_from_time_budget(time_budget),
+        )
+        task = task_creator.create_task(comp_chain)
+        task.tokenize_chain(tokenizers_wrapper)
+        scheduler.submit_task(task)
+        return task
+
+    no_ddl_task = submit(None)
+    late_ddl_task = submit(10)
+    early_ddl_task = submit(5)
+    # At least 10 iterations are needed, which can't be done in 10 ms.
+    missed_task = submit(0.01)
+
+    scheduler.schedule()
+
+    # Expected results: the missed task is rejected, the task with the earliest deadline
+    # is scheduled and the task without deadline is the last one in the queue.
+    assert missed_task.is_rejected
+    assert early_ddl_task.is_scheduled
+    assert scheduler.task_queue == [late_ddl_task, no_ddl_task]
+
+
+def test_schedule_saturated():
+    scheduler_cfg = GlobalSchedulerConfig(ctx_group=False)
+
+    tokenizers_wrapper = TokenizersWrapper()
+    context_mgr = ServeCoreContextManager()
+    engine_mgr = EngineManager(
+        tokenizers_wrapper=tokenizers_wrapper,
+        context_mgr=context_mgr,
+        engine_heartbeat_timeout=666,
+    )
+
+    scheduler = GlobalScheduler(
+        config=scheduler_cfg,
+        engine_mgr=engine_mgr,
+        context_mgr=context_mgr,
+    )
+    task_creator = TaskCreator()
+
+    engine_config = EngineConfig(
+        model="gpt-3.5-turbo", engine_type=ENGINE_TYPE_OPENAI, tasks_capacity=2
+    )
+    engine_mgr.register_engine(engine_config)
+
+    var_mgr = SemanticVariableManager(666)
+    session_id = 0
+    var_mgr.register_local_var_space(session_id)
+
+    metadata = SemanticCallMetadata.get_default()
+    metadata.model_type = "text"
+
+    tasks: List[CompletionTask] = []
+    for _ in range(50):
+        request_chain = RequestChain.from_nodes(
+            nodes=[
+                ConstantFill("This is a test "),
+                PlaceholderGen(
+                    placeholder=RequestPlaceholder(name="a", is_output=True)
+                ),
+            ],
+            metadata=metadata,
+        )
+        var_mgr.create_vars_for_request(session_id, request_chain)
+        comp_chain = request_chain.comp_chains[0]
+        activate_completion_chain(comp_chain, PerformanceCriteria.LATENCY)
+        task = task_creator.create_task(comp_chain)
+        task.tokenize_chain(tokenizers_wrapper)
+        scheduler.submit_task(task)
+        tasks.append(task)
+
+    tried_task_ids = []
+    schedule_group = scheduler._schedule_group
+
+    def counted_schedule_group(task, grouped_task_ids):
+        tried_task_ids.append(task.task_id)
+        return schedule_group(task, grouped_task_ids)
+
+    scheduler._schedule_group = counted_schedule_group
+
+    # Expected results: the engine is full after 2 tasks, and the rest of the queue is
+    # not tried. Nothing is tried when the engine stays full.
+    scheduler.schedule()
+    assert tried_task_ids == [tasks[0].task_id, tasks[1].task_id]
+    assert scheduler.num_queued_tasks == 48
+
+    scheduler.schedule()
+    assert len(tried_task_ids) == 2
+    assert scheduler.task_queue == tasks[2:]
+
+
+def test_fair_queueing():
+    scheduler_cfg = GlobalSchedulerConfig(fair_queueing=True)
+
+    tokenizers_wrapper = TokenizersWrapper()
+    context_mgr = ServeCoreContextManager()
+    engine_mgr = EngineManager(
+        tokenizers_wrapper=tokenizers_wrapper,
+        context_mgr=context_mgr,
+        engine_heartbeat_timeout=666,
+    )
+
+    scheduler = GlobalScheduler(
+        config=scheduler_cfg,
+        engine_mgr=engine_mgr,
+        context_mgr=context_mgr,
+    )
+    task_creator = TaskCreator()
+
+    # An engine running one task at a time.
+    engine_config = EngineConfig(
+        model="gpt-3.5-turbo", engine_type=ENGINE_TYPE_OPENAI, tasks_capacity=1
+    )
+    engine_mgr.register_engine(engine_config)
+
+    var_mgr = SemanticVariableManager(666)
+    batch_session_id = 0
+    interactive_session_id = 1
+    var_mgr.register_local_var_space(batch_session_id)
+    var_mgr.register_local_var_space(interactive_session_id)
+    scheduler.register_session(batch_session_id)
+    scheduler.register_session(interactive_session_id, weight=2.0)
+
+    metadata = SemanticCallMetadata.get_default()
+    metadata.model_type = "text"
+
+    def submit(session_id: int, i: int) -> CompletionTask:
+        request_chain = RequestChain.from_nodes(
+            nodes=[
+                ConstantFill(f"Session {session_id}, task {i}: "),
+                PlaceholderGen(
+                    placeholder=RequestPlaceholder(
+                        name="a",
+                        is_output=True,
+                        sampling_config=SamplingConfig(max_gen_length=10),
+                    )
+                ),
+            ],
+            metadata=metadata,
+        )
+        request_chain.session_id = session_id
+        var_mgr.create_vars_for_request(session_id, request_chain)
+        comp_chain = request_chain.comp_chains[0]
+        activate_completion_chain(comp_chain, PerformanceCriteria.LATENCY)
+        task = task_creator.create_task(comp_chain)
+        task.tokenize_chain(tokenizers_wrapper)
+        scheduler.submit_task(task)
+        return task
+
+    # The batch session floods the queue before the interactive session comes.
+    tasks = [submit(batch_session_id, i) for i in range(6)]
+    tasks += [submit(interactive_session_id, i) for i in range(2)]
+
+    order = []
+    while scheduler.num_queued_tasks > 0:
+        scheduler.schedule()
+        for task in tasks:
+            if task.is_scheduled:
+                order.append(task.chain.session_id)
+                task.leave_scheduled()
+                tasks.remove(task)
+                break
+
+    print(order)
+    # Expected results: the interactive session doesn't wait for the whole batch session.
+    assert order == [0, 1, 1, 0, 0, 0, 0, 0]
+
+
+def test_group_split():
+    scheduler_cfg = GlobalSchedulerConfig(graph_group=True, group_split=True)
+
+    graph = ComputeGraph()
+    tokenizers_wrapper = TokenizersWrapper()
+    context_mgr = ServeCoreContextManager()
+    engine_mgr = EngineManager(
+        tokenizers_wrapper=tokenizers_wrapper,
+        context_mgr=context_mgr,
+        engine_heartbeat_timeout=666,
+    )
+
+    scheduler = GlobalScheduler(
+        config=scheduler_cfg,
+        engine_mgr=engine_mgr,
+        context_mgr=context_mgr,
+    )
+    task_creator = TaskCreator()
+
+    # Register 2 engines, 3 tasks at most in each engine
+    engine_config = EngineConfig(
+        model="gpt-3.5-turbo", engine_type=ENGINE_TYPE_OPENAI, tasks_capacity=3
+    )
+    for _ in range(2):
+        engine_mgr.register_engine(engine_config)
+
+    var_mgr = SemanticVariableManager(666)
+    session_id = 0
+    var_mgr.register_local_var_space(session_id)
+
+    metadata = SemanticCallMetadata.get_default()
+    metadata.model_type = "text"
+
+    # A group of 4 requests, which the final request depends on. Every 2 of them share
+    # the same prefix.
+    prompts = ["This is prefix A. ", "This is prefix B. "]
+    out_vars: List[SemanticVariable] = []
+    chains: List[CompletionChain] = []
+    for i in range(4):
+        request_chain = RequestChain.from_nodes(
+            nodes=[
+                ConstantFill(prompts[i % 2]),
+                PlaceholderGen(
+                    placeholder=RequestPlaceholder(name="a", is_output=True)
+                ),
+            ],
+            metadata=metadata,
+        )
+        var_mgr.create_vars_for_request(session_id, request_chain)
+        graph.insert_and_update_request_chain(request_chain)
+        comp_chain = request_chain.comp_chains[0]
+        out_vars.append(comp_chain.gen_node.sv)
+        chains.append(comp_chain)
+
+    request_chain = RequestChain.from_nodes(
+        nodes=[
+            PlaceholderFill(
+                placeholder=RequestPlaceholder(
+                    name=f"a_{i}",
+                    var_id=out_vars[i].id,
+                    is_output=False,
+                )
+            )
+            for i in range(4)
+        ]
+        + [
+            PlaceholderGen(placeholder=RequestPlaceholder(name="b", is_output=True)),
+        ],
+        metadata=metadata,
+    )
+    var_mgr.create_vars_for_request(session_id, request_chain)
+    graph.insert_and_update_request_chain(request_chain)
+    activate_completion_chain(
+        request_chain.comp_chains[0], PerformanceCriteria.THROUGHPUT
+    )
+
+    tasks: List[CompletionTask] = []
+    for chain in chains:
+        task = task_creator.create_task(chain)
+        task.tokenize_chain(tokenizers_wrapper)
+        scheduler.submit_task(task)
+        tasks.append(task)
+
+    scheduler.schedule()
+
+    # Expected results: the group is split into 2 engines. Tasks with the same prefix go
+    # to the same engine.
+    assert all([task.is_scheduled for task in tasks])
+    assert tasks[0].engine == tasks[2].engine
+    assert tasks[1].engine == tasks[3].engine
+    assert tasks[0].engine != tasks[1].engine
+
+
 if __name__ == "__main__":
     # test_default_policy_throughput()
     # test_default_policy_latency()
@@ -464,3 +781,7 @@ if __name__ == "__main__":
     # test_graph_group()
     # test_ctx_group()
     # test_ctx_aware()
+    test_ddl()
+    test_schedule_saturated()
+    test_fair_queueing()
+    test_group_split()
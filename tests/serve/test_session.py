@@ -16,6 +16,12 @@ from parrot.serve.backend_repr import ExecutionEngine
 
 from parrot.testing.localhost_server_daemon import fake_engine_server
 from parrot.testing.fake_engine_server import engine_config
+from parrot.engine.config import EngineConfig
+from parrot.constants import (
+    DEFAULT_SERVER_HOST,
+    DEFAULT_ENGINE_SERVER_PORT,
+    ENGINE_TYPE_OPENAI,
+)
 
 from parrot.serve.graph import (
     RequestChain,
@@ -26,7 +32,7 @@ from parrot.serve.graph import (
     PerformanceCriteria,
     activate_completion_chain,
 )
-from parrot.serve.graph.request import RequestPlaceholder
+from parrot.serve.graph.request import RequestPlaceholder, SemanticCallMetadata
 
 
 def test_session_manager():
@@ -124,6 +130,102 @@ def test_graph_executor():
         asyncio.run(main())
 
 
+def test_graph_executor_engine_failure():
+    session_id = 0
+
+    task_creator = TaskCreator()
+    scheduler_config = GlobalSchedulerConfig()
+    var_mgr = SemanticVariableManager(666)
+    tokenizers_wrapper = TokenizersWrapper()
+    context_mgr = ServeCoreContextManager()
+    engine_mgr = EngineManager(
+        tokenizers_wrapper=tokenizers_wrapper,
+        context_mgr=context_mgr,
+        engine_heartbeat_timeout=666,
+    )
+    scheduler = GlobalScheduler(scheduler_config, engine_mgr, context_mgr)
+    executor = GraphExecutor(
+        session_id=session_id,
+        task_creator=task_creator,
+        scheduler=scheduler,
+        engine_mgr=engine_mgr,
+        context_mgr=context_mgr,
+        tokenizers_wrapper=tokenizers_wrapper,
+    )
+    var_mgr.register_local_var_space(session_id)
+
+    # Two fake engines serving text models. The first one will be killed.
+    ports = [DEFAULT_ENGINE_SERVER_PORT + 10, DEFAULT_ENGINE_SERVER_PORT + 11]
+    engine_configs = [
+        EngineConfig(
+            host=DEFAULT_SERVER_HOST,
+            port=port,
+            engine_name=f"Fake Engine {i}",
+            model="gpt-3.5-turbo",
+            engine_type=ENGINE_TYPE_OPENAI,
+        )
+        for i, port in enumerate(ports)
+    ]
+
+    metadata = SemanticCallMetadata.get_default()
+    metadata.model_type = "text"
+
+    requests = []
+    for i in range(4):
+        request = RequestChain.from_nodes(
+            nodes=[
+                ConstantFill("Hello world, I'm a prefix."),
+                ConstantFill(f"This is request {i}."),
+                PlaceholderGen(
+                    placeholder=RequestPlaceholder(name="b", is_output=True)
+                ),
+            ],
+            metadata=metadata,
+        )
+        var_mgr.create_vars_for_request(session_id, request)
+        requests.append(request)
+
+    async def schedule_loop():
+        while True:
+            scheduler.schedule()
+            await asyncio.sleep(0.05)
+
+    async def main(engine_to_kill):
+        schedule_task = asyncio.create_task(schedule_loop())
+
+        # All tasks go to the first engine.
+        first_engine_id = engine_mgr.register_engine(engine_configs[0])
+        for request in requests:
+            executor.add_request(request)
+            activate_completion_chain(
+                request.comp_chains[0], PerformanceCriteria.LATENCY
+            )
+        await asyncio.sleep(1)
+
+        # Kill the first engine in the middle of execution, and add a healthy engine.
+        engine_to_kill.kill()
+        second_engine_id = engine_mgr.register_engine(engine_configs[1])
+
+        outputs = [request.comp_chains[0].gen_node.sv for request in requests]
+        await asyncio.wait_for(
+            asyncio.gather(*[output.wait_ready() for output in outputs]), timeout=30
+        )
+        schedule_task.cancel()
+
+        # Expected results: the workload completes in the second engine, and the session
+        # is not interrupted.
+        print([output.get() for output in outputs])
+        assert executor.bad_exception is None
+        assert not engine_mgr.get_engine(first_engine_id).is_running
+        assert engine_mgr.get_engine(second_engine_id).get_num_tasks() == 0
+        assert len(context_mgr.prefix_caches[first_engine_id]) == 0
+
+    with fake_engine_server(ports[0]) as engine_to_kill:
+        with fake_engine_server(ports[1]):
+            asyncio.run(main(engine_to_kill))
+
+
 if __name__ == "__main__":
     # test_session_manager()
     test_graph_executor()
+    test_graph_executor_engine_failure()
@@ -0,0 +1,83 @@
+import asyncio
+
+from parrot.testing.serve_simulator import (
+    VirtualClockEventLoop,
+    ServeSimulator,
+    TraceRequest,
+)
+
+
+def test_virtual_clock():
+    loop = VirtualClockEventLoop()
+
+    async def main():
+        await asyncio.sleep(3600)
+        return asyncio.get_running_loop().time()
+
+    # One hour passes in no time.
+    assert loop.run_until_complete(main()) == 3600
+    loop.close()
+
+
+def test_simulator_prefix_sharing():
+    prefix = " ".join([f"sys_{i}" for i in range(100)]) + " "
+    trace = [
+        TraceRequest(
+            arrival_time=0.1 * i,
+            session_id=i % 2,
+            prefix=prefix,
+            prompt=f"question {i}",
+            output_len=10,
+        )
+        for i in range(8)
+    ]
+
+    simulator = ServeSimulator(engines_num=1)
+    result = simulator.run(trace, {"ctx_group": True, "ctx_aware": True})
+    print(result.summary())
+
+    assert result.requests_num == 8
+    assert (result.jcts > 0).all()
+    assert result.generated_tokens_num == 8 * 10
+    # The prefix is filled only once in the engine.
+    assert result.filled_tokens_num == 100 + 8 * 2
+    assert result.prefix_hit_rate == 1 - (100 + 8 * 2) / (8 * 102)
+
+
+def test_simulator_token_aligned_prefix():
+    prefix = " ".join([f"sys_{i}" for i in range(100)]) + " "
+    trace = [
+        TraceRequest(
+            arrival_time=0.5 * i,
+            session_id=0,
+            prefix=prefix,
+            prompt=f"q{i} {i}",
+            output_len=10,
+        )
+        for i in range(8)
+    ]
+
+    def run(token_aligned: bool):
+        simulator = ServeSimulator(
+            engines_num=1,
+            core_config={"prefix_matching_token_aligned": token_aligned},
+            inline_prompt=True,
+            block_size=16,
+        )
+        result = simulator.run(trace, {"ctx_group": True, "ctx_aware": True})
+        print(f"token_aligned={token_aligned}: {result.summary()}")
+        return result
+
+    # The character-level split is in the middle of the word "q{i}".
+    char_result = run(token_aligned=False)
+    # The token-aligned split is at 96 = 100 // 16 * 16 tokens, so the prefix context
+    # needs no padding.
+    aligned_result = run(token_aligned=True)
+
+    assert aligned_result.padded_slots_num < char_result.padded_slots_num
+
+
+if __name__ == "__main__":
+    test_virtual_clock()
+    test_simulator_prefix_sharing()
+    test_simulator_token_aligned_prefix()
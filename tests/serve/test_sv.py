@@ -1,3 +1,5 @@
+import asyncio
+
 from parrot.serve.graph import (
     RequestChain,
     ConstantFill,
@@ -59,6 +61,85 @@ def test_request_chain_hash():
     print(request_chain2.pretty_print())
 
 
+def test_sv_stream():
+    session_id = 0
+    var_mgr = SemanticVariableManager(constant_prefix_var_timeout=10)
+    var_mgr.register_local_var_space(session_id)
+    var = var_mgr.create_var(session_id, "a")
+    var.is_streaming = True
+
+    chunks = ["He", " is", " widely", " acknowledged"]
+
+    async def producer():
+        for chunk in chunks:
+            await asyncio.sleep(0.01)
+            var.append_stream(chunk)
+        var.set("".join(chunks) + "!")
+
+    async def consumer():
+        received = []
+        async for chunk in var.stream():
+            received.append(chunk)
+        return received
+
+    async def main():
+        _, received1, received2 = await asyncio.gather(
+            producer(), consumer(), consumer()
+        )
+        print(received1)
+        # The tail which is not streamed is yielded at the end.
+        assert received1 == chunks + ["!"]
+        assert received2 == received1
+
+        # Streaming a ready SV yields the whole content.
+        received3 = [chunk async for chunk in var.stream()]
+        assert "".join(received3) == var.get()
+
+    asyncio.run(main())
+
+
+def test_sv_stream_token_ids():
+    session_id = 0
+    var_mgr = SemanticVariableManager(constant_prefix_var_timeout=10)
+    var_mgr.register_local_var_space(session_id)
+    var = var_mgr.create_var(session_id, "a")
+    var.is_streaming = True
+
+    token_ids = list(range(10))
+
+    async def producer():
+        for token_id in token_ids:
+            await asyncio.sleep(0.01)
+            # Incomplete characters produce no text, but the token id is still recorded.
+            var.append_stream("" if token_id % 2 == 0 else "x", token_id)
+        var.set("x" * 5)
+
+    async def consumer():
+        # Pipelined consumer: receive token ids in chunks of 4.
+        chunks = []
+        sent_num = 0
+        while True:
+            await var.wait_stream_token_ids(sent_num + 4)
+            chunk = var.stream_token_ids[sent_num:]
+            if len(chunk) > 0:
+                chunks.append(chunk)
+                sent_num += len(chunk)
+            if var.is_ready() and sent_num == len(var.stream_token_ids):
+                break
+        return chunks
+
+    async def main():
+        _, chunks = await asyncio.gather(producer(), consumer())
+        print(chunks)
+        assert sum(chunks, []) == token_ids
+        assert all(len(chunk) >= 4 for chunk in chunks[:-1])
+        assert var._stream_chunks == ["x"] * 5
+
+    asyncio.run(main())
+
+
 if __name__ == "__main__":
     # test_content_hash()
     test_request_chain_hash()
+    test_sv_stream()
+    test_sv_stream_token_ids()
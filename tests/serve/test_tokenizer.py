@@ -1,3 +1,7 @@
+import asyncio
+import threading
+import pytest
+
 from parrot.serve.tokenizer_wrapper import TokenizersWrapper
 
 from parrot.serve.variable_manager import SemanticVariableManager
@@ -10,6 +14,7 @@ from parrot.serve.graph import (
     PlaceholderFill,
 )
 from parrot.serve.graph.request import SemanticCallMetadata, RequestPlaceholder
+from parrot.testing.serve_simulator import SimTokenizer
 
 
 TESTING_PROMPT_TEXT = (
@@ -56,6 +61,28 @@ def test_decode():
     assert TESTING_PROMPT_TEXT == decoded
 
 
+def test_decode_incrementally():
+    tokenizers_wrapper = TokenizersWrapper()
+    tokenizer_name = "hf-internal-testing/llama-tokenizer"
+    tokenizers_wrapper.register_tokenizer(tokenizer_name)
+
+    # Simulate streaming generation: tokens arrive one by one.
+    token_ids = []
+    prefix_offset = 0
+    read_offset = 0
+    decoded = ""
+    for token_id in TESTING_TOKEN_IDS:
+        token_ids.append(token_id)
+        new_text, prefix_offset, read_offset = (
+            tokenizers_wrapper.detokenize_incrementally(
+                token_ids, prefix_offset, read_offset, tokenizer_name
+            )
+        )
+        decoded += new_text
+
+    assert TESTING_PROMPT_TEXT == decoded
+
+
 def test_tokenize_request():
     session_id = 0
     var_mgr = SemanticVariableManager(666)
@@ -97,7 +124,137 @@ def test_tokenize_request():
         print(tokenizers_wrapper.detokenize(token_ids, tokenizer_name1))
 
 
+def test_tokenization_cache():
+    session_id = 0
+    var_mgr = SemanticVariableManager(constant_prefix_var_timeout=0)
+    var_mgr.register_local_var_space(session_id=session_id)
+
+    tokenizers_wrapper = TokenizersWrapper(cache_max_tokens=100)
+    tokenizer_name = "sim_tokenizer"
+    tokenizers_wrapper.tokenizers[tokenizer_name] = SimTokenizer()
+
+    system_prompt = " ".join([f"word{i}" for i in range(40)])
+
+    def make_task(task_id: int, question: str) -> CompletionTask:
+        request_chain = RequestChain.from_nodes(
+            nodes=[
+                ConstantFill(system_prompt),
+                ConstantFill(question),
+                PlaceholderGen(
+                    placeholder=RequestPlaceholder(
+                        name="b", is_output=True, sampling_config=SamplingConfig()
+                    )
+                ),
+            ]
+        )
+        var_mgr.create_vars_for_request(session_id, request_chain)
+        task = CompletionTask(task_id=task_id, chain=request_chain.comp_chains[0])
+        task.tokenize_chain(tokenizers_wrapper)
+        return task
+
+    task0 = make_task(0, "question 0")
+    assert tokenizers_wrapper.cache_misses_num == 2
+    task1 = make_task(1, "question 1")
+    # The system prompt is tokenized only once.
+    assert tokenizers_wrapper.cache_hits_num == 1
+    assert tokenizers_wrapper.cache_misses_num == 3
+    assert (
+        task0.tokenized_result[tokenizer_name][0]
+        == task1.tokenized_result[tokenizer_name][0]
+    )
+    assert task1.tokenized_result[tokenizer_name][1] == tokenizers_wrapper.tokenize(
+        "question 1", tokenizer_name
+    )
+
+    # Bounded: the least recently used entries are evicted.
+    for i in range(100):
+        make_task(2 + i, f"question {i} " * 10)
+        assert tokenizers_wrapper.cached_tokens_num <= 100
+
+    # Invalidated when the SVs are freed.
+    freed_vars = var_mgr.free_expired_constant_prefix_vars()
+    freed_vars += var_mgr.free_local_var_space(session_id=session_id)
+    for var in freed_vars:
+        tokenizers_wrapper.invalidate_var(var.id)
+    assert tokenizers_wrapper.cached_tokens_num == 0
+
+
+def test_tokenization_pool():
+    class RecordingTokenizersWrapper(TokenizersWrapper):
+        def __init__(self, **kwargs):
+            super().__init__(**kwargs)
+            self.batch_sizes = []
+            self.thread_ids = set()
+
+        def tokenize_batch(self, texts, tokenizer_name):
+            self.batch_sizes.append(len(texts))
+            self.thread_ids.add(threading.get_ident())
+            return super().tokenize_batch(texts, tokenizer_name)
+
+    tokenizers_wrapper = RecordingTokenizersWrapper(pool_size=2)
+    tokenizer_name = "sim_tokenizer"
+    tokenizers_wrapper.tokenizers[tokenizer_name] = SimTokenizer()
+
+    texts = [f"text {i} " * (i + 1) for i in range(16)]
+
+    async def main():
+        token_ids_list = await asyncio.gather(
+            *[tokenizers_wrapper.atokenize(text, tokenizer_name) for text in texts]
+        )
+        for text, token_ids in zip(texts, token_ids_list):
+            assert token_ids == tokenizers_wrapper.tokenize(text, tokenizer_name)
+            assert (
+                await tokenizers_wrapper.adetokenize(token_ids, tokenizer_name)
+                == text.strip()
+            )
+
+    asyncio.run(main())
+
+    # Texts submitted together are tokenized in one batch, off the event loop.
+    assert tokenizers_wrapper.batch_sizes == [16]
+    assert threading.get_ident() not in tokenizers_wrapper.thread_ids
+
+
+def test_tokenization_pool_close():
+    release = threading.Event()
+
+    class BlockingTokenizersWrapper(TokenizersWrapper):
+        def tokenize_batch(self, texts, tokenizer_name):
+            release.wait(timeout=5)
+            return super().tokenize_batch(texts, tokenizer_name)
+
+    tokenizers_wrapper = BlockingTokenizersWrapper(pool_size=1)
+    tokenizer_name = "sim_tokenizer"
+    tokenizers_wrapper.tokenizers[tokenizer_name] = SimTokenizer()
+
+    async def main():
+        # The first batch occupies the only worker. The second one waits in the pool.
+        running = asyncio.create_task(
+            tokenizers_wrapper.atokenize("a b", tokenizer_name)
+        )
+        await asyncio.sleep(0.05)
+        queued = asyncio.create_task(
+            tokenizers_wrapper.atokenize("c d", tokenizer_name)
+        )
+        await asyncio.sleep(0.05)
+
+        # Closing cancels the queued batch, and its waiters are cancelled too.
+        tokenizers_wrapper.close()
+        with pytest.raises(asyncio.CancelledError):
+            await asyncio.wait_for(queued, timeout=1)
+
+        # The running batch still finishes.
+        release.set()
+        assert len(await asyncio.wait_for(running, timeout=1)) == 2
+
+    asyncio.run(main())
+
+
 if __name__ == "__main__":
     # test_encode()
     # test_decode()
+    # test_decode_incrementally()
     test_tokenize_request()
+    test_tokenization_cache()
+    test_tokenization_pool()
+    test_tokenization_pool_close()
@@ -21,6 +21,7 @@ from parrot.protocol.public.apis import (
 )
 from parrot.protocol.internal.layer_apis import (
     free_context,
+    afree_contexts,
     ping_engine,
     engine_heartbeat,
     register_engine,
@@ -156,6 +157,19 @@ def test_free_context():
         assert resp.context_len == 0
 
 
+def test_free_contexts():
+    async def main():
+        resp = await afree_contexts(
+            http_addr=ENGINE_URL,
+            context_ids=[0, 1, 2],
+        )
+
+        assert resp.context_lens == [0, 0, 0]
+
+    with fake_engine_server():
+        asyncio.run(main())
+
+
 def test_ping_engine():
     with fake_engine_server():
         resp = ping_engine(http_addr=ENGINE_URL)
@@ -279,6 +293,7 @@ if __name__ == "__main__":
     # test_set_semantic_variable()
     # test_get_semantic_variable()
     # test_free_context()
+    # test_free_contexts()
     # test_fill()
     # test_generate()
     pass